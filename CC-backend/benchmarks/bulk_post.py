@@ -0,0 +1,94 @@
+"""Bulk vs sequential food posting.
+
+Posts the same N items once as N sequential POST /api/food requests and once as a
+single POST /api/food/bulk, in-process through the ASGI app, and reports wall time
+and database operations for each. Needs MONGO_URI (use a scratch database: the posts
+it creates are deleted afterwards).
+
+    python -m benchmarks.bulk_post --items 100
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta
+
+import httpx
+
+import main
+from database import get_db, get_food_collection
+from models import MAX_BULK_POSTS
+from services import events, feed_view
+
+POSTER = "bulk_bench_poster"
+
+
+def _opcounters():
+    try:
+        return get_db().command("serverStatus")["opcounters"]
+    except Exception:
+        return None # Not permitted on some hosted tiers
+
+
+def _items(count: int, label: str):
+    now = datetime.now()
+    return [{
+        "foodName": f"Bench {label} {i}", "quantity": 4, "category": "Snack", "dietaryInfo": "None",
+        "pickupLocation": "Benchmark", "pickupTime": now.isoformat(), "photo": json.dumps({"uri": "data:image/jpeg;base64,abc"}),
+        "user": POSTER, "expirationTime": (now + timedelta(hours=1)).isoformat(), "createdAt": now.isoformat(),
+    } for i in range(count)]
+
+
+async def _measure(post) -> dict:
+    before = _opcounters()
+    started = time.perf_counter()
+    posted = await post()
+    await events.drain() # Include the read-model and activity-log writes
+    elapsed = time.perf_counter() - started
+    after = _opcounters()
+    report = {"posted": posted, "seconds": round(elapsed, 3), "posts_per_s": round(posted / elapsed, 1)}
+    if before and after:
+        report["db_ops"] = {op: after[op] - before[op] for op in ("insert", "query", "update", "command")}
+    return report
+
+
+async def run(count: int) -> dict:
+    await main.startup_event()
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def sequential():
+                posted = 0
+                for item in _items(count, "sequential"):
+                    response = await client.post("/api/food", data={k: str(v) for k, v in item.items()})
+                    posted += response.status_code == 200
+                return posted
+
+            async def bulk():
+                posted = 0
+                items = _items(count, "bulk")
+                for start in range(0, count, MAX_BULK_POSTS):
+                    response = await client.post("/api/food/bulk", json=items[start:start + MAX_BULK_POSTS])
+                    posted += response.json()["inserted"]
+                return posted
+
+            report = {"items": count, "sequential": await _measure(sequential), "bulk": await _measure(bulk)}
+            report["speedup"] = round(report["sequential"]["seconds"] / report["bulk"]["seconds"], 1)
+    finally:
+        get_food_collection().delete_many({"postedBy": POSTER})
+        feed_view.get_feed_view_collection().delete_many({"postedBy": POSTER})
+        await main.shutdown_event()
+    return report
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Compare sequential and bulk food posting.")
+    parser.add_argument("--items", type=int, default=100)
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR)
+    print(json.dumps(asyncio.run(run(args.items)), indent=2))
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,120 @@
+"""Stress harness for reservations on a single contended post.
+
+Fires N concurrent POST /api/food/reserve requests at one fresh post, in-process
+through the ASGI app, once with the legacy path and once in contention mode, then
+releases the hold a few times to check that the waitlist is promoted in order.
+Needs MONGO_URI (use a scratch database: it creates and deletes a test post).
+
+    python -m benchmarks.reservation_stress --reservers 1000
+"""
+import argparse
+import asyncio
+import json
+import logging
+import statistics
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from bson import ObjectId
+
+import main
+from database import get_db, get_food_collection
+from services import reservation_holds, reservation_queue
+
+
+def _opcounters():
+    try:
+        return get_db().command("serverStatus")["opcounters"]
+    except Exception:
+        return None # Not permitted on some hosted tiers
+
+
+def _new_post() -> str:
+    now = datetime.now()
+    return str(get_food_collection().insert_one({
+        "foodName": "Stress test pizza", "quantity": 1, "category": "Meal", "dietaryInfo": "None",
+        "pickupLocation": "Benchmark", "pickupTime": now.isoformat(), "photo": json.dumps({"uri": ""}), "postedBy": "stress_poster",
+        "reportCount": 0, "status": "green", "timestamp": now, "expirationTime": (now + timedelta(hours=1)).isoformat(),
+    }).inserted_id)
+
+
+async def _burst(client: httpx.AsyncClient, food_id: str, reservers: int):
+    async def attempt(i):
+        started = time.perf_counter()
+        response = await client.post("/api/food/reserve", json={"food_id": food_id, "user": f"stress_user_{i}"})
+        return i, response.status_code, response.json(), (time.perf_counter() - started) * 1000
+
+    before = _opcounters()
+    started = time.perf_counter()
+    results = await asyncio.gather(*(attempt(i) for i in range(reservers)))
+    elapsed = time.perf_counter() - started
+    after = _opcounters()
+    latencies = sorted(r[3] for r in results)
+    report = {
+        "requests": reservers,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(reservers / elapsed, 1),
+        "latency_ms_p50": round(statistics.median(latencies), 2),
+        "latency_ms_p99": round(latencies[int(len(latencies) * 0.99) - 1], 2),
+        "status_codes": {str(code): sum(1 for r in results if r[1] == code) for code in sorted({r[1] for r in results})},
+        "winners": sum(1 for r in results if r[1] == 200),
+    }
+    if before and after:
+        report["db_ops"] = {op: after[op] - before[op] for op in ("query", "update", "command")}
+    return results, report
+
+
+def _fairness(results) -> dict:
+    """Every loser gets a distinct place and the line has no gaps (places follow arrival at the queue)."""
+    positions = sorted(r[2]["position"] for r in results if r[1] == 202)
+    return {"waitlisted": len(positions), "gap_free": positions == list(range(1, len(positions) + 1))}
+
+
+async def _promotions(food_id: str, rounds: int) -> dict:
+    expected = [user for user in reservation_queue._queues[food_id].waitlist][:rounds]
+    promoted = []
+    for _ in range(rounds):
+        get_food_collection().update_one({"_id": ObjectId(food_id)}, {"$set": {"holdUntil": datetime.now() - timedelta(seconds=1)}})
+        await asyncio.to_thread(reservation_holds.release, food_id)
+        for _ in range(500):
+            holder = get_food_collection().find_one({"_id": ObjectId(food_id)}, {"reservedBy": 1}).get("reservedBy")
+            if holder and (not promoted or holder != promoted[-1]):
+                break
+            await asyncio.sleep(0.01)
+        promoted.append(holder)
+    return {"rounds": rounds, "in_order": promoted == expected}
+
+
+async def run(reservers: int, rounds: int) -> dict:
+    await main.startup_event()
+    report = {}
+    transport = httpx.ASGITransport(app=main.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://stress") as client:
+            for mode in ("legacy", "contention"):
+                reservation_queue.RESERVATION_QUEUE_ENABLED = mode == "contention"
+                food_id = _new_post()
+                try:
+                    results, report[mode] = await _burst(client, food_id, reservers)
+                    if mode == "contention":
+                        report[mode]["fairness"] = _fairness(results)
+                        report[mode]["promotion"] = await _promotions(food_id, rounds)
+                finally:
+                    get_food_collection().delete_one({"_id": ObjectId(food_id)})
+    finally:
+        await main.shutdown_event()
+    return report
+
+
+def cli(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent reservation stress test.")
+    parser.add_argument("--reservers", type=int, default=1000)
+    parser.add_argument("--promotions", type=int, default=5, help="hold releases to replay in contention mode")
+    args = parser.parse_args(argv)
+    logging.getLogger().setLevel(logging.ERROR) # Thousands of expected "already reserved" warnings otherwise
+    print(json.dumps(asyncio.run(run(args.reservers, args.promotions)), indent=2))
+
+
+if __name__ == "__main__":
+    cli()
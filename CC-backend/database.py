@@ -12,9 +12,10 @@ db = None
 food_collection = None
 report_collection = None
 users_collection = None
+feed_view_collection = None
 
 def connect_db():
-    global client, db, food_collection, report_collection, users_collection
+    global client, db, food_collection, report_collection, users_collection, feed_view_collection
     try:
         mongo_uri = os.getenv("MONGO_URI")
         if not mongo_uri:
@@ -26,6 +27,7 @@ def connect_db():
         food_collection = db.food_posts
         report_collection = db.reports
         users_collection = db.users
+        feed_view_collection = db.feed_view # Read model maintained by the write paths
 
         # Test connection and ensure collections exist
         db_info = client.server_info()
@@ -63,3 +65,13 @@ def get_users_collection():
     if users_collection is None:
         connect_db()
     return users_collection
+
+def get_feed_view_collection():
+    if feed_view_collection is None:
+        connect_db()
+    return feed_view_collection
+
+def get_db():
+    if db is None:
+        connect_db()
+    return db
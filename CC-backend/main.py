@@ -5,9 +5,10 @@ import os
 
 # Import routers and other necessary components
 from database import connect_db, client # Import client for shutdown event
-from routers import food, users, reports # Import main routers
+from routers import food, users, reports, batch, system, admin, analytics as analytics_router # Import main routers
 from routers.users import misc_user_router # Import misc routers if they have endpoints outside main prefix
 from routers.reports import misc_report_router
+from services import activity_log, analytics, archive, counters, events, feed_snapshot, feed_view, invalidation_bus, jobs, moderation, notifications, profile, reputation, reservation_holds, reservation_queue, user_stats
 
 # Configure logger (can be moved to a dedicated logging config file)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -36,13 +37,36 @@ async def startup_event():
     try:
         connect_db() # Establish database connection on startup
         logger.info("Database connection established.")
+        feed_view.ensure_indexes()
+        feed_view.catch_up() # Rebuilds the read model in a job if posts predate it
+        activity_log.ensure_collection()
+        jobs.ensure_indexes()
+        notifications.ensure_indexes()
+        reservation_holds.ensure_indexes()
+        moderation.ensure_indexes()
+        profile.ensure_indexes()
+        analytics.ensure_indexes()
+        archive.ensure_indexes()
+        invalidation_bus.start() # Cross-worker cache invalidation (if enabled)
     except Exception as e:
         logger.error(f"Failed to connect to database on startup: {e}", exc_info=True)
+    feed_snapshot.start() # Keeps the serialized GET /api/food payload warm
+    jobs.start() # Deferred and periodic work, off the request path
+    reservation_holds.start() # Releases reservations nobody picked up
+    reservation_queue.start()
+    counters.start() # Write-behind counter flushes
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down FastAPI application...")
+    await feed_snapshot.stop()
+    await reservation_holds.stop()
+    reservation_queue.stop()
+    await jobs.stop()
+    await events.drain() # Let queued background subscribers finish
+    await counters.stop() # Flush buffered counter increments
+    invalidation_bus.stop()
     if client:
         client.close()
         logger.info("MongoDB connection closed.")
@@ -52,6 +76,10 @@ async def shutdown_event():
 app.include_router(food.router)
 app.include_router(users.router)
 app.include_router(reports.router)
+app.include_router(batch.router)
+app.include_router(system.router)
+app.include_router(analytics_router.router)
+app.include_router(admin.router)
 
 # Include routers that define full paths (endpoints not under the main prefixes)
 app.include_router(users.misc_user_router)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr # Use EmailStr for validation
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field # Use EmailStr for validation
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from bson import ObjectId # Import ObjectId here if needed for custom types
 
@@ -44,6 +44,25 @@ class Report(ReportBase):
         extra = "allow" # Allow extra fields from DB
         json_encoders = {ObjectId: str, datetime: lambda dt: dt.isoformat()} # Handle datetime
 
+REPORT_REVIEW_STATUSES = ["pending", "resolved", "dismissed", "action_taken"]
+
+class ReportFilter(BaseModel):
+    postId: Optional[str] = None
+    reviewStatus: Optional[str] = None
+    user2ID: Optional[str] = None # Reported user
+
+class BulkReportStatusRequest(BaseModel):
+    status: str
+    admin_id: str
+    report_ids: Optional[List[str]] = None
+    filter: Optional[ReportFilter] = None # Combined with report_ids when both are given
+    hide_posts: bool = False # Also hide the food posts the matched reports are about
+
+class BulkReportStatusResponse(BaseModel):
+    matched: int
+    modified: int
+    hiddenPosts: int = 0
+
 
 # --- User Models ---
 class UserBase(BaseModel):
@@ -70,6 +89,7 @@ class User(UserBase): # Represents user data returned (excluding password)
     role: str = "user"
     postCount: int = 0
     reservationCount: int = 0
+    receivedCount: int = 0
 
     class Config:
         orm_mode = True
@@ -94,6 +114,13 @@ class CanReportResponse(BaseModel):
     canReport: bool
     reason: Optional[str] = None
 
+class BatchCanReportRequest(BaseModel):
+    user_id: str # NetID of the user wanting to report
+    post_ids: List[str]
+
+class BatchCanReportResponse(BaseModel):
+    results: Dict[str, CanReportResponse] # post_id -> eligibility
+
 class UserCheckResponse(User): # Inherits from User model
     pass
 
@@ -103,5 +130,78 @@ class UserProfileResponse(BaseModel):
     profilePicture: Optional[str] = None
     post_count: int
     received_count: int
-    post_history: List # List[Food] if Food model is defined
-    received_history: List # List[Food] if Food model is defined
\ No newline at end of file
+    post_history: List # List[Food] if Food model is defined; entries carry `thumbnail` instead of `photo`
+    received_history: List # List[Food] if Food model is defined; entries carry `thumbnail` instead of `photo`
+
+# --- Batch Lookup Models ---
+MAX_BATCH_IDS = 500 # Upper bound on ids accepted by a single batch lookup
+
+class FoodIdsRequest(BaseModel):
+    food_ids: List[str]
+
+class PostersResponse(BaseModel):
+    posters: Dict[str, str] # food_id -> poster netId
+    missing: List[str] = [] # Ids that were invalid, not found or had no poster
+
+class UserBatchRequest(BaseModel):
+    googleIds: List[str] = []
+    netIds: List[str] = []
+
+class UserBatchResponse(BaseModel):
+    users: List[User]
+    missing: List[str] = [] # Requested googleIds/netIds with no matching user
+
+class UserReputation(BaseModel):
+    netId: str
+    reportsReceived: int = 0
+    reportsResolvedAgainst: int = 0 # Reports an admin upheld
+    handoffsGiven: int = 0
+    handoffsReceived: int = 0
+
+class ReputationBatchResponse(BaseModel):
+    reputations: Dict[str, UserReputation] # netId -> reputation
+
+
+# --- Multiplexed Batch Models ---
+class BatchSubRequest(BaseModel):
+    path: str # Path plus optional query string, e.g. "/api/food/search?category=Meal"
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
+
+class BatchSubResponse(BaseModel):
+    path: str
+    status: int
+    body: Any = None
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
+
+
+# --- Partial Claim Models ---
+class ClaimRequest(BaseModel):
+    food_id: str
+    user: str # NetID of the claimer
+    units: int = Field(1, ge=1) # How many of the post's quantity to claim
+
+class ClaimCompleteRequest(BaseModel):
+    food_id: str
+    claim_id: str
+    user: str # Must be the claimer
+
+
+# --- Bulk Post Models ---
+MAX_BULK_POSTS = 100 # Upper bound on items accepted by POST /api/food/bulk
+
+class FoodPostItem(BaseModel):
+    """One item of a bulk post; same fields as the POST /api/food form."""
+    foodName: str
+    quantity: int = Field(..., ge=1)
+    category: str
+    dietaryInfo: str
+    pickupLocation: str
+    pickupTime: str
+    photo: Any # {"uri": ...} object, its JSON string, or a bare uri / URL
+    user: str # Poster's netId
+    expirationTime: str
+    createdAt: Optional[str] = None # Defaults to the server time
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from pymongo.collection import Collection
+from datetime import datetime
+import logging
+from typing import Optional
+
+from database import get_users_collection
+from services import exports
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["Admin"],
+)
+
+def get_user_db() -> Collection:
+    return get_users_collection()
+
+
+@router.get("/export/{dataset}") # Corresponds to GET /api/admin/export/{posts|reports|users}[_archive]
+def export_dataset(
+    dataset: str,
+    admin_id: str, # netId of the requesting admin
+    format: str = "ndjson", # Or "csv"
+    fields: Optional[str] = None, # Comma-separated subset of the dataset's exportable fields
+    since: Optional[datetime] = None, # On the dataset's date field (timestamp, submittedAt, createdAt)
+    until: Optional[datetime] = None,
+    user_db: Collection = Depends(get_user_db)
+):
+    logger.info(f"Received export request by {admin_id}: dataset={dataset}, format={format}, fields={fields}, since={since}, until={until}")
+    admin = user_db.find_one({"netId": admin_id}, {"role": 1})
+    if not admin or admin.get("role") != "admin":
+        logger.warning(f"Export of {dataset} refused for non-admin user: {admin_id}")
+        raise HTTPException(status_code=403, detail="Only admins can export data.")
+    if dataset not in exports.DATASETS:
+        raise HTTPException(status_code=404, detail=f"Unknown dataset. Must be one of: {', '.join(exports.DATASETS)}")
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(exports.FORMATS)}")
+    try:
+        selected = exports.resolve_fields(dataset, [field.strip() for field in fields.split(",") if field.strip()] if fields else None)
+    except ValueError as ve:
+        raise HTTPException(status_code=400, detail=str(ve))
+
+    filename = f"{dataset}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+    return StreamingResponse(
+        exports.stream(dataset, format, selected, since, until), # Sync generator: iterated in the threadpool
+        media_type=exports.FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -0,0 +1,60 @@
+from fastapi import APIRouter, HTTPException
+from datetime import datetime, timedelta
+import logging
+from typing import Optional
+
+from services import analytics
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/analytics",
+    tags=["Analytics"],
+)
+
+
+def _date_range(since: Optional[datetime], until: Optional[datetime], default_span: timedelta):
+    until = until or datetime.now()
+    since = since or until - default_span
+    if since >= until:
+        raise HTTPException(status_code=400, detail="'since' must be before 'until'")
+    return since, until
+
+
+@router.get("/activity") # Corresponds to GET /api/analytics/activity
+def get_activity(
+    granularity: str = "day", # Or "hour"
+    since: Optional[datetime] = None, # Defaults to the last 30 days (48 hours for hourly buckets)
+    until: Optional[datetime] = None,
+    location: Optional[str] = None # Exact pickupLocation; all locations when omitted
+):
+    logger.info(f"Received analytics activity request: granularity={granularity}, since={since}, until={until}, location={location}")
+    if granularity not in analytics.GRANULARITIES:
+        raise HTTPException(status_code=400, detail=f"Invalid granularity. Must be one of: {', '.join(analytics.GRANULARITIES)}")
+    since, until = _date_range(since, until, timedelta(hours=48) if granularity == "hour" else timedelta(days=30))
+    if granularity == "hour" and until - since > analytics.MAX_HOURLY_RANGE:
+        raise HTTPException(status_code=400, detail=f"Hourly ranges are limited to {analytics.MAX_HOURLY_RANGE.days} days; use granularity=day")
+    try:
+        buckets = analytics.series(granularity, since, until, location)
+        return {
+            "granularity": granularity, "since": since.isoformat(), "until": until.isoformat(),
+            "buckets": buckets, "totals": analytics.totals(buckets),
+        }
+    except Exception as e:
+        logger.error(f"Error fetching analytics activity: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching analytics.")
+
+
+@router.get("/locations") # Corresponds to GET /api/analytics/locations
+def get_location_activity(
+    since: Optional[datetime] = None, # Defaults to the last 30 days; counted in whole days
+    until: Optional[datetime] = None
+):
+    logger.info(f"Received analytics locations request: since={since}, until={until}")
+    since, until = _date_range(since, until, timedelta(days=30))
+    try:
+        locations = analytics.by_location(since, until)
+        return {"since": since.isoformat(), "until": until.isoformat(), "locations": locations, "totals": analytics.totals(locations)}
+    except Exception as e:
+        logger.error(f"Error fetching analytics by location: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching analytics.")
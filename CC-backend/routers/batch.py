@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Request
+from urllib.parse import urlsplit, unquote
+import asyncio
+import logging
+import json
+
+from models import BatchRequest, BatchResponse
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/batch",
+    tags=["Batch"],
+)
+
+MAX_BATCH_REQUESTS = 20 # Upper bound on sub-requests per batch
+
+
+async def _dispatch_get(app, path: str) -> dict:
+    """Runs a single GET sub-request through the ASGI app in-process and collects its response."""
+    parts = urlsplit(path)
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": unquote(parts.path),
+        "raw_path": parts.path.encode("latin-1"),
+        "query_string": parts.query.encode("latin-1"),
+        "root_path": "",
+        "headers": [(b"host", b"batch"), (b"accept", b"application/json")],
+        "client": ("batch", 0),
+        "server": ("batch", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    response = {"status": 500, "headers": [], "body": b""}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+
+    body = response["body"].decode("utf-8") if response["body"] else None
+    content_type = dict(response["headers"]).get(b"content-type", b"").decode("latin-1")
+    if body and content_type.startswith("application/json"):
+        body = json.loads(body)
+    return {"path": path, "status": response["status"], "body": body}
+
+
+@router.post("", response_model=BatchResponse) # Corresponds to POST /api/batch
+async def batch(request: BatchRequest, http_request: Request):
+    # Lets composite screens (profile, feed, lookups) load in one network round trip
+    paths = [sub_request.path for sub_request in request.requests]
+    logger.info(f"Received batch request with {len(paths)} sub-requests.")
+
+    if not paths:
+        raise HTTPException(status_code=400, detail="At least one sub-request is required.")
+    if len(paths) > MAX_BATCH_REQUESTS:
+        logger.warning(f"Batch request exceeded limit: {len(paths)} > {MAX_BATCH_REQUESTS}")
+        raise HTTPException(status_code=400, detail=f"Too many sub-requests. A maximum of {MAX_BATCH_REQUESTS} is allowed per batch.")
+
+    async def run(path: str) -> dict:
+        if not path.startswith("/api/") or path.startswith(router.prefix):
+            return {"path": path, "status": 400, "body": {"detail": "Sub-request path must be an /api/ route other than /api/batch."}}
+        try:
+            return await _dispatch_get(http_request.app, path)
+        except Exception as e:
+            logger.error(f"Error dispatching batch sub-request {path}: {e}", exc_info=True)
+            return {"path": path, "status": 500, "body": {"detail": "An unexpected error occurred while processing the sub-request."}}
+
+    # Sub-requests share this request's event loop (and the services bound to it); GET handlers
+    # that block on the database are plain functions, which FastAPI runs in its threadpool
+    responses = await asyncio.gather(*(run(path) for path in paths))
+    logger.info(f"Batch completed: {[r['status'] for r in responses]}")
+    return {"responses": responses}
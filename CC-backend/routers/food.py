@@ -1,14 +1,22 @@
-from fastapi import APIRouter, Form, HTTPException, Body, Depends
+from fastapi import APIRouter, Form, HTTPException, Body, Depends, Request, Response, Query
+from fastapi.responses import RedirectResponse, JSONResponse
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
 from bson import ObjectId
 from bson.errors import InvalidId
 import logging
 import json
+import base64
+import binascii
 from datetime import datetime
-from typing import Optional, List # Import List if needed for response models
+from typing import Optional, List, Any # Import List if needed for response models
 
 # Import necessary components from other modules
-from database import get_food_collection, get_users_collection # Assuming users needed for validation?
+from database import get_food_collection, get_users_collection, get_feed_view_collection
+from models import FoodIdsRequest, PostersResponse, MAX_BATCH_IDS, ClaimRequest, ClaimCompleteRequest, FoodPostItem, MAX_BULK_POSTS
+from services import activity_log, archive, events, feed_snapshot, feed_view, reservation_holds, reservation_queue
 # from models import Food, FoodCreate # Import models if you use them for request/response
 
 logger = logging.getLogger(__name__)
@@ -24,6 +32,26 @@ router = APIRouter(
 def get_food_db() -> Collection:
     return get_food_collection()
 
+def get_feed_view_db() -> Collection: # Read model used by the list endpoints
+    return get_feed_view_collection()
+
+def _accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip, honouring q-values (`gzip;q=0` refuses it)."""
+    weights = {}
+    for entry in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in entry.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0 # Malformed weight: don't guess
+        if coding:
+            weights[coding.lower()] = q
+    return weights.get("gzip", weights.get("*", 0.0)) > 0
+
 # --- Endpoint Implementations ---
 # Keep the function signatures identical to main_old.py
 
@@ -55,7 +83,7 @@ async def post_food(
         #         expirationTime_dt = ...
 
         food_data = {
-            "foodName": foodName, "quantity": quantity, "category": category,
+            "foodName": foodName, "quantity": quantity, "remainingQuantity": quantity, "category": category,
             "dietaryInfo": dietaryInfo, "pickupLocation": pickupLocation,
             "pickupTime": pickupTime, "photo": photo, # Store as string as before
             "status": "green",
@@ -68,6 +96,7 @@ async def post_food(
         }
 
         result = db.insert_one(food_data)
+        events.emit(events.FoodPosted(food=food_data)) # insert_one added the new _id to food_data
         logger.info(f"Food post created successfully with id: {result.inserted_id} by user: {user}")
         return {"message": "Food post created successfully", "food_id": str(result.inserted_id)}
 
@@ -79,38 +108,97 @@ async def post_food(
 
 
 
-@router.get("") # Corresponds to GET /api/food
-async def get_food(db: Collection = Depends(get_food_db)):
-    logger.info("Received request to get all food posts.")
+def photo_field(photo: Any) -> str:
+    """Normalizes a photo reference to the stored form, a JSON string like '{"uri": ...}'."""
+    if isinstance(photo, dict) and isinstance(photo.get("uri"), str):
+        return json.dumps(photo)
+    if isinstance(photo, str) and photo:
+        try:
+            parsed = json.loads(photo)
+        except json.JSONDecodeError:
+            return json.dumps({"uri": photo}) # Bare data URI or URL
+        if isinstance(parsed, dict) and isinstance(parsed.get("uri"), str):
+            return photo
+    raise ValueError('photo must be a {"uri": ...} object, its JSON string, or a uri')
+
+
+@router.post("/bulk") # Corresponds to POST /api/food/bulk
+async def post_food_bulk(items: List[Any] = Body(...), db: Collection = Depends(get_food_db)):
+    logger.info(f"Received bulk food post request with {len(items)} items")
+    if not items:
+        raise HTTPException(status_code=400, detail="At least one item is required.")
+    if len(items) > MAX_BULK_POSTS:
+        logger.warning(f"Bulk food post rejected: {len(items)} items exceeds limit {MAX_BULK_POSTS}")
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_POSTS} items can be posted at once.")
+
+    results: List[dict] = [None] * len(items)
+    docs, doc_indexes = [], []
+    now = datetime.now()
+    for index, raw in enumerate(items):
+        try:
+            if not isinstance(raw, dict):
+                raise ValueError("item must be an object")
+            item = FoodPostItem(**raw)
+            photo = photo_field(item.photo)
+        except ValidationError as ve:
+            results[index] = {"index": index, "error": "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in ve.errors())}
+            continue
+        except ValueError as ve:
+            results[index] = {"index": index, "error": str(ve)}
+            continue
+        docs.append({
+            "foodName": item.foodName, "quantity": item.quantity, "remainingQuantity": item.quantity, "category": item.category,
+            "dietaryInfo": item.dietaryInfo, "pickupLocation": item.pickupLocation,
+            "pickupTime": item.pickupTime, "photo": photo,
+            "status": "green",
+            "postedBy": item.user,
+            "reportCount": 0,
+            "timestamp": now,
+            "reservedBy": "None",
+            "expirationTime": item.expirationTime,
+            "createdAt": item.createdAt or now.isoformat(),
+        })
+        doc_indexes.append(index)
+
     try:
-        food_posts_cursor = db.find({})
-        food_posts = []
-        for food in food_posts_cursor:
-            food["id"] = str(food["_id"])
-            food.pop("_id")
-
-            # Process photo field
-            if "photo" in food and isinstance(food["photo"], str):
-                try:
-                    photo_data = json.loads(food["photo"])
-                    # Assuming frontend expects the 'uri' field directly
-                    food["photo"] = photo_data.get("uri", food["photo"]) # Keep original if no uri
-                except json.JSONDecodeError:
-                    logger.warning(f"Failed to parse photo JSON for food item {food['id']}: {food['photo']}")
-                    # Keep the original string if parsing fails, or set to ""?
-                    # food["photo"] = "" # Uncomment to clear invalid photo data
+        failed = {}
+        if docs:
+            try:
+                db.insert_many(docs, ordered=False) # One round trip; a bad document doesn't stop the rest
+            except BulkWriteError as bwe:
+                failed = {err["index"]: err.get("errmsg", "Insert failed") for err in bwe.details.get("writeErrors", [])}
+                logger.warning(f"Bulk food post: {len(failed)} of {len(docs)} inserts failed")
+
+        inserted = []
+        for position, (index, doc) in enumerate(zip(doc_indexes, docs)):
+            if position in failed:
+                results[index] = {"index": index, "error": failed[position]}
             else:
-                 # Ensure photo field exists even if null or not string
-                 food["photo"] = food.get("photo", "")
+                results[index] = {"index": index, "food_id": str(doc["_id"])}
+                inserted.append(doc)
+        if inserted:
+            events.emit(events.FoodBatchPosted(foods=inserted))
 
-            # Convert datetime objects to ISO strings if needed for JSON response
-            if isinstance(food.get("timestamp"), datetime):
-                food["timestamp"] = food["timestamp"].isoformat()
+        logger.info(f"Bulk food post: {len(inserted)} inserted, {len(items) - len(inserted)} rejected")
+        return {"message": "Bulk food post processed", "inserted": len(inserted), "failed": len(items) - len(inserted), "results": results}
+
+    except Exception as e:
+        logger.error(f"Error during bulk food post: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while posting food.")
 
-            food_posts.append(food)
 
-        logger.info(f"Returning {len(food_posts)} food posts.")
-        return {"food_posts": food_posts} # Match original structure
+@router.get("") # Corresponds to GET /api/food
+def get_food(request: Request, db: Collection = Depends(get_feed_view_db)):
+    logger.info("Received request to get all food posts.")
+    try:
+        # Served from the pre-serialized snapshot; the background refresher keeps it current
+        snapshot = feed_snapshot.get_snapshot(db)
+        headers = {"Vary": "Accept-Encoding", "X-Feed-Version": str(snapshot.version)}
+        logger.info(f"Returning {snapshot.count} food posts from snapshot v{snapshot.version}.")
+        if _accepts_gzip(request.headers.get("accept-encoding", "")):
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=snapshot.gzipped, media_type="application/json", headers=headers)
+        return Response(content=snapshot.identity, media_type="application/json", headers=headers)
     except Exception as e:
         logger.error(f"Error fetching food posts: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching food posts.")
@@ -132,6 +220,9 @@ async def reserve_food(payload: dict = Body(...), db: Collection = Depends(get_f
         logger.warning(f"Invalid food_id format for reservation: {food_id}")
         raise HTTPException(status_code=400, detail=f"Invalid food_id format: {food_id}")
 
+    if reservation_queue.RESERVATION_QUEUE_ENABLED:
+        return await reserve_food_queued(food_id, user)
+
     try:
         # Combine find and update for atomicity if possible, otherwise handle race conditions
         food_item = db.find_one({"_id": food_object_id})
@@ -143,7 +234,10 @@ async def reserve_food(payload: dict = Body(...), db: Collection = Depends(get_f
         current_status = food_item.get("status", "green")
         reserved_by = food_item.get("reservedBy", "None")
 
-        if current_status == "yellow":
+        if food_item.get("hidden"):
+            logger.warning(f"Attempt to reserve hidden food item: foodId={food_id}, attempted by user={user}")
+            raise HTTPException(status_code=400, detail="Food item is no longer available")
+        elif current_status == "yellow":
              logger.warning(f"Attempt to reserve already reserved food item: foodId={food_id}, current reservedBy={reserved_by}, attempted by user={user}")
              raise HTTPException(status_code=400, detail="Food item is already reserved")
         elif current_status == "red":
@@ -155,9 +249,10 @@ async def reserve_food(payload: dict = Body(...), db: Collection = Depends(get_f
 
 
         # Attempt to update, ensuring it's still green
+        hold_until = reservation_holds.hold_deadline() # Released back to green if not completed by then
         result = db.update_one(
-            {"_id": food_object_id, "status": "green"},
-            {"$set": {"status": "yellow", "reservedBy": user}}
+            {"_id": food_object_id, "status": "green", "claims": {"$exists": False}, "hidden": {"$ne": True}}, # Not while portions are claimed
+            {"$set": {"status": "yellow", "reservedBy": user, "holdUntil": hold_until}}
         )
 
         if result.modified_count == 0:
@@ -166,13 +261,16 @@ async def reserve_food(payload: dict = Body(...), db: Collection = Depends(get_f
             refreshed_item = db.find_one({"_id": food_object_id})
             if not refreshed_item:
                  raise HTTPException(status_code=404, detail="Food item not found (disappeared before update).")
-            elif refreshed_item.get("status") != "green":
+            elif refreshed_item.get("status") != "green" or refreshed_item.get("hidden"):
                  raise HTTPException(status_code=400, detail="Food item is no longer available for reservation (status changed).")
+            elif refreshed_item.get("claims"):
+                 raise HTTPException(status_code=409, detail="Food item is being shared in portions; claim units instead.")
             else:
                  raise HTTPException(status_code=500, detail="Failed to reserve the food item due to an unexpected conflict.")
 
-        logger.info(f"Food item {food_id} successfully reserved by user {user}")
-        return {"message": "Food item reserved successfully", "food_id": food_id, "reservedBy": user}
+        events.emit(events.FoodReserved(foodId=food_id, reservedBy=user, holdUntil=hold_until))
+        logger.info(f"Food item {food_id} successfully reserved by user {user} until {hold_until}")
+        return {"message": "Food item reserved successfully", "food_id": food_id, "reservedBy": user, "holdUntil": hold_until.isoformat()}
 
     except HTTPException as he:
         raise he
@@ -181,6 +279,46 @@ async def reserve_food(payload: dict = Body(...), db: Collection = Depends(get_f
         raise HTTPException(status_code=500, detail="An unexpected error occurred during reservation.")
 
 
+async def reserve_food_queued(food_id: str, user: str):
+    """Contention mode: attempts go through the per-post admission queue; losers get a place in line."""
+    try:
+        result = await reservation_queue.reserve(food_id, user)
+    except Exception as e:
+        logger.error(f"Error reserving food item {food_id} for user {user} through the queue: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred during reservation.")
+
+    if result["status"] == reservation_queue.RESERVED:
+        logger.info(f"Food item {food_id} successfully reserved by user {user} until {result['holdUntil']}")
+        return {"message": "Food item reserved successfully", "food_id": food_id, "reservedBy": user, "holdUntil": result["holdUntil"].isoformat()}
+    if result["status"] == reservation_queue.WAITLISTED:
+        logger.info(f"User {user} is #{result['position']} in line for food item {food_id}")
+        return JSONResponse(status_code=202, content={
+            "message": f"You're #{result['position']} in line",
+            "food_id": food_id,
+            "position": result["position"],
+            "waitlistLength": result["length"],
+        })
+    if result["status"] == reservation_queue.NOT_FOUND:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    if result.get("reason") == "already_holder":
+        raise HTTPException(status_code=400, detail="Food item is already reserved")
+    raise HTTPException(status_code=400, detail="Food item is no longer available")
+
+
+@router.get("/{food_id}/queue") # Corresponds to GET /api/food/{food_id}/queue
+async def get_queue_position(food_id: str, user: str):
+    logger.info(f"Received waitlist position request for foodId: {food_id} by user: {user}")
+    return {"food_id": food_id, **reservation_queue.position(food_id, user)}
+
+
+@router.delete("/{food_id}/queue") # Corresponds to DELETE /api/food/{food_id}/queue
+async def leave_queue(food_id: str, user: str):
+    logger.info(f"User {user} leaving the waitlist for foodId: {food_id}")
+    if not reservation_queue.leave(food_id, user):
+        raise HTTPException(status_code=404, detail="Not in line for this food item")
+    return {"message": "Left the waitlist", "food_id": food_id}
+
+
 @router.post("/complete") # Corresponds to POST /api/food/complete
 async def complete_transaction(
     food_id: str = Form(...),
@@ -213,7 +351,7 @@ async def complete_transaction(
         # Attempt update, ensuring state matches
         result = db.update_one(
             {"_id": food_object_id, "status": "yellow", "reservedBy": user},
-            {"$set": {"status": "red"}} # Mark as completed/unavailable
+            {"$set": {"status": "red"}, "$unset": {"holdUntil": ""}} # Mark as completed/unavailable
         )
 
         if result.modified_count == 0:
@@ -227,6 +365,7 @@ async def complete_transaction(
             else:
                  raise HTTPException(status_code=500, detail="Failed to complete the transaction due to an unexpected conflict.")
 
+        events.emit(events.FoodCompleted(foodId=food_id, completedBy=user, postedBy=food_item.get("postedBy")))
         logger.info(f"Transaction completed successfully for foodId: {food_id} by user: {user}")
         return {"message": "Transaction completed successfully", "food_id": food_id, "status": "red"}
 
@@ -237,13 +376,131 @@ async def complete_transaction(
         raise HTTPException(status_code=500, detail="An unexpected error occurred during transaction completion.")
 
 
+@router.post("/claim") # Corresponds to POST /api/food/claim
+async def claim_food(claim: ClaimRequest, db: Collection = Depends(get_food_db)):
+    food_id, user, units = claim.food_id, claim.user, claim.units
+    logger.info(f"Received claim request for {units} unit(s) of foodId: {food_id} by user: {user}")
+
+    try:
+        food_object_id = ObjectId(food_id)
+    except InvalidId:
+        logger.warning(f"Invalid food_id format for claim: {food_id}")
+        raise HTTPException(status_code=400, detail=f"Invalid food_id format: {food_id}")
+
+    try:
+        claim_record = {
+            "claimId": str(ObjectId()),
+            "user": user,
+            "units": units,
+            "status": "held",
+            "claimedAt": datetime.now(),
+        }
+        for _ in range(2):
+            # One conditional decrement: succeeds only while enough units remain
+            updated = db.find_one_and_update(
+                {"_id": food_object_id, "status": "green", "remainingQuantity": {"$gte": units}, "hidden": {"$ne": True}},
+                {"$inc": {"remainingQuantity": -units}, "$push": {"claims": claim_record}},
+                projection={"remainingQuantity": 1},
+                return_document=ReturnDocument.AFTER,
+            )
+            if updated is not None:
+                break
+
+            food_item = db.find_one({"_id": food_object_id}, {"status": 1, "quantity": 1, "remainingQuantity": 1, "hidden": 1})
+            if not food_item:
+                logger.warning(f"Food item not found for claim: foodId={food_id}")
+                raise HTTPException(status_code=404, detail="Food item not found")
+            if food_item.get("status") != "green" or food_item.get("hidden"):
+                logger.warning(f"Attempt to claim unavailable food item: foodId={food_id}, status={food_item.get('status')}, user={user}")
+                raise HTTPException(status_code=400, detail="Food item is no longer available")
+            if "remainingQuantity" not in food_item:
+                # Posted before partial claims existed: start counting from its quantity, then retry
+                db.update_one(
+                    {"_id": food_object_id, "remainingQuantity": {"$exists": False}},
+                    {"$set": {"remainingQuantity": int(food_item.get("quantity") or 1)}}
+                )
+                continue
+            remaining = food_item.get("remainingQuantity", 0)
+            logger.warning(f"Claim of {units} unit(s) on foodId={food_id} by {user} exceeds remaining {remaining}")
+            raise HTTPException(status_code=409, detail=f"Only {remaining} unit(s) left.")
+        else:
+            raise HTTPException(status_code=500, detail="Failed to claim the food item due to an unexpected conflict.")
+
+        remaining = updated["remainingQuantity"]
+        if remaining == 0:
+            # Fully claimed: only now does the post leave the marketplace
+            db.update_one({"_id": food_object_id, "status": "green", "remainingQuantity": 0}, {"$set": {"status": "yellow"}})
+
+        events.emit(events.FoodClaimed(foodId=food_id, claimId=claim_record["claimId"], user=user, units=units, remaining=remaining))
+        logger.info(f"User {user} claimed {units} unit(s) of food item {food_id}; {remaining} left")
+        return {"message": "Food claimed successfully", "food_id": food_id, "claim_id": claim_record["claimId"],
+                "units": units, "remainingQuantity": remaining}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error claiming food item {food_id} for user {user}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while claiming food.")
+
+
+@router.post("/claim/complete") # Corresponds to POST /api/food/claim/complete
+async def complete_claim(request: ClaimCompleteRequest, db: Collection = Depends(get_food_db)):
+    food_id, claim_id, user = request.food_id, request.claim_id, request.user
+    logger.info(f"Received claim completion for claim {claim_id} on foodId: {food_id} by user: {user}")
+
+    try:
+        food_object_id = ObjectId(food_id)
+    except InvalidId:
+        logger.warning(f"Invalid food_id format for claim completion: {food_id}")
+        raise HTTPException(status_code=400, detail=f"Invalid food_id format: {food_id}")
+
+    try:
+        now = datetime.now()
+        result = db.update_one(
+            {"_id": food_object_id, "claims": {"$elemMatch": {"claimId": claim_id, "user": user, "status": "held"}}},
+            {"$set": {"claims.$.status": "completed", "claims.$.completedAt": now}}
+        )
+        if result.modified_count == 0:
+            food_item = db.find_one({"_id": food_object_id}, {"claims": 1})
+            if not food_item:
+                raise HTTPException(status_code=404, detail="Food item not found")
+            existing = next((c for c in food_item.get("claims", []) if c.get("claimId") == claim_id), None)
+            if existing is None:
+                raise HTTPException(status_code=404, detail="Claim not found")
+            if existing.get("user") != user:
+                logger.warning(f"Unauthorized attempt to complete claim {claim_id} on foodId={food_id} by {user}")
+                raise HTTPException(status_code=403, detail="You are not authorized to complete this claim.")
+            raise HTTPException(status_code=400, detail="Claim is already completed.")
+
+        events.emit(events.ClaimCompleted(foodId=food_id, claimId=claim_id, user=user))
+
+        # The post is done once every unit is claimed and every claim picked up
+        finished = db.find_one_and_update(
+            {"_id": food_object_id, "status": "yellow", "remainingQuantity": 0,
+             "claims": {"$not": {"$elemMatch": {"status": "held"}}}},
+            {"$set": {"status": "red"}},
+            projection={"postedBy": 1}
+        )
+        post_completed = finished is not None
+        if post_completed:
+            events.emit(events.FoodCompleted(foodId=food_id, completedBy=user, postedBy=finished.get("postedBy"), viaClaims=True))
+        logger.info(f"Claim {claim_id} on food item {food_id} completed by {user} (post completed: {post_completed})")
+        return {"message": "Claim completed successfully", "food_id": food_id, "claim_id": claim_id, "postCompleted": post_completed}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error completing claim {claim_id} on food {food_id} by user {user}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while completing the claim.")
+
+
 @router.get("/search") # Corresponds to GET /api/food/search
-async def search_food(
+def search_food(
     foodName: Optional[str] = None,
     category: Optional[str] = None,
     pickupLocation: Optional[str] = None,
     pickupTime: Optional[str] = None,
-    db: Collection = Depends(get_food_db)
+    db: Collection = Depends(get_feed_view_db)
 ):
     query = {}
     log_params = []
@@ -266,27 +523,7 @@ async def search_food(
     logger.info(f"Received food search request with params: {', '.join(log_params) if log_params else 'None'}")
 
     try:
-        food_posts_cursor = db.find(query)
-        food_posts = []
-        for food in food_posts_cursor:
-            food["id"] = str(food["_id"])
-            food.pop("_id")
-            # Process photo field consistently
-            if "photo" in food and isinstance(food["photo"], str):
-                try:
-                    photo_data = json.loads(food["photo"])
-                    food["photo"] = photo_data.get("uri", food["photo"])
-                except json.JSONDecodeError:
-                     # Keep original or clear
-                     pass # Keep original string on error
-            else:
-                food["photo"] = food.get("photo", "")
-
-            # Convert datetimes
-            if isinstance(food.get("timestamp"), datetime):
-                food["timestamp"] = food["timestamp"].isoformat()
-
-            food_posts.append(food)
+        food_posts = [feed_view.serialize_entry(entry) for entry in feed_view.find_entries(query, db)]
 
         logger.info(f"Food search returned {len(food_posts)} results.")
         # Return in the original format expected by the frontend
@@ -296,8 +533,31 @@ async def search_food(
         raise HTTPException(status_code=500, detail="An unexpected error occurred during food search.")
 
 
+@router.get("/activity") # Corresponds to GET /api/food/activity
+def get_recent_activity(
+    limit: int = Query(50, ge=1, le=activity_log.MAX_RECENT_ACTIVITY),
+    after: Optional[str] = None, # Last activity id the client has seen; only newer entries are returned
+    foodId: Optional[str] = None
+):
+    logger.info(f"Received request for recent food activity: limit={limit}, after={after}, foodId={foodId}")
+    after_id = None
+    if after:
+        try:
+            after_id = ObjectId(after)
+        except InvalidId:
+            logger.warning(f"Invalid activity cursor: {after}")
+            raise HTTPException(status_code=400, detail=f"Invalid activity id format: {after}")
+
+    try:
+        entries = activity_log.recent(limit=limit, after=after_id, food_id=foodId)
+        return {"activity": entries}
+    except Exception as e:
+        logger.error(f"Error fetching recent food activity: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching recent activity.")
+
+
 @router.get("/poster-netid/{food_id}") # Corresponds to GET /api/food/poster-netid/{food_id}
-async def get_poster_netid(food_id: str, db: Collection = Depends(get_food_db)):
+def get_poster_netid(food_id: str, db: Collection = Depends(get_food_db)):
     logger.info(f"Received request for poster netId for foodId: {food_id}")
     try:
         food_object_id = ObjectId(food_id)
@@ -324,4 +584,84 @@ async def get_poster_netid(food_id: str, db: Collection = Depends(get_food_db)):
         raise he
     except Exception as e:
         logger.error(f"Error fetching poster netId for food {food_id}: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching poster information.")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching poster information.")
+
+
+@router.post("/posters", response_model=PostersResponse) # Corresponds to POST /api/food/posters
+async def get_poster_netids(request: FoodIdsRequest, db: Collection = Depends(get_food_db)):
+    # Batch version of get_poster_netid: resolves a whole screen of cards in one $in query
+    food_ids = list(dict.fromkeys(request.food_ids)) # De-duplicate, keep order
+    logger.info(f"Received batch poster netId request for {len(food_ids)} food ids.")
+
+    if len(food_ids) > MAX_BATCH_IDS:
+        logger.warning(f"Batch poster request exceeded limit: {len(food_ids)} > {MAX_BATCH_IDS}")
+        raise HTTPException(status_code=400, detail=f"Too many food ids. A maximum of {MAX_BATCH_IDS} is allowed per request.")
+
+    object_ids = []
+    missing = []
+    for food_id in food_ids:
+        if ObjectId.is_valid(food_id):
+            object_ids.append(ObjectId(food_id))
+        else:
+            logger.warning(f"Invalid food_id format in batch poster request: {food_id}")
+            missing.append(food_id)
+
+    try:
+        posters = {}
+        if object_ids:
+            # Projection: only fetch the postedBy field
+            for food_post in db.find({"_id": {"$in": object_ids}}, {"postedBy": 1}):
+                if food_post.get("postedBy"):
+                    posters[str(food_post["_id"])] = food_post["postedBy"]
+
+        missing.extend(food_id for food_id in food_ids if ObjectId.is_valid(food_id) and food_id not in posters)
+        logger.info(f"Resolved {len(posters)} poster netIds, {len(missing)} missing.")
+        return {"posters": posters, "missing": missing}
+
+    except Exception as e:
+        logger.error(f"Error fetching poster netIds in batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching poster information.")
+
+
+
+@router.get("/{food_id}/photo") # Corresponds to GET /api/food/{food_id}/photo (feed_view thumbnail reference)
+def get_food_photo(food_id: str, db: Collection = Depends(get_food_db)):
+    try:
+        food_object_id = ObjectId(food_id)
+    except InvalidId:
+        logger.warning(f"Invalid food_id format for get_food_photo: {food_id}")
+        raise HTTPException(status_code=400, detail=f"Invalid food_id format: {food_id}")
+
+    try:
+        food_post = db.find_one({"_id": food_object_id}, {"photo": 1})
+        if not food_post:
+            food_post = archive.get_post_archive_collection().find_one({"_id": food_object_id}, {"photo": 1}) # Profile histories include archived posts
+        if not food_post or not food_post.get("photo"):
+            raise HTTPException(status_code=404, detail="Photo not found")
+
+        uri = food_post["photo"]
+        try:
+            uri = json.loads(uri).get("uri", uri)
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            pass # Stored as a bare uri
+
+        if isinstance(uri, str) and uri.startswith(("http://", "https://")):
+            return RedirectResponse(uri)
+        if not isinstance(uri, str) or not uri.startswith("data:") or ";base64," not in uri:
+            raise HTTPException(status_code=404, detail="Photo not found")
+
+        header, encoded = uri.split(",", 1)
+        media_type = header[len("data:"):].split(";")[0] or "application/octet-stream"
+        try:
+            content = base64.b64decode(encoded)
+        except (binascii.Error, ValueError):
+            logger.warning(f"Undecodable photo data for food item {food_id}")
+            raise HTTPException(status_code=404, detail="Photo not found")
+        # Photos never change after posting
+        return Response(content=content, media_type=media_type, headers={"Cache-Control": "public, max-age=86400"})
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error fetching photo for food {food_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching the photo.")
@@ -1,5 +1,7 @@
-from fastapi import APIRouter, Form, HTTPException, Depends
+from fastapi import APIRouter, Form, HTTPException, Depends, Query
+from pymongo import ReturnDocument
 from pymongo.collection import Collection
+from pymongo.errors import DuplicateKeyError
 from bson import ObjectId
 from bson.errors import InvalidId
 from pydantic import ValidationError
@@ -9,7 +11,12 @@ from typing import List, Optional # Import List for response model
 
 # Import necessary components
 from database import get_report_collection, get_food_collection
-from models import Report, ReportCreate, CanReportResponse # Import relevant models
+from services import events, invalidation_bus, moderation
+from models import (
+    Report, ReportCreate, CanReportResponse, # Import relevant models
+    BatchCanReportRequest, BatchCanReportResponse, MAX_BATCH_IDS,
+    BulkReportStatusRequest, BulkReportStatusResponse, REPORT_REVIEW_STATUSES
+)
 
 logger = logging.getLogger(__name__)
 
@@ -46,55 +53,48 @@ async def submit_report(
         logger.warning(f"Invalid postId format received for reporting: {postId}")
         raise HTTPException(status_code=400, detail=f"Invalid postId format: {postId}")
 
-    # Check if the food post exists before proceeding
-    food_post = food_db.find_one({"_id": post_object_id}, {"_id": 1}) # Just check existence
-    if not food_post:
-        logger.warning(f"Food post not found for reporting: postId={postId}")
-        raise HTTPException(status_code=404, detail="Food post not found, cannot submit report.")
-
-
     try:
-        # Use the ReportCreate model potentially (adjust if needed)
+        now = datetime.now()
         report_data = {
             "postId": postId, # Store the string version as in original
             "user1ID": str(user1Id),
             "user2ID": str(user2Id),
             "message": message,
             "isSubmitted": True,
-            "submittedAt": datetime.now(),
+            "submittedAt": now,
             "reviewStatus": "pending",
             "reviewedBy": None,
             "reviewedAt": None,
         }
 
-        result = report_db.insert_one(report_data)
+        # The unique (postId, user1ID) index rejects a second report from the same user
+        try:
+            result = report_db.insert_one(report_data)
+        except DuplicateKeyError:
+            logger.info(f"User {user1Id} has already reported post {postId}.")
+            raise HTTPException(status_code=409, detail="You have already reported this post")
         report_id = result.inserted_id
         logger.info(f"Report inserted with ID: {report_id} for postId: {postId}")
 
-        # Increment report count on the food post atomically
-        update_result = food_db.update_one(
-            {"_id": post_object_id},
-            {"$inc": {"reportCount": 1}}
-        )
-
-        if update_result.matched_count == 0:
-             # This is unlikely given the check above, but log if it happens
-             logger.error(f"Failed to find food post {postId} to increment report count after report {report_id} was inserted.")
-        else:
-            logger.info(f"Incremented report count for postId {postId}. Modified count: {update_result.modified_count}")
+        if food_db.find_one({"_id": post_object_id}, {"_id": 1}) is None:
+            report_db.delete_one({"_id": report_id}) # Nothing to report: undo the insert
+            logger.warning(f"Food post not found for reporting: postId={postId}")
+            raise HTTPException(status_code=404, detail="Food post not found, cannot submit report.")
 
+        # Buffered: the count (and the auto-hide threshold) is applied on the next counter flush
+        moderation.count_report(post_object_id)
+        events.emit(events.ReportSubmitted(reportId=str(report_id), postId=postId, user1ID=str(user1Id), user2ID=str(user2Id)))
 
         return {"message": "Report submitted successfully", "report_id": str(report_id)}
 
     except HTTPException as he:
         raise he
     except Exception as e:
-        # If insert fails, should we rollback the report count increment? (More complex tx needed)
         logger.error(f"Unexpected error processing report for postId {postId}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An internal server error occurred while processing the report.")
 
 @misc_report_router.get("/api/reports", response_model=List[Report]) # Full path
-async def get_reports(db: Collection = Depends(get_report_db)):
+def get_reports(db: Collection = Depends(get_report_db)):
     logger.info("Received request to get all reports.")
     try:
         reports_cursor = db.find()
@@ -120,6 +120,144 @@ async def get_reports(db: Collection = Depends(get_report_db)):
         raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching reports.")
 
 
+def _queue_filters(reviewStatus: str, reportedUser: Optional[str], since: Optional[datetime], until: Optional[datetime]) -> dict:
+    if reviewStatus != "all" and reviewStatus not in REPORT_REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status value. Must be 'all' or one of: {', '.join(REPORT_REVIEW_STATUSES)}")
+    return {
+        "review_status": None if reviewStatus == "all" else reviewStatus,
+        "reported_user": reportedUser, "since": since, "until": until,
+    }
+
+
+@router.get("/queue") # Corresponds to GET /api/report/queue
+def get_moderation_queue(
+    reviewStatus: str = "pending", # Or "all"
+    reportedUser: Optional[str] = None, # NetID of the reported user (user2ID)
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=moderation.MAX_QUEUE_PAGE),
+    cursor: Optional[str] = None # nextCursor from the previous page
+):
+    logger.info(f"Received moderation queue request: status={reviewStatus}, reportedUser={reportedUser}, since={since}, until={until}, cursor={cursor}")
+    filters = _queue_filters(reviewStatus, reportedUser, since, until)
+    try:
+        return moderation.queue(limit=limit, cursor=cursor, **filters)
+    except ValueError:
+        logger.warning(f"Invalid moderation queue cursor: {cursor}")
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    except Exception as e:
+        logger.error(f"Error fetching moderation queue: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching the moderation queue.")
+
+
+@router.get("/queue/posts") # Corresponds to GET /api/report/queue/posts
+def get_moderation_queue_by_post(
+    reviewStatus: str = "pending", # Or "all"
+    reportedUser: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=moderation.MAX_QUEUE_PAGE),
+    skip: int = Query(0, ge=0)
+):
+    logger.info(f"Received grouped moderation queue request: status={reviewStatus}, reportedUser={reportedUser}, skip={skip}")
+    filters = _queue_filters(reviewStatus, reportedUser, since, until)
+    try:
+        return {"posts": moderation.grouped(limit=limit, skip=skip, **filters)}
+    except Exception as e:
+        logger.error(f"Error fetching grouped moderation queue: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching the moderation queue.")
+
+
+@misc_report_router.get("/api/reports/enriched") # Full path
+def get_reports_enriched(
+    reviewStatus: str = "all", # Or one of REPORT_REVIEW_STATUSES
+    reportedUser: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=moderation.MAX_QUEUE_PAGE),
+    cursor: Optional[str] = None # nextCursor from the previous page
+):
+    logger.info(f"Received enriched reports request: status={reviewStatus}, reportedUser={reportedUser}, cursor={cursor}")
+    filters = _queue_filters(reviewStatus, reportedUser, since, until)
+    try:
+        return moderation.enriched(limit=limit, cursor=cursor, **filters)
+    except ValueError:
+        logger.warning(f"Invalid enriched reports cursor: {cursor}")
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+    except Exception as e:
+        logger.error(f"Error fetching enriched reports: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching reports.")
+
+
+@router.put("/bulk", response_model=BulkReportStatusResponse) # Corresponds to PUT /api/report/bulk
+async def update_report_status_bulk(
+    request: BulkReportStatusRequest,
+    report_db: Collection = Depends(get_report_db),
+    food_db: Collection = Depends(get_food_db)
+):
+    logger.info(f"Received bulk report status update to {request.status} by admin {request.admin_id}")
+    if request.status not in REPORT_REVIEW_STATUSES:
+        raise HTTPException(status_code=400, detail=f"Invalid status value. Must be one of: {', '.join(REPORT_REVIEW_STATUSES)}")
+
+    query = {}
+    if request.report_ids is not None:
+        if len(request.report_ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"Too many report ids. A maximum of {MAX_BATCH_IDS} is allowed per request.")
+        invalid = [report_id for report_id in request.report_ids if not ObjectId.is_valid(report_id)]
+        if invalid:
+            raise HTTPException(status_code=400, detail=f"Invalid report_id format: {', '.join(invalid)}")
+        query["_id"] = {"$in": [ObjectId(report_id) for report_id in request.report_ids]}
+    if request.filter is not None:
+        query.update(request.filter.model_dump(exclude_none=True))
+    if not query:
+        # Never let an empty selection mean "every report"
+        raise HTTPException(status_code=400, detail="Provide report_ids or a non-empty filter.")
+
+    try:
+        now = datetime.now()
+        # Read what is about to change first: a filter on reviewStatus may no longer match after the update
+        post_ids = report_db.distinct("postId", query) if request.hide_posts else []
+        changed = {} # Reported user -> {previous status: count}, for reputation
+        for group in report_db.aggregate([
+            {"$match": query},
+            {"$group": {"_id": {"user2ID": "$user2ID", "reviewStatus": "$reviewStatus"}, "count": {"$sum": 1}}},
+        ]):
+            if group["_id"].get("reviewStatus") != request.status:
+                changed.setdefault(str(group["_id"].get("user2ID")), {})[group["_id"].get("reviewStatus") or "pending"] = group["count"]
+
+        result = report_db.update_many(query, {"$set": {"reviewStatus": request.status, "reviewedBy": request.admin_id, "reviewedAt": now}})
+        logger.info(f"Bulk report update by admin {request.admin_id}: matched {result.matched_count}, modified {result.modified_count}")
+        if changed:
+            events.emit(events.ReportsReviewed(reviewStatus=request.status, reviewedBy=request.admin_id, changed=changed))
+
+        if result.modified_count > 0:
+            if request.report_ids is not None:
+                invalidation_bus.publish(*(f"report:{report_id}" for report_id in request.report_ids))
+            else:
+                invalidation_bus.publish("report") # Matched by filter: every cached report is suspect
+
+        hidden = 0
+        post_object_ids = [ObjectId(post_id) for post_id in post_ids if ObjectId.is_valid(post_id)]
+        # Only posts not hidden yet: those already hidden keep their hiddenBy/hiddenAt and aren't announced again
+        to_hide = food_db.distinct("_id", {"_id": {"$in": post_object_ids}, "hidden": {"$ne": True}}) if post_object_ids else []
+        if to_hide:
+            hidden = food_db.update_many(
+                {"_id": {"$in": to_hide}, "hidden": {"$ne": True}},
+                {"$set": {"hidden": True, "hiddenBy": request.admin_id, "hiddenAt": now}}
+            ).modified_count
+            if hidden:
+                events.emit(events.PostsHidden(foodIds=[str(food_id) for food_id in to_hide], hiddenBy=request.admin_id))
+                logger.info(f"Hid {hidden} food posts after bulk report update by admin {request.admin_id}")
+
+        return {"matched": result.matched_count, "modified": result.modified_count, "hiddenPosts": hidden}
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        logger.error(f"Error during bulk report status update: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while updating report status.")
+
+
 @router.put("/{report_id}") # Corresponds to PUT /api/report/{report_id}
 async def update_report_status(
     report_id: str,
@@ -135,11 +273,9 @@ async def update_report_status(
         logger.warning(f"Invalid report_id format for update: {report_id}")
         raise HTTPException(status_code=400, detail=f"Invalid report_id format: {report_id}")
 
-    # Optional: Validate 'status' value against allowed statuses (e.g., "resolved", "dismissed")
-    allowed_statuses = ["pending", "resolved", "dismissed", "action_taken"] # Example
-    if status not in allowed_statuses:
+    if status not in REPORT_REVIEW_STATUSES:
          logger.warning(f"Invalid status '{status}' provided for report update {report_id}")
-         raise HTTPException(status_code=400, detail=f"Invalid status value. Must be one of: {', '.join(allowed_statuses)}")
+         raise HTTPException(status_code=400, detail=f"Invalid status value. Must be one of: {', '.join(REPORT_REVIEW_STATUSES)}")
 
 
     try:
@@ -148,19 +284,26 @@ async def update_report_status(
             "reviewedBy": admin_id,
             "reviewedAt": datetime.now()
         }
-        result = db.update_one(
+        previous = db.find_one_and_update(
             {"_id": report_object_id},
-            {"$set": update_data}
+            {"$set": update_data},
+            projection={"reviewStatus": 1, "user2ID": 1},
+            return_document=ReturnDocument.BEFORE
         )
 
-        if result.matched_count == 0:
+        if previous is None:
             logger.warning(f"Report not found for status update: reportId={report_id}")
             raise HTTPException(status_code=404, detail="Report not found")
 
-        if result.modified_count > 0:
+        invalidation_bus.publish(f"report:{report_id}")
+        if previous.get("reviewStatus") != status:
+             events.emit(events.ReportsReviewed(
+                 reviewStatus=status, reviewedBy=admin_id,
+                 changed={str(previous.get("user2ID")): {previous.get("reviewStatus") or "pending": 1}},
+             ))
              logger.info(f"Report {report_id} status updated successfully to {status} by admin {admin_id}")
         else:
-             logger.info(f"Report {report_id} status was already {status}. No update performed.")
+             logger.info(f"Report {report_id} status was already {status}.")
 
 
         return {"message": "Report status updated successfully"} # Original response
@@ -173,7 +316,7 @@ async def update_report_status(
 
 
 @router.get("/can-report/{post_id}/{user_id}", response_model=CanReportResponse)
-async def can_report(
+def can_report(
     post_id: str,
     user_id: str, # NetID of the user wanting to report
     report_db: Collection = Depends(get_report_db),
@@ -221,10 +364,68 @@ async def can_report(
         raise HTTPException(status_code=500, detail="An unexpected error occurred while checking report eligibility.")
 
 
+@router.post("/can-report", response_model=BatchCanReportResponse) # Corresponds to POST /api/report/can-report
+async def can_report_batch(
+    request: BatchCanReportRequest,
+    report_db: Collection = Depends(get_report_db),
+    food_db: Collection = Depends(get_food_db)
+):
+    user_id = request.user_id
+    post_ids = list(dict.fromkeys(request.post_ids)) # De-duplicate, keep order
+    logger.info(f"Checking batch 'can-report' for {len(post_ids)} posts, userId={user_id}")
+
+    if len(post_ids) > MAX_BATCH_IDS:
+        logger.warning(f"Batch can-report request exceeded limit: {len(post_ids)} > {MAX_BATCH_IDS}")
+        raise HTTPException(status_code=400, detail=f"Too many post ids. A maximum of {MAX_BATCH_IDS} is allowed per request.")
+
+    results = {}
+    object_ids = []
+    for post_id in post_ids:
+        if ObjectId.is_valid(post_id):
+            object_ids.append(ObjectId(post_id))
+        else:
+            logger.warning(f"Invalid post_id format in batch can_report check: {post_id}")
+            results[post_id] = {"canReport": False, "reason": "Invalid post_id format"}
+
+    try:
+        # One query for ownership, one for prior reports (postId is stored as a string)
+        posters = {}
+        if object_ids:
+            for food_post in food_db.find({"_id": {"$in": object_ids}}, {"postedBy": 1}):
+                posters[str(food_post["_id"])] = food_post.get("postedBy")
+
+        already_reported = set()
+        if posters:
+            reports_cursor = report_db.find(
+                {"postId": {"$in": list(posters)}, "user1ID": user_id},
+                {"postId": 1}
+            )
+            already_reported = {report["postId"] for report in reports_cursor}
+
+        for post_id in post_ids:
+            if post_id in results:
+                continue
+            if post_id not in posters:
+                results[post_id] = {"canReport": False, "reason": "Food post not found"}
+            elif posters[post_id] == user_id:
+                results[post_id] = {"canReport": False, "reason": "You cannot report your own post"}
+            elif post_id in already_reported:
+                results[post_id] = {"canReport": False, "reason": "You have already reported this post"}
+            else:
+                results[post_id] = {"canReport": True, "reason": None}
+
+        logger.info(f"Batch can-report for user {user_id}: {sum(r['canReport'] for r in results.values())} of {len(results)} reportable.")
+        return {"results": results}
+
+    except Exception as e:
+        logger.error(f"Error during batch can_report check for user {user_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while checking report eligibility.")
+
+
 # Test endpoint - Keep on misc router? Or main app?
 # Let's keep it separate on misc_report_router
 @misc_report_router.get("/api/test-report") # Full path
-async def test_report(report_db: Collection = Depends(get_report_db)):
+def test_report(report_db: Collection = Depends(get_report_db)):
     logger.info("Received request for /api/test-report endpoint.")
     try:
         # Create unique test data
@@ -0,0 +1,33 @@
+from fastapi import APIRouter
+import asyncio
+import logging
+import time
+
+from services import counters, events, feed_snapshot, invalidation_bus, jobs, reservation_holds, reservation_queue
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/system",
+    tags=["System"],
+)
+
+
+@router.get("/metrics") # Corresponds to GET /api/system/metrics
+async def get_metrics():
+    logger.info("Received request for system metrics.")
+    snapshot = await asyncio.to_thread(feed_snapshot.get_snapshot) # May build it; the queue stats below must stay on the loop
+    return {
+        "feed_snapshot": {
+            "version": snapshot.version,
+            "count": snapshot.count,
+            "age_s": round(time.time() - snapshot.built_at, 3),
+            "shared": feed_snapshot.FEED_SNAPSHOT_SEGMENT is not None,
+        },
+        "invalidation_bus": invalidation_bus.stats(),
+        "events": events.stats(),
+        "jobs": jobs.stats(),
+        "reservation_holds": reservation_holds.stats(),
+        "reservation_queue": reservation_queue.stats(),
+        "counters": counters.stats(),
+    }
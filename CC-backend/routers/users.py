@@ -1,10 +1,11 @@
-from fastapi import APIRouter, HTTPException, Depends, Body
+from fastapi import APIRouter, HTTPException, Depends, Body, Query
 from pymongo.collection import Collection
 from pymongo.errors import DuplicateKeyError
 from pydantic import ValidationError # Keep if used
 from datetime import datetime
+import asyncio
 import logging
-import json
+from typing import List
 
 
 # Import necessary components
@@ -12,9 +13,12 @@ from database import get_users_collection, get_food_collection
 from models import (
     UserRegistration, UserCreate, UserEmailLogin, User, GoogleIdRequest,
     EmailCheckRequest, NetIdResponse, UserCheckResponse, UserProfileResponse,
+    UserBatchRequest, UserBatchResponse, MAX_BATCH_IDS,
+    UserReputation, ReputationBatchResponse,
     PyObjectId # Import PyObjectId if used in models
 )
 from utils import hash_password, verify_password
+from services import events, invalidation_bus, notifications, profile, reputation
 
 logger = logging.getLogger(__name__)
 
@@ -72,11 +76,13 @@ async def signup(user: UserCreate, db: Collection = Depends(get_user_db)):
             "role": "user",
             "postCount": 0, # Initialize counts
             "reservationCount": 0,
+            "receivedCount": 0,
             "lastLogin": None
         }
 
         result = db.insert_one(new_user_data)
         if result.inserted_id:
+            events.emit(events.UserRegistered(netId=user.netId))
             logger.info(f"User {user.username} ({user.netId}) registered successfully.")
             # Exclude password from response if returning user data
             # return {"success": True, "message": "User registered successfully", "user_id": str(result.inserted_id)}
@@ -120,6 +126,7 @@ async def email_login(user: UserEmailLogin, db: Collection = Depends(get_user_db
         # Update last login time
         now = datetime.now()
         db.update_one({"_id": db_user["_id"]}, {"$set": {"lastLogin": now}})
+        invalidation_bus.publish(f"user:{db_user.get('netId')}")
 
         # Prepare user response (exclude password)
         user_response_data = {k: v for k, v in db_user.items() if k != "password"}
@@ -206,6 +213,7 @@ async def register_user(user: UserRegistration, db: Collection = Depends(get_use
                 return {"success": True, "message": "User data is already up to date."}
 
             result = db.update_one({"_id": existing_user_google["_id"]}, {"$set": update_data})
+            events.emit(events.UserProfileUpdated(netId=existing_user_google.get("netId"), changes=update_data))
             logger.info(f"User {user.googleId} updated. Modified count: {result.modified_count}")
             return {"success": True, "message": "User updated successfully"}
 
@@ -225,12 +233,14 @@ async def register_user(user: UserRegistration, db: Collection = Depends(get_use
         user_data["role"] = "user"
         user_data["postCount"] = 0
         user_data["reservationCount"] = 0
+        user_data["receivedCount"] = 0
         user_data["lastLogin"] = None
         # Ensure password field is not included or is handled if required by schema
         user_data.pop("password", None) # Remove if present in base model
 
         result = db.insert_one(user_data)
         if result.inserted_id:
+            events.emit(events.UserRegistered(netId=user.netId, googleId=user.googleId))
             logger.info(f"User {user.netId} (Google: {user.googleId}) registered successfully with id: {result.inserted_id}")
             return {"success": True, "message": "User registered successfully"}
         else:
@@ -251,9 +261,86 @@ async def register_user(user: UserRegistration, db: Collection = Depends(get_use
         logger.error(f"Unexpected error during registration for netId {user.netId}: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="An unexpected error occurred during user registration.")
 
+@router.post("/batch", response_model=UserBatchResponse) # Corresponds to POST /api/users/batch
+async def get_users_batch(request: UserBatchRequest, db: Collection = Depends(get_user_db)):
+    google_ids = list(dict.fromkeys(request.googleIds))
+    net_ids = list(dict.fromkeys(request.netIds))
+    logger.info(f"Received batch user lookup: {len(google_ids)} googleIds, {len(net_ids)} netIds")
+
+    if len(google_ids) + len(net_ids) > MAX_BATCH_IDS:
+        logger.warning(f"Batch user lookup exceeded limit: {len(google_ids) + len(net_ids)} > {MAX_BATCH_IDS}")
+        raise HTTPException(status_code=400, detail=f"Too many ids. A maximum of {MAX_BATCH_IDS} is allowed per request.")
+
+    try:
+        clauses = []
+        if google_ids:
+            clauses.append({"googleId": {"$in": google_ids}})
+        if net_ids:
+            clauses.append({"netId": {"$in": net_ids}})
+        if not clauses:
+            return {"users": [], "missing": []}
+
+        # Single round trip for both id kinds; never ship password hashes
+        users = []
+        found_google_ids = set()
+        found_net_ids = set()
+        for user in db.find({"$or": clauses}, {"password": 0}):
+            user["id"] = str(user.pop("_id"))
+            found_google_ids.add(user.get("googleId"))
+            found_net_ids.add(user.get("netId"))
+            users.append(User(**user))
+
+        missing = [g for g in google_ids if g not in found_google_ids]
+        missing += [n for n in net_ids if n not in found_net_ids]
+        logger.info(f"Batch user lookup returned {len(users)} users, {len(missing)} missing.")
+        return {"users": users, "missing": missing}
+
+    except HTTPException as he:
+        raise he
+    except ValidationError as ve:
+        logger.error(f"Validation error constructing batch user response: {ve}")
+        raise HTTPException(status_code=500, detail="Error formatting user data.")
+    except Exception as e:
+        logger.error(f"Error during batch user lookup: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching user data.")
+
+
+@router.get("/notifications/{net_id}") # Corresponds to GET /api/users/notifications/{net_id}
+def get_notifications(net_id: str, limit: int = Query(50, ge=1, le=notifications.MAX_NOTIFICATIONS)):
+    logger.info(f"Received request for notifications of user {net_id}")
+    try:
+        return {"notifications": notifications.recent(net_id, limit)}
+    except Exception as e:
+        logger.error(f"Error fetching notifications for {net_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching notifications.")
+
+
+@router.get("/reputation/{net_id}", response_model=UserReputation) # Corresponds to GET /api/users/reputation/{net_id}
+def get_reputation(net_id: str):
+    logger.info(f"Received request for reputation of user {net_id}")
+    try:
+        return reputation.get(net_id)
+    except Exception as e:
+        logger.error(f"Error fetching reputation for {net_id}: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching reputation.")
+
+
+@router.post("/reputation", response_model=ReputationBatchResponse) # Corresponds to POST /api/users/reputation
+async def get_reputation_batch(net_ids: List[str] = Body(..., embed=True)):
+    net_ids = list(dict.fromkeys(net_ids)) # De-duplicate, keep order
+    logger.info(f"Received batch reputation request for {len(net_ids)} users")
+    if len(net_ids) > MAX_BATCH_IDS:
+        raise HTTPException(status_code=400, detail=f"Too many net ids. A maximum of {MAX_BATCH_IDS} is allowed per request.")
+    try:
+        return {"reputations": reputation.get_many(net_ids)}
+    except Exception as e:
+        logger.error(f"Error fetching batch reputation: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="An unexpected error occurred while fetching reputation.")
+
+
 # Use response_model=User to validate output structure
 @router.get("/{googleId}", response_model=User) # Corresponds to GET /api/users/{googleId}
-async def get_user(googleId: str, db: Collection = Depends(get_user_db)):
+def get_user(googleId: str, db: Collection = Depends(get_user_db)):
     logger.info(f"Received request to get user by googleId: {googleId}")
     try:
         user = db.find_one({"googleId": googleId})
@@ -281,60 +368,30 @@ async def get_user(googleId: str, db: Collection = Depends(get_user_db)):
 @misc_user_router.get("/api/users/profile/{net_id}", response_model=UserProfileResponse) # Full path specified
 async def get_user_profile(
     net_id: str,
+    limit: int = Query(50, ge=1, le=profile.MAX_HISTORY_PAGE), # History page size
+    postOffset: int = Query(0, ge=0),
+    receivedOffset: int = Query(0, ge=0),
     user_db: Collection = Depends(get_user_db),
     food_db: Collection = Depends(get_food_db)
 ):
     logger.info(f"Received request for user profile: netId={net_id}")
     try:
-        user = user_db.find_one({"netId": net_id})
+        # The user (with its materialized counts) and both histories, concurrently
+        user, post_history, received_history = await asyncio.gather(
+            asyncio.to_thread(user_db.find_one, {"netId": net_id}),
+            asyncio.to_thread(profile.fetch_history, "post_history", net_id, limit, postOffset, food_db),
+            asyncio.to_thread(profile.fetch_history, "received_history", net_id, limit, receivedOffset, food_db),
+        )
         if not user:
             logger.warning(f"User profile not found: netId={net_id}")
             raise HTTPException(status_code=404, detail="User not found")
 
-   
-        logger.info(f"Found user {net_id}, fetching profile data.")
-
-        # Counts
-        post_count = food_db.count_documents({"postedBy": net_id})
-        # Count 'received' based on being reservedBy and status is 'red' (completed)
-        received_count = food_db.count_documents({"reservedBy": net_id, "status": "red"})
-
-        # Histories (Consider adding limits and pagination later)
-        post_history_cursor = food_db.find({"postedBy": net_id}).sort("timestamp", -1).limit(50) # Limit results
-        post_history = []
-        for post in post_history_cursor:
-            post["id"] = str(post.pop("_id"))
-            # Process photo URI
-            if "photo" in post and isinstance(post["photo"], str):
-                try: post["photo"] = json.loads(post["photo"]).get("uri", post["photo"])
-                except json.JSONDecodeError: pass # Keep original if invalid JSON
-            else: post["photo"] = post.get("photo", "")
-            # Convert datetime
-            if isinstance(post.get("timestamp"), datetime): post["timestamp"] = post["timestamp"].isoformat()
-            post_history.append(post)
-
-        # Assuming received means transaction completed (status=red)
-        received_history_cursor = food_db.find({"reservedBy": net_id, "status": "red"}).sort("timestamp", -1).limit(50) # Limit results
-        received_history = []
-        for received in received_history_cursor:
-            received["id"] = str(received.pop("_id"))
-             # Process photo URI
-            if "photo" in received and isinstance(received["photo"], str):
-                try: received["photo"] = json.loads(received["photo"]).get("uri", received["photo"])
-                except json.JSONDecodeError: pass
-            else: received["photo"] = received.get("photo", "")
-            # Convert datetime
-            if isinstance(received.get("timestamp"), datetime): received["timestamp"] = received["timestamp"].isoformat()
-            received_history.append(received)
-
-
-        # Prepare response using UserProfileResponse model
         response_data = {
             "username": user.get("fullName"), # Use fullName as username? Check requirement
             "email": user.get("email"),
             "profilePicture": user.get("picture", ""),
-            "post_count": post_count,
-            "received_count": received_count,
+            "post_count": user.get("postCount", 0), # Materialized (services/user_stats.py)
+            "received_count": user.get("receivedCount", 0),
             "post_history": post_history,
             "received_history": received_history,
         }
@@ -381,7 +438,7 @@ async def check_user(request: GoogleIdRequest, db: Collection = Depends(get_user
 # Endpoint to get NetID from Google ID
 # Needs to be on the misc router
 @misc_user_router.get("/api/users/netid/{googleId}", response_model=NetIdResponse) # Full path
-async def get_user_by_googleId(googleId: str, db: Collection = Depends(get_user_db)):
+def get_user_by_googleId(googleId: str, db: Collection = Depends(get_user_db)):
     logger.info(f"Received request to get netId for googleId: {googleId}")
     try:
         user = db.find_one({"googleId": googleId}, {"netId": 1}) # Projection
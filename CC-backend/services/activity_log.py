@@ -0,0 +1,124 @@
+import logging
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from database import get_db
+from services import events
+
+logger = logging.getLogger(__name__)
+
+# Append-only, fixed-size log of food lifecycle transitions; oldest entries roll off
+ACTIVITY_LOG_COLLECTION = "food_activity"
+ACTIVITY_LOG_SIZE_BYTES = int(os.getenv("ACTIVITY_LOG_SIZE_BYTES", str(16 * 1024 * 1024)))
+MAX_RECENT_ACTIVITY = 200
+
+
+def get_activity_collection():
+    return get_db()[ACTIVITY_LOG_COLLECTION]
+
+
+def ensure_collection():
+    db = get_db()
+    if ACTIVITY_LOG_COLLECTION not in db.list_collection_names():
+        db.create_collection(ACTIVITY_LOG_COLLECTION, capped=True, size=ACTIVITY_LOG_SIZE_BYTES)
+        logger.info(f"Created capped '{ACTIVITY_LOG_COLLECTION}' collection ({ACTIVITY_LOG_SIZE_BYTES} bytes)")
+    # Per-post history without scanning the whole log
+    db[ACTIVITY_LOG_COLLECTION].create_index([("foodId", ASCENDING), ("_id", ASCENDING)], name="foodId_id")
+
+
+def record(food_id, action: str, actor: Optional[str], from_status: Optional[str], to_status: Optional[str], occurred_at: datetime):
+    """Appends one transition, stamped with when it happened rather than when it is logged.
+    Never raises: the transition itself is already committed."""
+    try:
+        get_activity_collection().insert_one({
+            "foodId": str(food_id),
+            "action": action,
+            "actor": actor,
+            "from": from_status,
+            "to": to_status,
+            "timestamp": occurred_at,
+        })
+    except Exception as e:
+        logger.error(f"Failed to record '{action}' activity for food {food_id}: {e}", exc_info=True)
+
+
+def record_many(entries: List[dict], occurred_at: datetime):
+    """Appends several transitions of one event with one insert (bulk writes)."""
+    if not entries:
+        return
+    try:
+        get_activity_collection().insert_many([dict(entry, timestamp=occurred_at) for entry in entries], ordered=False)
+    except Exception as e:
+        logger.error(f"Failed to record {len(entries)} activity entries: {e}", exc_info=True)
+
+
+def serialize_entry(entry: dict) -> dict:
+    entry["id"] = str(entry.pop("_id"))
+    entry["timestamp"] = entry["timestamp"].isoformat()
+    return entry
+
+
+def recent(limit: int = 50, after: Optional[ObjectId] = None, food_id: Optional[str] = None) -> List[dict]:
+    """Newest-first tail of the log. With `after`, returns only entries appended since that id,
+    so pollers pay for the delta alone: a range on the _id index rather than a reverse natural
+    scan, which would walk the collection down to the cursor. The plain tail needs no index."""
+    query = {}
+    if after is not None:
+        query["_id"] = {"$gt": after}
+    if food_id is not None:
+        query["foodId"] = food_id
+    if after is not None or food_id is not None:
+        cursor = get_activity_collection().find(query).sort("_id", DESCENDING)
+    else:
+        cursor = get_activity_collection().find(query).sort("$natural", DESCENDING)
+    return [serialize_entry(entry) for entry in cursor.limit(limit)]
+
+
+# --- Lifecycle transitions ---
+# Background subscribers: the log may trail the write by a moment, but never delays the response.
+# from/to are the post's status. Reserve, complete and expire are conditional updates on the
+# status they leave, so theirs are known; a claim changes the status only when it takes the
+# last units, and the event doesn't carry the status before it, so claims leave `from` out.
+
+@events.on(events.FoodPosted, mode=events.BACKGROUND)
+def _on_food_posted(event: events.FoodPosted):
+    food = event.food
+    record(food["_id"], "posted", food.get("postedBy"), None, food.get("status", "green"), event.occurredAt)
+
+@events.on(events.FoodBatchPosted, mode=events.BACKGROUND)
+def _on_food_batch_posted(event: events.FoodBatchPosted):
+    record_many([
+        {"foodId": str(food["_id"]), "action": "posted", "actor": food.get("postedBy"), "from": None, "to": food.get("status", "green")}
+        for food in event.foods
+    ], event.occurredAt)
+
+@events.on(events.FoodReserved, mode=events.BACKGROUND)
+def _on_food_reserved(event: events.FoodReserved):
+    record(event.foodId, "reserved", event.reservedBy, "green", "yellow", event.occurredAt)
+
+@events.on(events.FoodClaimed, mode=events.BACKGROUND)
+def _on_food_claimed(event: events.FoodClaimed):
+    record(event.foodId, "claimed", event.user, None, "yellow" if event.remaining == 0 else None, event.occurredAt)
+
+@events.on(events.ClaimCompleted, mode=events.BACKGROUND)
+def _on_claim_completed(event: events.ClaimCompleted):
+    record(event.foodId, "claim_completed", event.user, None, None, event.occurredAt) # The post's own completion is FoodCompleted
+
+@events.on(events.FoodCompleted, mode=events.BACKGROUND)
+def _on_food_completed(event: events.FoodCompleted):
+    record(event.foodId, "completed", event.completedBy, "yellow", "red", event.occurredAt)
+
+@events.on(events.ReservationExpired, mode=events.BACKGROUND)
+def _on_reservation_expired(event: events.ReservationExpired):
+    record(event.foodId, "expired", "system", "yellow", "green", event.occurredAt) # The hold timer, not a user
+
+@events.on(events.PostsHidden, mode=events.BACKGROUND)
+def _on_posts_hidden(event: events.PostsHidden):
+    record_many([
+        {"foodId": food_id, "action": "hidden", "actor": event.hiddenBy, "from": None, "to": "hidden"}
+        for food_id in event.foodIds
+    ], event.occurredAt)
@@ -0,0 +1,265 @@
+"""Pre-aggregated activity rollups.
+
+`analytics_rollups` holds one small document per (granularity, bucket, location),
+for hourly and daily buckets:
+
+    posted          posts made
+    quantityPosted  units offered in them
+    reserved        reservations taken, or portions claimed
+    completed       handoffs completed (whole posts or claims)
+    quantitySaved   units picked up (food saved)
+    expired         reservations released because nobody showed up
+
+Lifecycle events add to the current hour and day through a write-behind counter
+buffer, from background subscribers so the post lookups they may need stay off
+the request path. The analytics endpoints only ever read the rollups: a year of daily
+numbers is a few hundred small documents per location, whatever the size of
+food_posts. Buckets use server local time, like post timestamps.
+
+Rollups for posts made before they existed come from a backfill that streams
+food_posts (and its archive) in batches. food_posts does not record when a post was reserved or
+picked up, so the backfill counts each post's outcome in the bucket it was posted
+in, and cannot know about expired holds. It replaces the buckets before --until
+(default: now); run it once when the rollups are introduced, or after dropping them:
+
+    python -m services.analytics backfill
+"""
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, UpdateOne
+
+from database import get_db, get_food_collection
+from services import archive, counters, events
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_COLLECTION = "analytics_rollups"
+GRANULARITIES = ("hour", "day")
+FIELDS = ("posted", "quantityPosted", "reserved", "completed", "quantitySaved", "expired")
+UNKNOWN_LOCATION = "unknown"
+MAX_HOURLY_RANGE = timedelta(days=31) # Bounds an hourly series to ~750 buckets per location
+BACKFILL_BATCH_SIZE = 1000
+
+
+def get_rollup_collection():
+    return get_db()[ROLLUP_COLLECTION]
+
+
+def ensure_indexes():
+    get_rollup_collection().create_index(
+        [("granularity", ASCENDING), ("bucket", ASCENDING), ("location", ASCENDING)],
+        name="granularity_bucket_location", unique=True,
+    )
+    logger.info("Analytics rollup indexes ensured.")
+
+
+_rollups = counters.buffer("analytics_rollups", get_rollup_collection, key_field=("granularity", "bucket", "location"), upsert=True)
+
+
+def bucket_start(when: datetime, granularity: str) -> datetime:
+    if granularity == "hour":
+        return when.replace(minute=0, second=0, microsecond=0)
+    return when.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _location(food: Optional[dict]) -> str:
+    location = (food or {}).get("pickupLocation")
+    return location.strip() if isinstance(location, str) and location.strip() else UNKNOWN_LOCATION
+
+
+def _units(value) -> int:
+    try:
+        return int(value or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _quantity(food: Optional[dict]) -> int:
+    return _units((food or {}).get("quantity"))
+
+
+def record(when: datetime, location: str, **amounts: int):
+    """Adds `amounts` (FIELDS) to the hour and day buckets containing `when`."""
+    for granularity in GRANULARITIES:
+        key = (granularity, bucket_start(when, granularity), location)
+        for field, amount in amounts.items():
+            if amount:
+                _rollups.increment(key, field, amount)
+
+
+def _post_fields(food_id: str, *fields: str) -> Optional[dict]:
+    projection = dict.fromkeys(("pickupLocation", "quantity") + fields, 1)
+    try:
+        return get_food_collection().find_one({"_id": ObjectId(food_id)}, projection)
+    except InvalidId:
+        return None
+
+
+def _claim_units(food: Optional[dict], claim_id: str) -> int:
+    claim = next((claim for claim in (food or {}).get("claims", []) if claim.get("claimId") == claim_id), None)
+    return _units(claim.get("units")) if claim else 0
+
+
+# --- Lifecycle ---
+# Background subscribers: buckets are only flushed periodically anyway
+
+@events.on(events.FoodPosted, mode=events.BACKGROUND)
+def _on_food_posted(event: events.FoodPosted):
+    record(event.occurredAt, _location(event.food), posted=1, quantityPosted=_quantity(event.food))
+
+@events.on(events.FoodBatchPosted, mode=events.BACKGROUND)
+def _on_food_batch_posted(event: events.FoodBatchPosted):
+    for food in event.foods:
+        record(event.occurredAt, _location(food), posted=1, quantityPosted=_quantity(food))
+
+@events.on(events.FoodReserved, mode=events.BACKGROUND)
+def _on_food_reserved(event: events.FoodReserved):
+    record(event.occurredAt, _location(_post_fields(event.foodId)), reserved=1)
+
+@events.on(events.FoodClaimed, mode=events.BACKGROUND)
+def _on_food_claimed(event: events.FoodClaimed):
+    record(event.occurredAt, _location(_post_fields(event.foodId)), reserved=1)
+
+@events.on(events.FoodCompleted, mode=events.BACKGROUND)
+def _on_food_completed(event: events.FoodCompleted):
+    if event.viaClaims:
+        return # Each claim was counted when it was picked up
+    food = _post_fields(event.foodId)
+    record(event.occurredAt, _location(food), completed=1, quantitySaved=_quantity(food))
+
+@events.on(events.ClaimCompleted, mode=events.BACKGROUND)
+def _on_claim_completed(event: events.ClaimCompleted):
+    food = _post_fields(event.foodId, "claims")
+    record(event.occurredAt, _location(food), completed=1, quantitySaved=_claim_units(food, event.claimId))
+
+@events.on(events.ReservationExpired, mode=events.BACKGROUND)
+def _on_reservation_expired(event: events.ReservationExpired):
+    record(event.occurredAt, _location(_post_fields(event.foodId)), expired=1)
+
+
+# --- Reads ---
+
+def _with_rate(row: dict) -> dict:
+    row["completionRate"] = round(row["completed"] / row["reserved"], 4) if row["reserved"] else None
+    return row
+
+
+def _totals_group(group_id) -> dict:
+    return dict({"_id": group_id}, **{field: {"$sum": f"${field}"} for field in FIELDS})
+
+
+def _range_match(granularity: str, since: datetime, until: datetime, location: Optional[str] = None) -> dict:
+    match = {"granularity": granularity, "bucket": {"$gte": bucket_start(since, granularity), "$lt": until}}
+    if location:
+        match["location"] = location
+    return match
+
+
+def series(granularity: str, since: datetime, until: datetime, location: Optional[str] = None) -> List[dict]:
+    """Per-bucket totals (across locations unless one is given), oldest first. Empty buckets are omitted."""
+    rows = get_rollup_collection().aggregate([
+        {"$match": _range_match(granularity, since, until, location)},
+        {"$group": _totals_group("$bucket")},
+        {"$sort": {"_id": 1}},
+    ])
+    return [_with_rate(dict({"bucket": row.pop("_id").isoformat()}, **row)) for row in rows]
+
+
+def by_location(since: datetime, until: datetime) -> List[dict]:
+    """Totals per pickup location over whole days, most food saved first."""
+    rows = get_rollup_collection().aggregate([
+        {"$match": _range_match("day", since, until)},
+        {"$group": _totals_group("$location")},
+        {"$sort": {"quantitySaved": -1, "completed": -1, "_id": 1}},
+    ])
+    return [_with_rate(dict({"location": row.pop("_id")}, **row)) for row in rows]
+
+
+def totals(rows: Iterable[dict]) -> dict:
+    summed = dict.fromkeys(FIELDS, 0)
+    for row in rows:
+        for field in FIELDS:
+            summed[field] += row.get(field, 0)
+    return _with_rate(summed)
+
+
+# --- Backfill ---
+
+def _batches(cursor, batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _backfill_batch(foods: List[dict]) -> int:
+    amounts: Dict[Tuple[str, datetime, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for food in foods:
+        if not isinstance(food.get("timestamp"), datetime):
+            continue
+        location, quantity = _location(food), _quantity(food)
+        claims = food.get("claims") or []
+        if claims: # Shared in portions: each claim is a reservation of its own
+            picked_up = [claim for claim in claims if claim.get("status") == "completed"]
+            reserved, completed = len(claims), len(picked_up)
+            saved = sum(_units(claim.get("units")) for claim in picked_up)
+        else:
+            reserved = int(food.get("status") in ("yellow", "red")) # Held or already picked up
+            completed = int(food.get("status") == "red")
+            saved = quantity if completed else 0
+        for granularity in GRANULARITIES:
+            bucket = amounts[(granularity, bucket_start(food["timestamp"], granularity), location)]
+            bucket["posted"] += 1
+            bucket["quantityPosted"] += quantity
+            bucket["reserved"] += reserved
+            bucket["completed"] += completed
+            bucket["quantitySaved"] += saved
+    operations = [
+        UpdateOne({"granularity": granularity, "bucket": bucket, "location": location}, {"$inc": dict(fields)}, upsert=True)
+        for (granularity, bucket, location), fields in amounts.items()
+    ]
+    if operations:
+        get_rollup_collection().bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def backfill(until: Optional[datetime] = None, batch_size: int = BACKFILL_BATCH_SIZE) -> dict:
+    """Rebuilds the buckets before `until` from food_posts and its archive, one batch of posts at a time."""
+    until = bucket_start(until or datetime.now(), "hour")
+    _rollups.flush()
+    cleared = get_rollup_collection().delete_many({"bucket": {"$lt": until}}).deleted_count
+    projection = {"timestamp": 1, "pickupLocation": 1, "quantity": 1, "status": 1, "claims": 1}
+    posts = writes = 0
+    for source in (get_food_collection(), archive.get_post_archive_collection()):
+        cursor = source.find({"timestamp": {"$lt": until}}, projection, batch_size=batch_size)
+        for batch in _batches(cursor, batch_size):
+            writes += _backfill_batch(batch)
+            posts += len(batch)
+    logger.info(f"Analytics backfill before {until.isoformat()}: {posts} posts, {writes} bucket writes ({cleared} buckets replaced)")
+    return {"until": until.isoformat(), "posts": posts, "bucketWrites": writes, "cleared": cleared}
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain the analytics rollups.")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--until", type=datetime.fromisoformat, default=None, help="Rebuild buckets before this time (default: now)")
+    parser.add_argument("--batch-size", type=int, default=BACKFILL_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "backfill":
+        ensure_indexes()
+        print(backfill(until=args.until, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
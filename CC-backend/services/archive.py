@@ -0,0 +1,162 @@
+"""Hot/cold archival of finished posts and reviewed reports.
+
+food_posts and reports only grow, and completed posts, expired posts and reviewed
+reports are dead weight for the feed, searches and the moderation queue. A
+scheduled job moves those older than ARCHIVE_AFTER_DAYS into
+`food_posts_archive` and `reports_archive`, one batch at a time:
+
+    posts    completed (red), or available (green) but expired, and posted before the cutoff
+    reports  resolved, dismissed or action_taken, and reviewed before the cutoff
+
+A batch is copied into the archive first and then deleted from the hot collection
+only where the document is still exactly as it was read (every field equal, none
+added); anything that changed in between (e.g. an expired post that was
+re-reserved, or reported again) is taken back out of the archive and stays hot.
+Re-running after a crash is safe: archived copies are overwritten with the
+current document.
+
+Readers that need a user's whole history (profile histories, user stats and
+reputation reconciliation, the analytics backfill, photos) read both collections.
+To archive by hand:
+
+    python -m services.archive run --days 30
+"""
+import argparse
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from pymongo import ASCENDING, DESCENDING, DeleteOne, ReplaceOne
+from pymongo.collection import Collection
+
+from database import get_db, get_food_collection, get_report_collection
+from services import events, jobs
+from utils import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+POST_ARCHIVE_COLLECTION = "food_posts_archive"
+REPORT_ARCHIVE_COLLECTION = "reports_archive"
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30")) # 0 disables the scheduled job
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", str(24 * 60 * 60)))
+ARCHIVE_BATCH_SIZE = 500
+ARCHIVED_POST_STATUSES = ("red", "green") # Never yellow: a reservation is in progress
+ARCHIVED_REPORT_STATUSES = ("resolved", "dismissed", "action_taken")
+
+
+def get_post_archive_collection() -> Collection:
+    return get_db()[POST_ARCHIVE_COLLECTION]
+
+
+def get_report_archive_collection() -> Collection:
+    return get_db()[REPORT_ARCHIVE_COLLECTION]
+
+
+def ensure_indexes():
+    # Candidate scans on the hot collections
+    get_food_collection().create_index([("status", ASCENDING), ("timestamp", ASCENDING)], name="status_timestamp")
+    get_report_collection().create_index([("reviewStatus", ASCENDING), ("reviewedAt", ASCENDING)], name="reviewStatus_reviewedAt")
+    # The archive serves the same per-user reads as the hot collections
+    posts = get_post_archive_collection()
+    posts.create_index([("postedBy", ASCENDING), ("timestamp", DESCENDING)], name="postedBy_timestamp")
+    posts.create_index([("reservedBy", ASCENDING), ("status", ASCENDING), ("timestamp", DESCENDING)], name="reservedBy_status_timestamp")
+    get_report_archive_collection().create_index([("user2ID", ASCENDING), ("reviewStatus", ASCENDING)], name="user2ID_reviewStatus")
+    logger.info("Archive indexes ensured.")
+
+
+def _post_is_finished(food: dict, now: datetime) -> bool:
+    if food.get("status") == "red":
+        return True
+    expires_at = parse_datetime(food.get("expirationTime"))
+    return expires_at is not None and expires_at <= now # Unparseable expiry: can't tell, keep it hot
+
+
+def _unchanged(doc: dict) -> dict:
+    """Filter matching `doc` only while it is exactly as read: every field equal and none added."""
+    return dict(doc, **{"$expr": {"$eq": [{"$size": {"$objectToArray": "$$ROOT"}}, len(doc)]}})
+
+
+def _move(source: Collection, target: Collection, docs: List[dict]) -> List:
+    """Copies `docs` to `target`, then deletes them from `source` where they are unchanged.
+    Returns the ids that were moved."""
+    if not docs:
+        return []
+    now = datetime.now()
+    # Replace rather than insert: a copy left by an interrupted run may be older than `docs`
+    target.bulk_write([ReplaceOne({"_id": doc["_id"]}, dict(doc, archivedAt=now), upsert=True) for doc in docs], ordered=False)
+    source.bulk_write([DeleteOne(_unchanged(doc)) for doc in docs], ordered=False)
+
+    ids = [doc["_id"] for doc in docs]
+    changed = {doc["_id"] for doc in source.find({"_id": {"$in": ids}}, {"_id": 1})}
+    if changed:
+        target.delete_many({"_id": {"$in": list(changed)}}) # Changed after we read it: stays hot
+    return [doc_id for doc_id in ids if doc_id not in changed]
+
+
+def _scan(source: Collection, query: dict, batch_size: int) -> Iterable[List[dict]]:
+    """Batches of matching documents in _id order, paged by _id so skipped documents aren't re-read."""
+    last_id = None
+    while True:
+        page_query = dict(query, _id={"$gt": last_id}) if last_id is not None else query
+        batch = list(source.find(page_query).sort("_id", ASCENDING).limit(batch_size))
+        if not batch:
+            return
+        last_id = batch[-1]["_id"]
+        yield batch
+
+
+def archive_posts(cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    now = datetime.now()
+    query = {
+        "status": {"$in": list(ARCHIVED_POST_STATUSES)},
+        "timestamp": {"$lt": cutoff},
+        "claims": {"$not": {"$elemMatch": {"status": "held"}}}, # Portions still waiting for pickup
+    }
+    moved = 0
+    for batch in _scan(get_food_collection(), query, batch_size):
+        finished = [food for food in batch if _post_is_finished(food, now)]
+        ids = _move(get_food_collection(), get_post_archive_collection(), finished)
+        if ids:
+            events.emit(events.PostsArchived(foodIds=[str(food_id) for food_id in ids]))
+        moved += len(ids)
+    return moved
+
+
+def archive_reports(cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    query = {"reviewStatus": {"$in": list(ARCHIVED_REPORT_STATUSES)}, "reviewedAt": {"$lt": cutoff}}
+    moved = 0
+    for batch in _scan(get_report_collection(), query, batch_size):
+        moved += len(_move(get_report_collection(), get_report_archive_collection(), batch))
+    return moved
+
+
+@jobs.job("archive")
+def run(payload: Optional[dict] = None, days: Optional[int] = None, batch_size: int = ARCHIVE_BATCH_SIZE) -> dict:
+    """Moves finished posts and reviewed reports older than `days` (default ARCHIVE_AFTER_DAYS) to the archive."""
+    days = days if days is not None else (payload or {}).get("days", ARCHIVE_AFTER_DAYS)
+    cutoff = datetime.now() - timedelta(days=days)
+    posts = archive_posts(cutoff, batch_size)
+    reports = archive_reports(cutoff, batch_size)
+    logger.info(f"Archived {posts} posts and {reports} reports older than {cutoff.isoformat()}")
+    return {"cutoff": cutoff.isoformat(), "posts": posts, "reports": reports}
+
+
+if ARCHIVE_AFTER_DAYS > 0:
+    jobs.every(ARCHIVE_INTERVAL, "archive")
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Move finished posts and reviewed reports to the archive collections.")
+    parser.add_argument("command", choices=["run"])
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "run":
+        ensure_indexes()
+        print(run(days=args.days, batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Write-behind counters.
+
+Hot counters (a post's reportCount under a wave of reports, a user's postCount)
+turn every request into a write on the same document. A `CounterBuffer` instead
+sums increments in memory per document and field, and writes them with one
+unordered bulk_write of `$inc` updates every COUNTER_FLUSH_INTERVAL_MS, or as soon
+as COUNTER_FLUSH_MAX_OPS increments are pending, and once more on shutdown. A
+thousand reports on one post become one update.
+
+Counts are eventually consistent: readers may lag by up to one flush interval,
+reported as `lag_ms` in the stats. A flush that failed before anything was sent is
+merged back into the buffer and retried on the next one; after a partial
+BulkWriteError only the updates listed as failed are. Any other write error may
+have applied some updates, so nothing is replayed (that would double-count): the
+increments are dropped, counted in `dropped_ops`, and the drift is left to the
+reconcile jobs. When the flusher is not running (CLIs, scripts) increments are
+written through immediately.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+from pymongo import UpdateOne
+from pymongo.collection import Collection
+from pymongo.errors import BulkWriteError, ServerSelectionTimeoutError
+
+logger = logging.getLogger(__name__)
+
+COUNTER_FLUSH_INTERVAL_MS = float(os.getenv("COUNTER_FLUSH_INTERVAL_MS", "500"))
+COUNTER_FLUSH_MAX_OPS = int(os.getenv("COUNTER_FLUSH_MAX_OPS", "1000"))
+
+
+KeyField = Union[str, Tuple[str, ...]] # With a tuple of fields, keys are tuples of their values
+
+
+class CounterBuffer:
+    def __init__(self, name: str, get_collection: Callable[[], Collection], key_field: KeyField = "_id", upsert: bool = False,
+                 on_flush: Optional[Callable[[List], None]] = None):
+        self.name = name
+        self.get_collection = get_collection
+        self.key_field = key_field
+        self.upsert = upsert
+        self.on_flush = on_flush # Called with the written keys, e.g. to invalidate caches built from them
+        self._lock = threading.Lock()
+        self._pending: Dict[object, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self._pending_ops = 0
+        self._oldest: Optional[float] = None # Monotonic time of the oldest unflushed increment
+        self.flushed_ops = 0
+        self.flushes = 0
+        self.errors = 0
+        self.dropped_ops = 0
+        self.last_flush_ms = 0.0
+        self.max_lag_ms = 0.0
+
+    def increment(self, key, field: str, amount: int = 1):
+        if not _running():
+            self._write({key: {field: amount}}) # No flusher: write through
+            return
+        with self._lock:
+            self._pending[key][field] += amount
+            self._pending_ops += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            full = self._pending_ops >= COUNTER_FLUSH_MAX_OPS
+        if full:
+            _wake_flusher()
+
+    def _filter(self, key) -> dict:
+        if isinstance(self.key_field, tuple):
+            return dict(zip(self.key_field, key))
+        return {self.key_field: key}
+
+    def _notify(self, keys: List):
+        if self.on_flush is not None and keys:
+            try:
+                self.on_flush(keys)
+            except Exception as e:
+                logger.error(f"on_flush callback for counter '{self.name}' failed: {e}", exc_info=True)
+
+    def _write(self, pending: Dict[object, Dict[str, int]], collection: Optional[Collection] = None):
+        """Writes `pending` in one unordered bulk_write. BulkWriteError details index into `pending`'s non-zero keys."""
+        keys = [key for key, fields in pending.items() if any(fields.values())]
+        if not keys:
+            return
+        if collection is None:
+            collection = self.get_collection()
+        operations = [UpdateOne(self._filter(key), {"$inc": dict(pending[key])}, upsert=self.upsert) for key in keys]
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            failed = {error["index"] for error in e.details.get("writeErrors", [])}
+            self._notify([key for i, key in enumerate(keys) if i not in failed])
+            raise
+        self._notify(keys)
+
+    def _put_back(self, pending: Dict[object, Dict[str, int]], ops: int, oldest: float):
+        with self._lock:
+            for key, fields in pending.items():
+                for field, amount in fields.items():
+                    self._pending[key][field] += amount
+            self._pending_ops += ops
+            self._oldest = oldest if self._oldest is None else min(oldest, self._oldest)
+
+    def flush(self) -> int:
+        """Writes everything pending. Returns the number of increments written."""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending, ops, oldest = self._pending, self._pending_ops, self._oldest
+            self._pending = defaultdict(lambda: defaultdict(int))
+            self._pending_ops, self._oldest = 0, None
+        started = time.monotonic()
+        try:
+            collection = self.get_collection()
+        except Exception as e: # Nothing was sent
+            self.errors += 1
+            self._put_back(pending, ops, oldest)
+            logger.error(f"Counter flush for '{self.name}' failed ({ops} increments kept for retry): {e}", exc_info=True)
+            return 0
+        try:
+            self._write(pending, collection)
+        except BulkWriteError as e:
+            self.errors += 1
+            keys = [key for key, fields in pending.items() if any(fields.values())]
+            failed = {keys[error["index"]]: pending[keys[error["index"]]] for error in e.details.get("writeErrors", [])}
+            # Per-key increment counts aren't kept: one op per failed field stands in for them
+            self._put_back(failed, sum(len(fields) for fields in failed.values()), oldest)
+            logger.error(f"Counter flush for '{self.name}' partly failed ({len(failed)} of {len(keys)} updates kept for retry): {e}")
+            return 0
+        except ServerSelectionTimeoutError as e: # No server was reached: nothing was applied
+            self.errors += 1
+            self._put_back(pending, ops, oldest)
+            logger.error(f"Counter flush for '{self.name}' found no server ({ops} increments kept for retry): {e}")
+            return 0
+        except Exception as e:
+            # Some updates may have landed: replaying them would double-count, so leave the drift to reconcile
+            self.errors += 1
+            self.dropped_ops += ops
+            logger.error(f"Counter flush for '{self.name}' failed after it may have applied ({ops} increments dropped): {e}", exc_info=True)
+            return 0
+        finished = time.monotonic()
+        self.flushes += 1
+        self.flushed_ops += ops
+        self.last_flush_ms = (finished - started) * 1000
+        self.max_lag_ms = max(self.max_lag_ms, (finished - oldest) * 1000)
+        return ops
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending_docs, pending_ops, oldest = len(self._pending), self._pending_ops, self._oldest
+        return {
+            "pending_docs": pending_docs,
+            "pending_ops": pending_ops,
+            "lag_ms": round((time.monotonic() - oldest) * 1000, 1) if oldest is not None else 0.0,
+            "max_lag_ms": round(self.max_lag_ms, 1),
+            "flushes": self.flushes,
+            "flushed_ops": self.flushed_ops,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "errors": self.errors,
+            "dropped_ops": self.dropped_ops,
+        }
+
+
+_buffers: Dict[str, CounterBuffer] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def buffer(name: str, get_collection: Callable[[], Collection], key_field: KeyField = "_id", upsert: bool = False,
+           on_flush: Optional[Callable[[List], None]] = None) -> CounterBuffer:
+    """Registers (or returns) the named buffer; every registered buffer is flushed by the same loop."""
+    if name not in _buffers:
+        _buffers[name] = CounterBuffer(name, get_collection, key_field=key_field, upsert=upsert, on_flush=on_flush)
+    return _buffers[name]
+
+
+def flush_all() -> int:
+    return sum(counter.flush() for counter in list(_buffers.values()))
+
+
+def _running() -> bool:
+    return _task is not None and not _task.done()
+
+
+def _wake_flusher():
+    if _loop is not None and _wake is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+async def _flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=COUNTER_FLUSH_INTERVAL_MS / 1000)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+        try:
+            await asyncio.to_thread(flush_all)
+        except Exception as e:
+            logger.error(f"Counter flush loop error: {e}", exc_info=True)
+
+
+def start():
+    global _loop, _wake, _task
+    if _running():
+        return
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    _task = _loop.create_task(_flush_loop())
+    logger.info(f"Counter flusher started (every {COUNTER_FLUSH_INTERVAL_MS}ms or {COUNTER_FLUSH_MAX_OPS} increments)")
+
+
+async def stop():
+    """Stops the loop, then writes whatever is still buffered."""
+    global _loop, _wake, _task
+    if _task is None or _loop is not asyncio.get_running_loop():
+        return # Not started by this event loop
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _loop, _wake, _task = None, None, None
+    flushed = await asyncio.to_thread(flush_all)
+    logger.info(f"Counter flusher stopped ({flushed} increments flushed on shutdown)")
+
+
+def stats() -> dict:
+    return {name: counter.stats() for name, counter in _buffers.items()}
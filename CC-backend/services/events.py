@@ -0,0 +1,168 @@
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Set, Type
+
+from pydantic import BaseModel, Field
+
+logger = logging.getLogger(__name__)
+
+
+# --- Domain Events ---
+# Emitted by the routes after the primary write has been committed.
+class DomainEvent(BaseModel):
+    occurredAt: datetime = Field(default_factory=datetime.now)
+
+class FoodPosted(DomainEvent):
+    food: dict # The inserted food_posts document, including _id
+
+class FoodBatchPosted(DomainEvent):
+    foods: List[dict] # Inserted food_posts documents (one bulk insert), including _id
+
+class FoodReserved(DomainEvent):
+    foodId: str
+    reservedBy: str
+    holdUntil: Optional[datetime] = None # The reservation is released if not completed by then
+
+class FoodCompleted(DomainEvent):
+    foodId: str
+    completedBy: str # The reserver who picked the food up (for claims: whoever picked up the last one)
+    postedBy: Optional[str] = None
+    viaClaims: bool = False # The last claim was picked up; each claimer's pickup was its own ClaimCompleted
+
+class FoodClaimed(DomainEvent):
+    foodId: str
+    claimId: str
+    user: str
+    units: int
+    remaining: int # Units left after this claim; 0 means the post is fully claimed
+
+class ClaimCompleted(DomainEvent):
+    foodId: str
+    claimId: str
+    user: str
+
+class ReservationExpired(DomainEvent):
+    foodId: str
+    reservedBy: str # The reserver who did not show up
+    postedBy: Optional[str] = None
+
+class ReportSubmitted(DomainEvent):
+    reportId: str
+    postId: str
+    user1ID: str # Reporter
+    user2ID: str # Reported user
+
+class ReportsReviewed(DomainEvent):
+    reviewStatus: str # The status the reports were moved to
+    reviewedBy: str
+    changed: Dict[str, Dict[str, int]] # Reported user -> {previous status: number of their reports moved from it}
+
+class PostsHidden(DomainEvent):
+    foodIds: List[str]
+    hiddenBy: str # Admin who acted on the reports
+
+class PostsArchived(DomainEvent):
+    foodIds: List[str] # Moved from food_posts to the archive collection
+
+class UserRegistered(DomainEvent):
+    netId: str
+    googleId: Optional[str] = None
+
+class UserProfileUpdated(DomainEvent):
+    netId: str
+    changes: dict # Only the fields that were set
+
+
+SYNC = "sync" # Runs inside emit(), before the response is sent
+BACKGROUND = "background" # Queued on the event loop, runs after emit() returns
+
+
+class _Subscriber:
+    def __init__(self, name: str, handler: Callable, mode: str):
+        self.name = name
+        self.handler = handler
+        self.mode = mode
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def run(self, event: DomainEvent):
+        started = time.perf_counter()
+        try:
+            self.handler(event)
+        except Exception as e:
+            self.errors += 1
+            # The write is already committed; a failing side effect must not fail the request
+            logger.error(f"Event subscriber '{self.name}' failed on {type(event).__name__}: {e}", exc_info=True)
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            with _stats_lock:
+                self.calls += 1
+                self.total_ms += elapsed_ms
+                self.max_ms = max(self.max_ms, elapsed_ms)
+
+
+_subscribers: Dict[Type[DomainEvent], List[_Subscriber]] = {}
+_pending: Set[asyncio.Task] = set()
+_stats_lock = threading.Lock()
+
+
+def subscribe(event_type: Type[DomainEvent], handler: Callable[[DomainEvent], None], mode: str = SYNC, name: Optional[str] = None):
+    """Registers a handler. Background handlers run in a worker thread so blocking DB calls
+    don't stall the event loop."""
+    if mode not in (SYNC, BACKGROUND):
+        raise ValueError(f"Unknown subscriber mode: {mode}")
+    name = name or f"{handler.__module__}.{handler.__qualname__}"
+    _subscribers.setdefault(event_type, []).append(_Subscriber(name, handler, mode))
+
+
+def on(event_type: Type[DomainEvent], mode: str = SYNC):
+    """Decorator form of subscribe()."""
+    def decorator(handler):
+        subscribe(event_type, handler, mode)
+        return handler
+    return decorator
+
+
+def emit(event: DomainEvent):
+    for subscriber in _subscribers.get(type(event), []):
+        if subscriber.mode == SYNC:
+            subscriber.run(event)
+            continue
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            subscriber.run(event) # No event loop (scripts, CLI): run inline
+            continue
+        task = loop.create_task(asyncio.to_thread(subscriber.run, event))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+
+
+async def drain():
+    """Waits for queued background subscribers (used on shutdown and in tests)."""
+    while _pending:
+        await asyncio.gather(*list(_pending), return_exceptions=True)
+
+
+def stats() -> dict:
+    with _stats_lock:
+        subscribers_by_event = {
+            event_type.__name__: [
+                {
+                    "subscriber": s.name,
+                    "mode": s.mode,
+                    "calls": s.calls,
+                    "errors": s.errors,
+                    "avg_ms": round(s.total_ms / s.calls, 3) if s.calls else None,
+                    "max_ms": round(s.max_ms, 3),
+                }
+                for s in subscribers
+            ]
+            for event_type, subscribers in _subscribers.items()
+        }
+    return {"subscribers": subscribers_by_event, "pending_background": len(_pending)}
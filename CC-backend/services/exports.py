@@ -0,0 +1,139 @@
+"""Streaming dumps of posts, reports and users as CSV or NDJSON.
+
+`stream()` walks a batched cursor in _id order and yields the serialized rows in
+chunks of EXPORT_CHUNK_ROWS, so an export holds one cursor batch and one chunk in
+memory however large the collection is. Only the fields listed per dataset can be
+exported (never photos or password hashes); `id` is the document's _id. Date
+filters apply to each dataset's own date field. Archived posts and reports
+(services/archive.py) are their own datasets. CSV cells that a spreadsheet would
+read as a formula (user-supplied text starting with =, +, -, @) are prefixed with
+a quote.
+"""
+import csv
+import io
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING
+
+from database import get_food_collection, get_report_collection, get_users_collection
+from services import archive
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000")) # Documents per cursor round trip
+EXPORT_CHUNK_ROWS = 500 # Rows serialized per chunk handed to the response
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+POST_FIELDS = (
+    "id", "foodName", "quantity", "remainingQuantity", "category", "dietaryInfo", "pickupLocation", "pickupTime",
+    "expirationTime", "status", "postedBy", "reservedBy", "timestamp", "reportCount", "hidden", "hiddenBy", "hiddenAt",
+)
+REPORT_FIELDS = ("id", "postId", "user1ID", "user2ID", "message", "submittedAt", "reviewStatus", "reviewedBy", "reviewedAt")
+
+# dataset -> (collection getter, date field for since/until, exportable fields)
+DATASETS: Dict[str, Tuple[Callable, str, Tuple[str, ...]]] = {
+    "posts": (get_food_collection, "timestamp", POST_FIELDS),
+    "posts_archive": (archive.get_post_archive_collection, "timestamp", POST_FIELDS + ("archivedAt",)),
+    "reports": (get_report_collection, "submittedAt", REPORT_FIELDS),
+    "reports_archive": (archive.get_report_archive_collection, "submittedAt", REPORT_FIELDS + ("archivedAt",)),
+    "users": (get_users_collection, "createdAt", (
+        "id", "netId", "username", "fullName", "email", "role", "createdAt", "lastLogin",
+        "postCount", "reservationCount", "receivedCount",
+    )),
+}
+
+
+def resolve_fields(dataset: str, fields: Optional[List[str]] = None) -> List[str]:
+    """The requested fields in order, or every exportable field. Raises ValueError for unknown ones."""
+    allowed = DATASETS[dataset][2]
+    if not fields:
+        return list(allowed)
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields for {dataset}: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return list(dict.fromkeys(fields)) # Drop repeats, keep order
+
+
+def _query(date_field: str, since: Optional[datetime], until: Optional[datetime]) -> dict:
+    if not since and not until:
+        return {}
+    window = {}
+    if since:
+        window["$gte"] = since
+    if until:
+        window["$lt"] = until
+    return {date_field: window}
+
+
+def _value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
+
+
+def _row(doc: dict, fields: List[str]) -> dict:
+    return {field: _value(doc.get("_id" if field == "id" else field)) for field in fields}
+
+
+def _csv_cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=str)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value # Shown as text, never evaluated
+    return value
+
+
+def _chunks(rows: Iterator[dict], fields: List[str], fmt: str) -> Iterator[str]:
+    out = io.StringIO()
+    writer = csv.writer(out) if fmt == "csv" else None
+    if writer is not None:
+        writer.writerow(fields)
+    pending = 0
+    for row in rows:
+        if writer is not None:
+            writer.writerow([_csv_cell(row[field]) for field in fields])
+        else:
+            out.write(json.dumps(row, default=str))
+            out.write("\n")
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+            pending = 0
+    if out.tell():
+        yield out.getvalue()
+
+
+def stream(dataset: str, fmt: str, fields: List[str], since: Optional[datetime] = None,
+           until: Optional[datetime] = None, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[str]:
+    """Yields the export as text chunks. `fields` must come from resolve_fields()."""
+    get_collection, date_field, _ = DATASETS[dataset]
+    projection = {("_id" if field == "id" else field): 1 for field in fields}
+    projection.setdefault("_id", 0)
+    cursor = (
+        get_collection().find(_query(date_field, since, until), projection, batch_size=batch_size)
+        .sort("_id", ASCENDING) # Stable order on the always-present _id index
+    )
+    exported = 0
+    try:
+        for chunk in _chunks((_row(doc, fields) for doc in cursor), fields, fmt):
+            exported += chunk.count("\n")
+            yield chunk
+    except Exception as e:
+        # Headers are already sent, so the client sees a truncated file rather than an error status
+        logger.error(f"Export of {dataset} failed after ~{exported} lines: {e}", exc_info=True)
+        raise
+    finally:
+        cursor.close()
+    logger.info(f"Exported {dataset} as {fmt} ({exported} lines)")
@@ -0,0 +1,174 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo.collection import Collection
+
+from database import get_feed_view_collection
+from services import feed_view, invalidation_bus
+from services.shared_snapshot import SharedSnapshotSegment
+
+logger = logging.getLogger(__name__)
+
+# Rebuild at least this often even without writes (picks up expirations, direct DB edits)
+FEED_SNAPSHOT_INTERVAL = float(os.getenv("FEED_SNAPSHOT_INTERVAL", "30"))
+# After a write, wait this long for more writes before rebuilding so bursts coalesce
+FEED_SNAPSHOT_DEBOUNCE = float(os.getenv("FEED_SNAPSHOT_DEBOUNCE", "0.25"))
+# With several uvicorn workers, point this at a shared-memory file (e.g. /dev/shm/campuscraves-feed)
+# so one elected worker builds the snapshot and every worker maps the same bytes.
+FEED_SNAPSHOT_SEGMENT = os.getenv("FEED_SNAPSHOT_SEGMENT")
+
+
+class FeedSnapshot:
+    """Serialized GET /api/food payload, kept as both identity and gzip bytes."""
+
+    def __init__(self, version: int, identity: bytes, gzipped: bytes, count: int):
+        self.version = version
+        self.identity = identity
+        self.gzipped = gzipped
+        self.count = count
+        self.built_at = time.time()
+
+
+_snapshot: Optional[FeedSnapshot] = None
+_stale = False
+_build_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_segment: Optional[SharedSnapshotSegment] = SharedSnapshotSegment(FEED_SNAPSHOT_SEGMENT) if FEED_SNAPSHOT_SEGMENT else None
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_feed(food_posts: list) -> bytes:
+    return json.dumps({"food_posts": food_posts}, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+
+def build_snapshot(db: Collection, version: int) -> FeedSnapshot:
+    """Runs the full feed query against the read model and serializes it. Blocking; call off the event loop when possible."""
+    food_posts = [feed_view.serialize_entry(entry) for entry in feed_view.find_entries({}, db)]
+    identity = encode_feed(food_posts)
+    return FeedSnapshot(version, identity, gzip.compress(identity, compresslevel=6), len(food_posts))
+
+
+def refresh(db: Optional[Collection] = None):
+    """Rebuilds and publishes a new snapshot. In shared mode only the elected builder publishes;
+    its private copy is dropped in favour of the mapped segment."""
+    global _snapshot, _stale
+    with _build_lock:
+        _stale = False
+        started = time.perf_counter()
+        version = _snapshot.version + 1 if _snapshot else 1
+        snapshot = build_snapshot(db if db is not None else get_feed_view_collection(), version)
+        if _segment is not None and _segment.try_become_builder():
+            _segment.publish(snapshot.identity, snapshot.gzipped, snapshot.count)
+            snapshot = _segment.read()
+        _snapshot = snapshot
+        logger.info(f"Feed snapshot v{snapshot.version} built: {snapshot.count} posts, "
+                    f"{len(snapshot.identity)} bytes ({len(snapshot.gzipped)} gzipped) "
+                    f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return snapshot
+
+
+def get_snapshot(db: Optional[Collection] = None):
+    """Returns the current snapshot, building it inline only if there is none yet
+    (or it is stale and no background refresher is running to fix that)."""
+    if _segment is not None:
+        shared = _segment.read()
+        if shared is not None:
+            return shared
+    snapshot = _snapshot
+    if snapshot is None or (_stale and not is_running()):
+        snapshot = refresh(db)
+    return snapshot
+
+
+def mark_dirty():
+    """Called by write paths; schedules a debounced rebuild. Safe to call from any thread."""
+    global _stale
+    _stale = True
+    if _segment is not None and not _segment.is_builder:
+        _segment.request_rebuild() # The builder may be another worker
+    if _loop is not None and _wake is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+# Any food, report or poster change (from this or another worker) makes the feed stale
+invalidation_bus.subscribe("feed", lambda key: mark_dirty())
+
+
+def invalidate():
+    """Drops the snapshot so the next read rebuilds it inline."""
+    global _snapshot
+    with _build_lock:
+        _snapshot = None
+
+
+def is_running() -> bool:
+    return _task is not None and not _task.done()
+
+
+async def _refresh_loop():
+    # In shared mode every worker polls so a reader can take over if the builder dies
+    timeout = FEED_SNAPSHOT_INTERVAL if _segment is None else min(FEED_SNAPSHOT_INTERVAL, FEED_SNAPSHOT_DEBOUNCE)
+    last_build = 0.0
+    while True:
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=timeout)
+            await asyncio.sleep(FEED_SNAPSHOT_DEBOUNCE) # Coalesce bursts of writes
+        except asyncio.TimeoutError:
+            pass
+        if _segment is not None:
+            if not _segment.try_become_builder():
+                _wake.clear() # Readers only map what the builder publishes
+                continue
+            requested = _wake.is_set() or _segment.rebuild_requested()
+            if not requested and time.monotonic() - last_build < FEED_SNAPSHOT_INTERVAL:
+                continue
+        _wake.clear()
+        try:
+            await asyncio.to_thread(refresh)
+            last_build = time.monotonic()
+        except Exception as e:
+            logger.error(f"Background feed snapshot refresh failed: {e}", exc_info=True)
+
+
+def start():
+    """Starts the background refresher on the running event loop."""
+    global _loop, _wake, _task
+    if is_running():
+        return
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    _wake.set() # Build the first snapshot right away
+    _task = _loop.create_task(_refresh_loop())
+    logger.info(f"Feed snapshot refresher started (interval={FEED_SNAPSHOT_INTERVAL}s, debounce={FEED_SNAPSHOT_DEBOUNCE}s, "
+                f"shared segment={FEED_SNAPSHOT_SEGMENT or 'disabled'})")
+
+
+async def stop():
+    global _loop, _wake, _task
+    if _task is None or _loop is not asyncio.get_running_loop():
+        return # Not started by this event loop
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    if _segment is not None:
+        _segment.release()
+    _loop, _wake, _task = None, None, None
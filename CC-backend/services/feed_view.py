@@ -0,0 +1,314 @@
+"""Denormalized read model for the marketplace (the `feed_view` collection).
+
+Each entry mirrors one food post plus the poster's display fields, a thumbnail
+reference, parsed datetimes and computed availability, so list endpoints need a
+single indexed query and no per-poster lookups. Subscribers to the domain events
+emitted by the write paths (services/events.py) keep it current; `rebuild()`
+recreates it from food_posts and users:
+
+    python -m services.feed_view rebuild
+
+Posts written before the view existed (or while it was dropped) have no entries.
+At startup `catch_up()` compares the view with food_posts; if it is behind, a
+one-shot `rebuild_feed_view` job fills it and, until then, list reads are built
+from food_posts instead (slower, same response).
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReplaceOne
+
+from database import get_feed_view_collection, get_food_collection, get_users_collection
+from services import counters, events, invalidation_bus, jobs
+from utils import parse_datetime, serialize_food_post
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 500
+FEED_VIEW_RECHECK_INTERVAL = float(os.getenv("FEED_VIEW_RECHECK_INTERVAL", "5")) # Seconds between catch-up checks while reads fall back
+
+# Fields copied verbatim from food_posts (photo is handled separately)
+POST_FIELDS = (
+    "foodName", "quantity", "category", "dietaryInfo", "pickupLocation", "pickupTime",
+    "status", "postedBy", "reportCount", "timestamp", "reservedBy", "expirationTime", "createdAt",
+    "remainingQuantity",
+)
+POSTER_PROJECTION = {"netId": 1, "fullName": 1, "picture": 1}
+
+_ready = True # False while this worker serves list reads from food_posts
+_checked_at = 0.0
+
+# A wave of reports on one post would otherwise be one write each on the same entry
+_report_counts = counters.buffer(
+    "feed_view.reportCount", get_feed_view_collection,
+    on_flush=lambda food_ids: invalidation_bus.publish("feed"), # Snapshots built before the flush carry the old counts
+)
+
+
+def thumbnail_url(food_id) -> str:
+    return f"/api/food/{food_id}/photo"
+
+
+def poster_fields(user: Optional[dict]) -> dict:
+    user = user or {}
+    return {"fullName": user.get("fullName"), "picture": user.get("picture")}
+
+
+def build_entry(food: dict, poster: Optional[dict]) -> dict:
+    """Builds the read-model document for one food post."""
+    entry = {field: food[field] for field in POST_FIELDS if field in food}
+    entry["_id"] = food["_id"]
+    # Same photo value the list endpoints have always returned (the parsed uri)
+    entry["photo"] = serialize_food_post({"_id": food["_id"], "photo": food.get("photo", "")})["photo"]
+    entry["thumbnail"] = thumbnail_url(food["_id"])
+    entry["poster"] = dict(netId=food.get("postedBy"), **poster_fields(poster))
+    entry["pickupAt"] = parse_datetime(food.get("pickupTime"))
+    entry["expiresAt"] = parse_datetime(food.get("expirationTime"))
+    entry["available"] = food.get("status", "green") == "green"
+    return entry
+
+
+def serialize_entry(entry: dict) -> dict:
+    """Shapes a read-model document like the list responses (id instead of _id)."""
+    entry["id"] = str(entry.pop("_id"))
+    return entry
+
+
+def ensure_indexes():
+    # The list read takes the whole view and search is an unanchored regex, so neither can use
+    # an index; only the poster fan-out in update_poster() selects entries by a field
+    get_feed_view_collection().create_index([("postedBy", ASCENDING)], name="postedBy")
+    logger.info("feed_view indexes ensured.")
+
+
+# --- Reads ---
+
+def is_behind() -> bool:
+    """Whether some visible post in food_posts has no entry (e.g. the view is empty or was never built)."""
+    return get_feed_view_collection().estimated_document_count() < get_food_collection().count_documents({"hidden": {"$ne": True}})
+
+
+def catch_up():
+    """Called at startup: when the view is behind food_posts, falls back to food_posts for
+    list reads and enqueues a rebuild. Every worker that starts behind enqueues one; the
+    job skips the work if an earlier one already caught the view up."""
+    global _ready
+    if not is_behind():
+        return
+    _ready = False
+    logger.warning("feed_view is behind food_posts; serving list reads from food_posts until it is rebuilt")
+    jobs.enqueue("rebuild_feed_view")
+
+
+def is_ready() -> bool:
+    global _ready, _checked_at
+    if not _ready and time.monotonic() - _checked_at >= FEED_VIEW_RECHECK_INTERVAL:
+        _checked_at = time.monotonic() # The rebuild may have run in another worker
+        try:
+            _ready = not is_behind()
+        except Exception as e:
+            logger.error(f"Failed to check whether feed_view has caught up: {e}", exc_info=True)
+    return _ready
+
+
+def find_entries(query: dict, view=None) -> Iterator[dict]:
+    """Entries matching `query`, which may only use fields the view shares with food_posts.
+    Until the view has caught up they are built from food_posts."""
+    if is_ready():
+        yield from (view if view is not None else get_feed_view_collection()).find(query)
+        return
+    batch: List[dict] = []
+    for food in get_food_collection().find(dict(query, hidden={"$ne": True}), batch_size=REBUILD_BATCH_SIZE):
+        batch.append(food)
+        if len(batch) >= REBUILD_BATCH_SIZE:
+            yield from _entries(batch)
+            batch = []
+    yield from _entries(batch)
+
+
+# --- Incremental maintenance (driven by the event subscribers below) ---
+
+def upsert_post(food: dict, poster: Optional[dict] = None):
+    """Writes the entry for a freshly inserted or reloaded food post."""
+    if food.get("hidden"):
+        return # Hidden by moderation: not part of the marketplace
+    try:
+        if poster is None and food.get("postedBy"):
+            poster = get_users_collection().find_one({"netId": food["postedBy"]}, POSTER_PROJECTION)
+        entry = build_entry(food, poster)
+        get_feed_view_collection().replace_one({"_id": entry["_id"]}, entry, upsert=True)
+    except Exception as e:
+        # The primary write already succeeded; a rebuild repairs the read model
+        logger.error(f"Failed to upsert feed_view entry for food {food.get('_id')}: {e}", exc_info=True)
+
+
+def update_post(food_id, set_fields: Optional[dict] = None, inc_fields: Optional[dict] = None):
+    """Mirrors a partial update of a food post onto its entry."""
+    update = {}
+    if set_fields:
+        set_fields = dict(set_fields)
+        if "status" in set_fields:
+            set_fields["available"] = set_fields["status"] == "green"
+        update["$set"] = set_fields
+    if inc_fields:
+        update["$inc"] = inc_fields
+    if not update:
+        return
+    try:
+        result = get_feed_view_collection().update_one({"_id": ObjectId(food_id)}, update)
+        if result.matched_count == 0:
+            # Entry missing (e.g. post predates the read model): materialize it from the source
+            food = get_food_collection().find_one({"_id": ObjectId(food_id)})
+            if food:
+                upsert_post(food)
+    except Exception as e:
+        logger.error(f"Failed to update feed_view entry for food {food_id}: {e}", exc_info=True)
+
+
+def update_poster(net_id: str, user: dict):
+    """Propagates a user's display fields to all of their posts."""
+    fields = {f"poster.{key}": value for key, value in poster_fields(user).items() if key in user}
+    if not net_id or not fields:
+        return
+    try:
+        result = get_feed_view_collection().update_many({"postedBy": net_id}, {"$set": fields})
+        logger.info(f"Updated poster fields on {result.modified_count} feed_view entries for {net_id}")
+    except Exception as e:
+        logger.error(f"Failed to update poster fields in feed_view for {net_id}: {e}", exc_info=True)
+
+
+# --- Event subscribers ---
+
+@events.on(events.FoodPosted)
+def _on_food_posted(event: events.FoodPosted):
+    upsert_post(event.food)
+
+@events.on(events.FoodBatchPosted)
+def _on_food_batch_posted(event: events.FoodBatchPosted):
+    try:
+        _write_batch(event.foods) # One poster lookup and one bulk upsert for the whole batch
+    except Exception as e:
+        logger.error(f"Failed to write feed_view entries for {len(event.foods)} bulk-posted foods: {e}", exc_info=True)
+
+@events.on(events.FoodReserved)
+def _on_food_reserved(event: events.FoodReserved):
+    update_post(event.foodId, {"status": "yellow", "reservedBy": event.reservedBy})
+
+@events.on(events.FoodClaimed)
+def _on_food_claimed(event: events.FoodClaimed):
+    fields = {"remainingQuantity": event.remaining}
+    if event.remaining == 0:
+        fields["status"] = "yellow"
+    update_post(event.foodId, fields)
+
+@events.on(events.FoodCompleted)
+def _on_food_completed(event: events.FoodCompleted):
+    update_post(event.foodId, {"status": "red"})
+
+@events.on(events.ReservationExpired)
+def _on_reservation_expired(event: events.ReservationExpired):
+    update_post(event.foodId, {"status": "green", "reservedBy": None})
+
+@events.on(events.ReportSubmitted)
+def _on_report_submitted(event: events.ReportSubmitted):
+    _report_counts.increment(ObjectId(event.postId), "reportCount")
+
+@events.on(events.UserProfileUpdated)
+def _on_user_profile_updated(event: events.UserProfileUpdated):
+    # Display fields (name, picture) are denormalized onto this user's feed entries
+    update_poster(event.netId, event.changes)
+
+@events.on(events.PostsHidden)
+def _on_posts_hidden(event: events.PostsHidden):
+    try:
+        get_feed_view_collection().delete_many({"_id": {"$in": [ObjectId(food_id) for food_id in event.foodIds]}})
+    except Exception as e:
+        logger.error(f"Failed to remove {len(event.foodIds)} hidden posts from feed_view: {e}", exc_info=True)
+
+@events.on(events.PostsArchived)
+def _on_posts_archived(event: events.PostsArchived):
+    try:
+        get_feed_view_collection().delete_many({"_id": {"$in": [ObjectId(food_id) for food_id in event.foodIds]}})
+    except Exception as e:
+        logger.error(f"Failed to remove {len(event.foodIds)} archived posts from feed_view: {e}", exc_info=True)
+
+
+# --- Rebuild ---
+
+
+def _entries(batch: List[dict]) -> List[dict]:
+    net_ids = list({food.get("postedBy") for food in batch if food.get("postedBy")})
+    posters = {}
+    if net_ids:
+        for user in get_users_collection().find({"netId": {"$in": net_ids}}, POSTER_PROJECTION):
+            posters[user["netId"]] = user
+    return [build_entry(food, posters.get(food.get("postedBy"))) for food in batch]
+
+
+def _write_batch(batch: List[dict]) -> int:
+    operations = [ReplaceOne({"_id": entry["_id"]}, entry, upsert=True) for entry in _entries(batch)]
+    if operations:
+        get_feed_view_collection().bulk_write(operations, ordered=False)
+    return len(operations)
+
+
+def _delete_orphans(seen: set, started: datetime) -> int:
+    view = get_feed_view_collection()
+    orphans = [
+        entry["_id"] for entry in view.find({}, {"_id": 1})
+        # Entries for posts created after the rebuild started are not orphans
+        if entry["_id"] not in seen and entry["_id"].generation_time.replace(tzinfo=None) < started
+    ]
+    for i in range(0, len(orphans), REBUILD_BATCH_SIZE):
+        view.delete_many({"_id": {"$in": orphans[i:i + REBUILD_BATCH_SIZE]}})
+    return len(orphans)
+
+
+def rebuild(batch_size: int = REBUILD_BATCH_SIZE) -> dict:
+    """Recreates every entry from food_posts and users, streaming in batches."""
+    started_clock = time.perf_counter()
+    started = datetime.utcnow()
+    ensure_indexes()
+    seen = set()
+    written = 0
+    batch: List[dict] = []
+    for food in get_food_collection().find({"hidden": {"$ne": True}}, batch_size=batch_size):
+        batch.append(food)
+        seen.add(food["_id"])
+        if len(batch) >= batch_size:
+            written += _write_batch(batch)
+            batch = []
+    if batch:
+        written += _write_batch(batch)
+    deleted = _delete_orphans(seen, started)
+    elapsed = time.perf_counter() - started_clock
+    logger.info(f"feed_view rebuilt: {written} entries written, {deleted} orphans removed in {elapsed:.2f}s")
+    return {"written": written, "deleted": deleted, "seconds": round(elapsed, 3)}
+
+
+@jobs.job("rebuild_feed_view")
+def rebuild_job(payload: Optional[dict] = None):
+    global _ready
+    if is_behind():
+        rebuild()
+    _ready = True
+    invalidation_bus.publish("feed") # Snapshots built from the fallback are rebuilt from the view
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain the feed_view read model.")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--batch-size", type=int, default=REBUILD_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "rebuild":
+        print(rebuild(batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
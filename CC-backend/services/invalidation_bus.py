@@ -0,0 +1,227 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+from pymongo import CursorType, DESCENDING
+
+from database import get_db
+from services import events
+
+logger = logging.getLogger(__name__)
+
+# Cross-worker bus is opt-in; with a single worker every invalidation is delivered in-process
+CACHE_BUS_ENABLED = os.getenv("CACHE_BUS_ENABLED", "").lower() in ("1", "true", "yes")
+CACHE_BUS_COLLECTION = "cache_invalidations"
+CACHE_BUS_SIZE_BYTES = int(os.getenv("CACHE_BUS_SIZE_BYTES", str(1024 * 1024)))
+# Upper bound on how stale a cache may get if the bus itself is unhealthy:
+# past this, every subscriber is flushed instead of waiting for key-level messages.
+CACHE_BUS_MAX_STALENESS = float(os.getenv("CACHE_BUS_MAX_STALENESS", "5"))
+
+WILDCARD = "*" # Delivered to every subscriber on a full flush
+
+ORIGIN = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+_subscribers: Dict[str, List[Callable[[str], None]]] = {}
+_thread: Optional[threading.Thread] = None
+_stop = threading.Event()
+_stats_lock = threading.Lock()
+_stats = {
+    "published": 0,
+    "received": 0,
+    "flushes": 0,
+    "reconnects": 0,
+    "lag_ms_last": None,
+    "lag_ms_max": 0.0,
+    "lag_ms_total": 0.0,
+    "last_healthy_at": None,
+}
+
+
+def subscribe(prefix: str, handler: Callable[[str], None]):
+    """Registers a handler for keys equal to `prefix` or starting with `prefix:`.
+    Handlers may be called from the tailer thread, so they must be thread-safe and quick."""
+    _subscribers.setdefault(prefix, []).append(handler)
+
+
+def _dispatch(key: str):
+    for prefix, handlers in _subscribers.items():
+        if key == WILDCARD or key == prefix or key.startswith(f"{prefix}:"):
+            for handler in handlers:
+                try:
+                    handler(key)
+                except Exception as e:
+                    logger.error(f"Invalidation handler for '{prefix}' failed on key '{key}': {e}", exc_info=True)
+
+
+def publish(*keys: str):
+    """Invalidates `keys` in this worker immediately and, when the bus is running, in every other worker."""
+    for key in keys:
+        _dispatch(key)
+    if not is_running():
+        return
+    try:
+        get_db()[CACHE_BUS_COLLECTION].insert_one({"keys": list(keys), "origin": ORIGIN, "ts": time.time()})
+        with _stats_lock:
+            _stats["published"] += 1
+    except Exception as e:
+        # Other workers fall back to the staleness bound when a message is lost
+        logger.error(f"Failed to publish cache invalidation for {keys}: {e}", exc_info=True)
+
+
+def flush_all(reason: str):
+    logger.warning(f"Flushing all invalidation subscribers: {reason}")
+    with _stats_lock:
+        _stats["flushes"] += 1
+    _dispatch(WILDCARD)
+
+
+def _ensure_collection(db):
+    if CACHE_BUS_COLLECTION not in db.list_collection_names():
+        db.create_collection(CACHE_BUS_COLLECTION, capped=True, size=CACHE_BUS_SIZE_BYTES)
+        # A tailable cursor on an empty capped collection dies immediately
+        db[CACHE_BUS_COLLECTION].insert_one({"keys": [], "origin": "bootstrap", "ts": time.time()})
+        logger.info(f"Created capped '{CACHE_BUS_COLLECTION}' collection ({CACHE_BUS_SIZE_BYTES} bytes)")
+
+
+def _record_receive(doc: dict):
+    lag_ms = max(0.0, (time.time() - doc.get("ts", time.time())) * 1000)
+    with _stats_lock:
+        _stats["received"] += 1
+        _stats["lag_ms_last"] = lag_ms
+        _stats["lag_ms_max"] = max(_stats["lag_ms_max"], lag_ms)
+        _stats["lag_ms_total"] += lag_ms
+
+
+def _tail_loop():
+    collection = get_db()[CACHE_BUS_COLLECTION]
+    last = collection.find_one(sort=[("$natural", DESCENDING)])
+    last_id = last["_id"] if last else None
+    first_connect = True
+    unhealthy_since = None
+
+    while not _stop.is_set():
+        try:
+            # No filter: a tailable cursor whose query matches nothing is closed by the server,
+            # so resume by skipping in natural order up to the last message already handled.
+            cursor = collection.find({}, cursor_type=CursorType.TAILABLE_AWAIT, max_await_time_ms=1000)
+            skipping = last_id is not None
+            if not first_connect:
+                with _stats_lock:
+                    _stats["reconnects"] += 1
+            first_connect = False
+            unhealthy_since = None
+            while cursor.alive and not _stop.is_set():
+                with _stats_lock:
+                    _stats["last_healthy_at"] = time.time()
+                for doc in cursor:
+                    if skipping:
+                        skipping = doc["_id"] != last_id
+                        continue
+                    last_id = doc["_id"]
+                    if doc.get("origin") in (ORIGIN, "bootstrap"):
+                        continue
+                    _record_receive(doc)
+                    for key in doc.get("keys", []):
+                        _dispatch(key)
+                if skipping:
+                    # The last handled message rolled out of the capped collection: some were missed
+                    flush_all("invalidation bus fell behind the capped collection")
+                    skipping = False
+        except Exception as e:
+            logger.error(f"Invalidation bus tail failed: {e}", exc_info=True)
+            now = time.time()
+            unhealthy_since = unhealthy_since or now
+            if now - unhealthy_since >= CACHE_BUS_MAX_STALENESS:
+                flush_all("invalidation bus unhealthy past the staleness bound")
+                unhealthy_since = now
+        _stop.wait(min(1.0, CACHE_BUS_MAX_STALENESS))
+
+
+def is_running() -> bool:
+    return _thread is not None and _thread.is_alive()
+
+
+def start():
+    """Starts tailing the bus in a daemon thread (no-op unless CACHE_BUS_ENABLED)."""
+    global _thread
+    if not CACHE_BUS_ENABLED or is_running():
+        return
+    _ensure_collection(get_db())
+    _stop.clear()
+    _thread = threading.Thread(target=_tail_loop, name="invalidation-bus", daemon=True)
+    _thread.start()
+    logger.info(f"Cache invalidation bus started (origin={ORIGIN}, max staleness={CACHE_BUS_MAX_STALENESS}s)")
+
+
+def stop():
+    global _thread
+    if _thread is None:
+        return
+    _stop.set()
+    _thread.join(timeout=2)
+    _thread = None
+
+
+def stats() -> dict:
+    with _stats_lock:
+        data = dict(_stats)
+    data["enabled"] = CACHE_BUS_ENABLED
+    data["running"] = is_running()
+    data["origin"] = ORIGIN
+    data["lag_ms_avg"] = data.pop("lag_ms_total") / data["received"] if data["received"] else None
+    # Staleness bound currently in force: tail health age, or 0 when running in-process only
+    last_healthy = data["last_healthy_at"]
+    data["staleness_s"] = (time.time() - last_healthy) if data["running"] and last_healthy else 0.0
+    return data
+
+
+# --- Domain event -> cache key mapping ---
+# Background subscribers: publishing is a DB insert, and caches are already bounded by their staleness
+
+@events.on(events.FoodPosted, mode=events.BACKGROUND)
+def _on_food_posted(event: events.FoodPosted):
+    publish("feed", f"food:{event.food['_id']}")
+
+@events.on(events.FoodBatchPosted, mode=events.BACKGROUND)
+def _on_food_batch_posted(event: events.FoodBatchPosted):
+    publish("feed", *(f"food:{food['_id']}" for food in event.foods))
+
+@events.on(events.FoodReserved, mode=events.BACKGROUND)
+def _on_food_reserved(event: events.FoodReserved):
+    publish("feed", f"food:{event.foodId}")
+
+@events.on(events.FoodClaimed, mode=events.BACKGROUND)
+def _on_food_claimed(event: events.FoodClaimed):
+    publish("feed", f"food:{event.foodId}")
+
+@events.on(events.FoodCompleted, mode=events.BACKGROUND)
+def _on_food_completed(event: events.FoodCompleted):
+    publish("feed", f"food:{event.foodId}")
+
+@events.on(events.ReservationExpired, mode=events.BACKGROUND)
+def _on_reservation_expired(event: events.ReservationExpired):
+    publish("feed", f"food:{event.foodId}")
+
+@events.on(events.ReportSubmitted, mode=events.BACKGROUND)
+def _on_report_submitted(event: events.ReportSubmitted):
+    publish("feed", f"food:{event.postId}", f"reports:{event.postId}") # reportCount is part of the feed payload
+
+@events.on(events.PostsHidden, mode=events.BACKGROUND)
+def _on_posts_hidden(event: events.PostsHidden):
+    publish("feed", *(f"food:{food_id}" for food_id in event.foodIds))
+
+@events.on(events.PostsArchived, mode=events.BACKGROUND)
+def _on_posts_archived(event: events.PostsArchived):
+    publish("feed", *(f"food:{food_id}" for food_id in event.foodIds))
+
+@events.on(events.UserRegistered, mode=events.BACKGROUND)
+def _on_user_registered(event: events.UserRegistered):
+    publish(f"user:{event.netId}")
+
+@events.on(events.UserProfileUpdated, mode=events.BACKGROUND)
+def _on_user_profile_updated(event: events.UserProfileUpdated):
+    publish(f"user:{event.netId}", "feed") # Poster display fields appear in the feed
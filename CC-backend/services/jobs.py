@@ -0,0 +1,436 @@
+"""Persistent background job runner.
+
+Jobs live in the `jobs` collection, so they survive restarts and are shared by every
+uvicorn worker. A worker claims a due job by atomically leasing it; while the handler
+runs the lease is renewed, and if the worker dies the lease expires and another worker
+picks the job up again. Failures are retried with exponential backoff up to the job's
+`maxAttempts`. Periodic jobs are enqueued only by the elected scheduler leader.
+
+Handlers are plain (blocking) functions taking the job payload; they run in a worker
+thread. Register them where the work lives:
+
+    @jobs.job("notify_poster", concurrency=4)
+    def notify_poster(payload): ...
+
+    jobs.enqueue("notify_poster", {"foodId": food_id})
+
+Queue depth and latency:
+
+    python -m services.jobs stats
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from database import get_db
+
+logger = logging.getLogger(__name__)
+
+JOBS_COLLECTION = "jobs"
+JOB_LEADERS_COLLECTION = "job_leaders"
+JOB_SCHEDULES_COLLECTION = "job_schedules"
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "true").lower() in ("1", "true", "yes")
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_BACKOFF_BASE = float(os.getenv("JOB_BACKOFF_BASE", "2"))
+JOB_BACKOFF_MAX = float(os.getenv("JOB_BACKOFF_MAX", "600"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", str(7 * 24 * 3600))) # Finished jobs are purged by a TTL index
+DEFAULT_MAX_ATTEMPTS = 5
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class JobType:
+    def __init__(self, name: str, handler: Callable[[dict], None], concurrency: int, max_attempts: int, lease_seconds: float):
+        self.name = name
+        self.handler = handler
+        self.concurrency = concurrency # Per worker
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.wait_ms_total = 0.0 # Due time -> start
+        self.run_ms_total = 0.0
+        self.run_ms_max = 0.0
+
+
+class PeriodicJob:
+    def __init__(self, name: str, job_type: str, interval: float, payload: dict):
+        self.name = name
+        self.job_type = job_type
+        self.interval = interval
+        self.payload = payload
+
+
+_job_types: Dict[str, JobType] = {}
+_periodic: Dict[str, PeriodicJob] = {}
+_stats_lock = threading.Lock()
+_is_leader = False
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_active = set()
+
+
+def _jobs():
+    return get_db()[JOBS_COLLECTION]
+
+
+# --- Registration ---
+
+def register(name: str, handler: Callable[[dict], None], concurrency: int = 1,
+             max_attempts: int = DEFAULT_MAX_ATTEMPTS, lease_seconds: float = JOB_LEASE_SECONDS):
+    if concurrency < 1:
+        raise ValueError("concurrency must be at least 1")
+    _job_types[name] = JobType(name, handler, concurrency, max_attempts, lease_seconds)
+
+
+def job(name: str, **options):
+    """Decorator form of register()."""
+    def decorator(handler):
+        register(name, handler, **options)
+        return handler
+    return decorator
+
+
+def every(seconds: float, job_type: str, payload: Optional[dict] = None, name: Optional[str] = None):
+    """Enqueues `job_type` every `seconds` across the whole deployment (only the leader schedules)."""
+    name = name or job_type
+    _periodic[name] = PeriodicJob(name, job_type, seconds, payload or {})
+
+
+# --- Queue ---
+
+def enqueue(job_type: str, payload: Optional[dict] = None, run_at: Optional[datetime] = None,
+            max_attempts: Optional[int] = None) -> ObjectId:
+    now = datetime.utcnow()
+    spec = _job_types.get(job_type)
+    result = _jobs().insert_one({
+        "type": job_type,
+        "payload": payload or {},
+        "status": QUEUED,
+        "attempts": 0,
+        "maxAttempts": max_attempts or (spec.max_attempts if spec else DEFAULT_MAX_ATTEMPTS),
+        "runAt": run_at or now,
+        "createdAt": now,
+        "leaseUntil": None,
+        "leasedBy": None,
+    })
+    if _loop is not None and _wake is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake.set) # Due now: don't wait for the next poll
+    return result.inserted_id
+
+
+def ensure_indexes():
+    jobs = _jobs()
+    jobs.create_index([("type", ASCENDING), ("status", ASCENDING), ("runAt", ASCENDING)], name="type_status_runAt")
+    jobs.create_index([("status", ASCENDING), ("leaseUntil", ASCENDING)], name="status_leaseUntil")
+    jobs.create_index("finishedAt", name="finishedAt_ttl", expireAfterSeconds=JOB_RETENTION_SECONDS)
+    logger.info("jobs indexes ensured.")
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(JOB_BACKOFF_MAX, JOB_BACKOFF_BASE * (2 ** max(0, attempts - 1)))
+    return delay + random.uniform(0, JOB_BACKOFF_BASE) # Jitter so retries of a burst don't align
+
+
+def claim(job_type: str) -> Optional[dict]:
+    """Leases the next due job of `job_type` (or one whose lease expired), or returns None."""
+    spec = _job_types[job_type]
+    now = datetime.utcnow()
+    return _jobs().find_one_and_update(
+        {"type": job_type, "$or": [
+            {"status": QUEUED, "runAt": {"$lte": now}},
+            {"status": RUNNING, "leaseUntil": {"$lt": now}}, # Worker died mid-job
+        ]},
+        {"$set": {"status": RUNNING, "leasedBy": WORKER_ID, "startedAt": now,
+                  "leaseUntil": now + timedelta(seconds=spec.lease_seconds)},
+         "$inc": {"attempts": 1}},
+        sort=[("runAt", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def _renew_lease(job: dict, spec: JobType) -> bool:
+    result = _jobs().update_one(
+        {"_id": job["_id"], "status": RUNNING, "leasedBy": WORKER_ID},
+        {"$set": {"leaseUntil": datetime.utcnow() + timedelta(seconds=spec.lease_seconds)}},
+    )
+    return result.matched_count == 1
+
+
+def execute(job: dict):
+    """Runs a leased job and records the outcome. Blocking."""
+    spec = _job_types[job["type"]]
+    owned = {"_id": job["_id"], "status": RUNNING, "leasedBy": WORKER_ID}
+    wait_ms = max(0.0, (job["startedAt"] - job["runAt"]).total_seconds() * 1000)
+
+    if job["attempts"] > job["maxAttempts"]:
+        # Only reachable when leases kept expiring (worker crashes), so the handler never reported back
+        _jobs().update_one(owned, {"$set": {"status": FAILED, "finishedAt": datetime.utcnow(), "lastError": "Lease expired too many times"}})
+        with _stats_lock:
+            spec.failed += 1
+        return
+
+    started = time.perf_counter()
+    error = None
+    try:
+        spec.handler(job.get("payload", {}))
+    except Exception as e:
+        error = e
+        logger.error(f"Job {job['_id']} ({spec.name}) failed on attempt {job['attempts']}/{job['maxAttempts']}: {e}", exc_info=True)
+    run_ms = (time.perf_counter() - started) * 1000
+    now = datetime.utcnow()
+
+    if error is None:
+        _jobs().update_one(owned, {"$set": {"status": DONE, "finishedAt": now, "leaseUntil": None, "runMs": run_ms}})
+    elif job["attempts"] < job["maxAttempts"]:
+        retry_at = now + timedelta(seconds=backoff_seconds(job["attempts"]))
+        _jobs().update_one(owned, {"$set": {"status": QUEUED, "runAt": retry_at, "leaseUntil": None, "leasedBy": None, "lastError": str(error)}})
+    else:
+        _jobs().update_one(owned, {"$set": {"status": FAILED, "finishedAt": now, "leaseUntil": None, "lastError": str(error)}})
+
+    with _stats_lock:
+        spec.wait_ms_total += wait_ms
+        spec.run_ms_total += run_ms
+        spec.run_ms_max = max(spec.run_ms_max, run_ms)
+        if error is None:
+            spec.completed += 1
+        elif job["attempts"] < job["maxAttempts"]:
+            spec.retried += 1
+        else:
+            spec.failed += 1
+
+
+def run_due(job_type: Optional[str] = None, limit: int = 100) -> int:
+    """Claims and runs due jobs inline (CLI, tests). Returns how many ran."""
+    ran = 0
+    for name in ([job_type] if job_type else list(_job_types)):
+        while ran < limit:
+            leased = claim(name)
+            if leased is None:
+                break
+            execute(leased)
+            ran += 1
+    return ran
+
+
+# --- Periodic jobs (leader only) ---
+
+def try_become_leader(name: str = "scheduler") -> bool:
+    """Leader lease in Mongo: held while renewed, taken over once it expires."""
+    global _is_leader
+    now = datetime.utcnow()
+    lease_until = now + timedelta(seconds=JOB_LEASE_SECONDS)
+    try:
+        get_db()[JOB_LEADERS_COLLECTION].find_one_and_update(
+            {"_id": name, "$or": [{"holder": WORKER_ID}, {"leaseUntil": {"$lt": now}}]},
+            {"$set": {"holder": WORKER_ID, "leaseUntil": lease_until}},
+            upsert=True,
+        )
+        if not _is_leader:
+            logger.info(f"Worker {WORKER_ID} elected job scheduler leader")
+        _is_leader = True
+    except DuplicateKeyError:
+        _is_leader = False # Another worker holds an unexpired lease
+    return _is_leader
+
+
+def release_leadership(name: str = "scheduler"):
+    global _is_leader
+    if _is_leader:
+        get_db()[JOB_LEADERS_COLLECTION].delete_one({"_id": name, "holder": WORKER_ID})
+        _is_leader = False
+
+
+def schedule_periodic() -> int:
+    """Enqueues periodic jobs that are due. The conditional update makes each slot fire once
+    even if leadership changes hands mid-tick."""
+    if not _periodic or not try_become_leader():
+        return 0
+    schedules = get_db()[JOB_SCHEDULES_COLLECTION]
+    now = datetime.utcnow()
+    enqueued = 0
+    for periodic in _periodic.values():
+        next_run = now + timedelta(seconds=periodic.interval)
+        try:
+            schedules.update_one(
+                {"_id": periodic.name, "nextRunAt": {"$lte": now}},
+                {"$set": {"nextRunAt": next_run, "lastRunAt": now}},
+                upsert=True, # First run ever
+            )
+        except DuplicateKeyError:
+            continue # The schedule exists and is not due yet
+        enqueue(periodic.job_type, periodic.payload)
+        enqueued += 1
+    return enqueued
+
+
+# --- Runner ---
+
+async def _execute(spec: JobType, leased: dict):
+    async def heartbeat():
+        while True:
+            await asyncio.sleep(spec.lease_seconds / 3)
+            if not await asyncio.to_thread(_renew_lease, leased, spec):
+                logger.warning(f"Lost lease on job {leased['_id']} ({spec.name})")
+                return
+    renewer = asyncio.create_task(heartbeat())
+    try:
+        await asyncio.to_thread(execute, leased)
+    except Exception as e:
+        logger.error(f"Job {leased['_id']} ({spec.name}) could not be recorded: {e}", exc_info=True)
+    finally:
+        renewer.cancel()
+        with _stats_lock:
+            spec.running -= 1
+        if _wake is not None:
+            _wake.set() # A slot freed up
+
+
+async def _run_loop():
+    while True:
+        claimed = False
+        try:
+            await asyncio.to_thread(schedule_periodic)
+            for spec in list(_job_types.values()):
+                while spec.running < spec.concurrency:
+                    leased = await asyncio.to_thread(claim, spec.name)
+                    if leased is None:
+                        break
+                    with _stats_lock:
+                        spec.running += 1
+                    task = asyncio.create_task(_execute(spec, leased))
+                    _active.add(task)
+                    task.add_done_callback(_active.discard)
+                    claimed = True
+        except Exception as e:
+            logger.error(f"Job runner tick failed: {e}", exc_info=True)
+        if claimed:
+            continue
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=JOB_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+
+
+def is_running() -> bool:
+    return _task is not None and not _task.done()
+
+
+def start():
+    """Starts the runner on the running event loop (no-op unless JOBS_ENABLED)."""
+    global _loop, _wake, _task
+    if not JOBS_ENABLED or is_running():
+        return
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    _task = _loop.create_task(_run_loop())
+    logger.info(f"Job runner started (worker={WORKER_ID}, types={sorted(_job_types)}, periodic={sorted(_periodic)})")
+
+
+async def stop(grace: float = 10):
+    global _loop, _wake, _task
+    if _task is None or _loop is not asyncio.get_running_loop():
+        return # Not started by this event loop
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    if _active:
+        # Jobs still running after the grace period are retried once their lease expires
+        await asyncio.wait(list(_active), timeout=grace)
+    try:
+        release_leadership()
+    except Exception as e:
+        logger.error(f"Failed to release job scheduler leadership: {e}", exc_info=True)
+    _loop, _wake, _task = None, None, None
+
+
+# --- Metrics ---
+
+def _type_stats(spec: JobType) -> dict:
+    finished = spec.completed + spec.retried + spec.failed # Attempts that reported back
+    return {
+        "concurrency": spec.concurrency,
+        "running": spec.running,
+        "completed": spec.completed,
+        "retried": spec.retried,
+        "failed": spec.failed,
+        "wait_ms_avg": round(spec.wait_ms_total / finished, 3) if finished else None,
+        "run_ms_avg": round(spec.run_ms_total / finished, 3) if finished else None,
+        "run_ms_max": round(spec.run_ms_max, 3),
+    }
+
+
+def stats() -> dict:
+    with _stats_lock:
+        types = {spec.name: _type_stats(spec) for spec in _job_types.values()}
+    return {"worker": WORKER_ID, "running": is_running(), "leader": _is_leader, "types": types}
+
+
+def queue_stats() -> dict:
+    """Deployment-wide queue depth and latency, read from the jobs collection."""
+    now = datetime.utcnow()
+    depth: Dict[str, dict] = {}
+    for row in _jobs().aggregate([
+        {"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}},
+    ]):
+        depth.setdefault(row["_id"]["type"], {})[row["_id"]["status"]] = row["count"]
+    oldest_due = {
+        row["_id"]: round((now - row["oldest"]).total_seconds(), 3)
+        for row in _jobs().aggregate([
+            {"$match": {"status": QUEUED, "runAt": {"$lte": now}}},
+            {"$group": {"_id": "$type", "oldest": {"$min": "$runAt"}}},
+        ])
+    }
+    latency = {
+        row["_id"]: {"jobs": row["jobs"], "latency_ms_avg": round(row["latency"], 3), "run_ms_avg": round(row["run"] or 0, 3)}
+        for row in _jobs().aggregate([
+            {"$match": {"status": DONE, "finishedAt": {"$gte": now - timedelta(hours=1)}}},
+            {"$group": {
+                "_id": "$type",
+                "jobs": {"$sum": 1},
+                "latency": {"$avg": {"$subtract": ["$finishedAt", "$createdAt"]}}, # Enqueue -> done, ms
+                "run": {"$avg": "$runMs"},
+            }},
+        ])
+    }
+    return {
+        "depth": depth,
+        "oldest_due_s": oldest_due,
+        "last_hour": latency,
+    }
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Inspect the background job queue.")
+    parser.add_argument("command", choices=["stats"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "stats":
+        print(json.dumps(queue_stats(), indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Moderation over the reports collection.
+
+`queue()` pages through reports newest first with a keyset cursor on
+(submittedAt, _id), so every page is one bounded index range however deep the
+admin scrolls. `grouped()` folds the matching reports into one row per post with a
+single $group stage, worst posts (most reports) first. `enriched()` is the same page
+with the reported post and both users joined in by $lookup, photo payloads
+projected out inside the lookups, so a page costs one aggregation rather than a
+query per report plus one per post and user.
+
+A unique (postId, user1ID) index allows one report per user per post. A post's
+reportCount is a write-behind counter (services/counters.py), so a wave of reports
+on one post becomes one `$inc`; after each flush, the flushed posts that reached
+REPORT_HIDE_THRESHOLD and are not hidden yet are hidden with one conditional
+update. Duplicates that predate the index block its creation; remove them with:
+
+    python -m services.moderation dedupe
+"""
+import argparse
+import logging
+import os
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from database import get_food_collection, get_report_collection, get_users_collection
+from services import counters, events, feed_view
+
+logger = logging.getLogger(__name__)
+
+MAX_QUEUE_PAGE = 200
+REPORT_HIDE_THRESHOLD = int(os.getenv("REPORT_HIDE_THRESHOLD", "5")) # 0 disables auto-hide
+AUTO_HIDDEN_BY = "auto" # hiddenBy on posts hidden by the threshold rather than an admin
+# What the enriched view joins in; never the photo (clients load it from the thumbnail url)
+REPORTED_POST_PROJECTION = {
+    "foodName": 1, "category": 1, "status": 1, "pickupLocation": 1, "postedBy": 1, "reservedBy": 1,
+    "timestamp": 1, "reportCount": 1, "hidden": 1, "hiddenBy": 1,
+}
+REPORT_USER_PROJECTION = {"_id": 0, "netId": 1, "fullName": 1, "email": 1, "role": 1}
+
+
+def ensure_indexes():
+    reports = get_report_collection()
+    try:
+        reports.create_index([("postId", ASCENDING), ("user1ID", ASCENDING)], name="postId_user1ID_unique", unique=True)
+    except OperationFailure as e:
+        logger.error(f"Could not create the unique report index (run 'python -m services.moderation dedupe'): {e}")
+    # Queue pages: equality on status (and reported user), then the sort keys
+    reports.create_index([("reviewStatus", ASCENDING), ("submittedAt", DESCENDING), ("_id", DESCENDING)], name="reviewStatus_submittedAt")
+    reports.create_index([("user2ID", ASCENDING), ("reviewStatus", ASCENDING), ("submittedAt", DESCENDING), ("_id", DESCENDING)], name="user2ID_reviewStatus_submittedAt")
+    # Pages without a status filter (all reports, or all of one user's)
+    reports.create_index([("submittedAt", DESCENDING), ("_id", DESCENDING)], name="submittedAt_id")
+    reports.create_index([("user2ID", ASCENDING), ("submittedAt", DESCENDING), ("_id", DESCENDING)], name="user2ID_submittedAt_id")
+    # Per-post selection (bulk moderation, grouped view)
+    reports.create_index([("postId", ASCENDING), ("reviewStatus", ASCENDING)], name="postId_reviewStatus")
+    # The enriched view joins reporters and reported users on netId (posts join on _id)
+    get_users_collection().create_index([("netId", ASCENDING)], name="netId")
+    logger.info("Report indexes ensured.")
+
+
+def encode_cursor(report: dict) -> str:
+    return f"{report['submittedAt'].isoformat()}_{report['_id']}"
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Raises ValueError for a malformed cursor."""
+    submitted_at, _, report_id = cursor.rpartition("_")
+    if not ObjectId.is_valid(report_id):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return datetime.fromisoformat(submitted_at), ObjectId(report_id)
+
+
+def match_stage(review_status: Optional[str] = None, reported_user: Optional[str] = None,
+                since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+    query = {}
+    if review_status:
+        query["reviewStatus"] = review_status
+    if reported_user:
+        query["user2ID"] = reported_user
+    if since or until:
+        query["submittedAt"] = {}
+        if since:
+            query["submittedAt"]["$gte"] = since
+        if until:
+            query["submittedAt"]["$lt"] = until
+    return query
+
+
+def serialize_report(report: dict) -> dict:
+    report["id"] = str(report.pop("_id"))
+    for field in ("submittedAt", "reviewedAt"):
+        if isinstance(report.get(field), datetime):
+            report[field] = report[field].isoformat()
+    return report
+
+
+def page_query(cursor: Optional[str] = None, **filters) -> dict:
+    query = match_stage(**filters)
+    if cursor:
+        submitted_at, report_id = decode_cursor(cursor)
+        # Strictly after the cursor in (submittedAt desc, _id desc) order
+        query["$or"] = [
+            {"submittedAt": {"$lt": submitted_at}},
+            {"submittedAt": submitted_at, "_id": {"$lt": report_id}},
+        ]
+    return query
+
+
+def _page(reports: List[dict], limit: int, serialize) -> dict:
+    next_cursor = encode_cursor(reports[limit - 1]) if len(reports) > limit else None
+    return {"reports": [serialize(report) for report in reports[:limit]], "nextCursor": next_cursor}
+
+
+def queue(limit: int = 50, cursor: Optional[str] = None, **filters) -> dict:
+    """One page of matching reports, newest first. Pass the returned `nextCursor` back for the next page."""
+    reports = list(
+        get_report_collection().find(page_query(cursor, **filters))
+        .sort([("submittedAt", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit + 1) # One extra tells us whether there is a next page
+    )
+    return _page(reports, limit, serialize_report)
+
+
+def enriched_pipeline(limit: int = 50, cursor: Optional[str] = None, **filters) -> list:
+    def user_lookup(local_field: str, as_field: str) -> dict:
+        return {"$lookup": {
+            "from": get_users_collection().name, "localField": local_field, "foreignField": "netId",
+            "pipeline": [{"$project": REPORT_USER_PROJECTION}, {"$limit": 1}], "as": as_field,
+        }}
+
+    return [
+        {"$match": page_query(cursor, **filters)},
+        {"$sort": {"submittedAt": -1, "_id": -1}},
+        {"$limit": limit + 1}, # Join only the page, never the whole match
+        {"$addFields": {"postObjectId": {"$convert": {"input": "$postId", "to": "objectId", "onError": None, "onNull": None}}}},
+        {"$lookup": {
+            "from": get_food_collection().name, "localField": "postObjectId", "foreignField": "_id",
+            "pipeline": [{"$project": REPORTED_POST_PROJECTION}], "as": "post",
+        }},
+        user_lookup("user1ID", "reporter"),
+        user_lookup("user2ID", "reportedUser"),
+        {"$project": {"postObjectId": 0}},
+    ]
+
+
+def serialize_enriched_report(report: dict) -> dict:
+    """Unwraps the single-element lookup arrays (None when the post or user is gone)."""
+    for field in ("post", "reporter", "reportedUser"):
+        report[field] = report[field][0] if report.get(field) else None
+    post = report["post"]
+    if post is not None:
+        post["id"] = str(post.pop("_id"))
+        post["thumbnail"] = feed_view.thumbnail_url(post["id"])
+        if isinstance(post.get("timestamp"), datetime):
+            post["timestamp"] = post["timestamp"].isoformat()
+    return serialize_report(report)
+
+
+def enriched(limit: int = 50, cursor: Optional[str] = None, **filters) -> dict:
+    """`queue()` with each report's post, reporter and reported user joined in, in one aggregation."""
+    reports = list(get_report_collection().aggregate(enriched_pipeline(limit, cursor, **filters)))
+    return _page(reports, limit, serialize_enriched_report)
+
+
+def grouped(limit: int = 50, skip: int = 0, **filters) -> List[dict]:
+    """Matching reports aggregated per post, most reported first."""
+    pipeline = [
+        {"$match": match_stage(**filters)},
+        {"$group": {
+            "_id": "$postId",
+            "reportCount": {"$sum": 1},
+            "firstSubmittedAt": {"$min": "$submittedAt"},
+            "lastSubmittedAt": {"$max": "$submittedAt"},
+            "reporters": {"$addToSet": "$user1ID"},
+            "reportedUser": {"$first": "$user2ID"},
+        }},
+        {"$addFields": {"reporterCount": {"$size": "$reporters"}}},
+        {"$sort": {"reportCount": -1, "reporterCount": -1, "lastSubmittedAt": -1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+    ]
+    posts = []
+    for group in get_report_collection().aggregate(pipeline):
+        group["postId"] = group.pop("_id")
+        for field in ("firstSubmittedAt", "lastSubmittedAt"):
+            if isinstance(group.get(field), datetime):
+                group[field] = group[field].isoformat()
+        posts.append(group)
+    return posts
+
+
+# --- Report counting ---
+
+def hide_reported(food_ids: List[ObjectId]) -> List[str]:
+    """Hides those of `food_ids` that reached the threshold and aren't hidden yet. Returns the ids it hid.
+    Posts already hidden (by an admin or an earlier flush) keep their hiddenBy/hiddenAt."""
+    if REPORT_HIDE_THRESHOLD <= 0 or not food_ids:
+        return []
+    now = datetime.now()
+    result = get_food_collection().update_many(
+        {"_id": {"$in": food_ids}, "reportCount": {"$gte": REPORT_HIDE_THRESHOLD}, "hidden": {"$ne": True}},
+        {"$set": {"hidden": True, "hiddenBy": AUTO_HIDDEN_BY, "hiddenAt": now}},
+    )
+    if not result.modified_count:
+        return []
+    # hiddenAt is this flush's own stamp, so it picks out exactly the posts hidden just now
+    hidden = [str(food_id) for food_id in get_food_collection().distinct("_id", {"_id": {"$in": food_ids}, "hiddenBy": AUTO_HIDDEN_BY, "hiddenAt": now})]
+    logger.info(f"Posts {', '.join(hidden)} reached {REPORT_HIDE_THRESHOLD} reports and were hidden")
+    events.emit(events.PostsHidden(foodIds=hidden, hiddenBy=AUTO_HIDDEN_BY))
+    return hidden
+
+
+_report_counts = counters.buffer("food_posts.reportCount", get_food_collection, on_flush=hide_reported)
+
+
+def count_report(food_id: ObjectId):
+    """Adds one report to the post's reportCount; the threshold is checked when the count is flushed."""
+    _report_counts.increment(food_id, "reportCount")
+
+
+def dedupe() -> int:
+    """Deletes all but the earliest report per (postId, user1ID)."""
+    duplicates = get_report_collection().aggregate([
+        {"$sort": {"_id": 1}},
+        {"$group": {"_id": {"postId": "$postId", "user1ID": "$user1ID"}, "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    extra = [report_id for group in duplicates for report_id in group["ids"][1:]]
+    for i in range(0, len(extra), 500):
+        get_report_collection().delete_many({"_id": {"$in": extra[i:i + 500]}})
+    logger.info(f"Removed {len(extra)} duplicate reports")
+    return len(extra)
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Report moderation maintenance.")
+    parser.add_argument("command", choices=["dedupe"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "dedupe":
+        print({"removed": dedupe()})
+        ensure_indexes()
+
+
+if __name__ == "__main__":
+    main()
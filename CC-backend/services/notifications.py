@@ -0,0 +1,48 @@
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+
+from database import get_db
+from services import jobs
+
+logger = logging.getLogger(__name__)
+
+NOTIFICATIONS_COLLECTION = "notifications"
+MAX_NOTIFICATIONS = 100
+
+
+def get_notifications_collection():
+    return get_db()[NOTIFICATIONS_COLLECTION]
+
+
+def ensure_indexes():
+    get_notifications_collection().create_index([("netId", ASCENDING), ("createdAt", DESCENDING)], name="netId_createdAt")
+
+
+def send(net_id: str, kind: str, message: str, data: Optional[dict] = None):
+    """Queues a notification; delivery (the inbox write) runs on the job runner."""
+    jobs.enqueue("notify_user", {"netId": net_id, "kind": kind, "message": message, "data": data or {}})
+
+
+@jobs.job("notify_user", concurrency=4)
+def deliver(payload: dict):
+    get_notifications_collection().insert_one({
+        "netId": payload["netId"],
+        "kind": payload["kind"],
+        "message": payload["message"],
+        "data": payload.get("data", {}),
+        "read": False,
+        "createdAt": datetime.now(),
+    })
+    logger.info(f"Delivered '{payload['kind']}' notification to {payload['netId']}")
+
+
+def recent(net_id: str, limit: int = 50) -> List[dict]:
+    notifications = []
+    for doc in get_notifications_collection().find({"netId": net_id}).sort("createdAt", DESCENDING).limit(limit):
+        doc["id"] = str(doc.pop("_id"))
+        doc["createdAt"] = doc["createdAt"].isoformat()
+        notifications.append(doc)
+    return notifications
@@ -0,0 +1,55 @@
+"""Profile page assembly.
+
+A profile needs the user document (which carries the materialized counts, see
+services/user_stats.py) and two histories from food_posts. Each history page is a
+find on its (postedBy / reservedBy, status, timestamp) index with the photo payload
+projected out, and the route runs both concurrently with the user lookup, so a
+profile costs about one round trip. Archived posts (services/archive.py) carry the
+same indexes: a page reads the newest offset + limit matches from each collection
+and merges them, since a post that stayed hot can be older than an archived one.
+"""
+import logging
+from datetime import datetime
+from typing import List, Optional
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.collection import Collection
+
+from database import get_food_collection
+from services import archive, feed_view
+
+logger = logging.getLogger(__name__)
+
+MAX_HISTORY_PAGE = 100
+HISTORY_PROJECTION = {"photo": 0} # Clients load images lazily from the thumbnail url
+
+
+def ensure_indexes():
+    food = get_food_collection()
+    food.create_index([("postedBy", ASCENDING), ("timestamp", DESCENDING)], name="postedBy_timestamp")
+    food.create_index([("reservedBy", ASCENDING), ("status", ASCENDING), ("timestamp", DESCENDING)], name="reservedBy_status_timestamp")
+    logger.info("Profile indexes ensured.")
+
+
+def history_query(kind: str, net_id: str) -> dict:
+    if kind == "post_history":
+        return {"postedBy": net_id}
+    return {"reservedBy": net_id, "status": "red"} # Received means the handoff was completed
+
+
+def serialize_history_entry(food: dict) -> dict:
+    food["id"] = str(food.pop("_id"))
+    food["thumbnail"] = feed_view.thumbnail_url(food["id"])
+    if isinstance(food.get("timestamp"), datetime):
+        food["timestamp"] = food["timestamp"].isoformat()
+    return food
+
+
+def fetch_history(kind: str, net_id: str, limit: int = 50, offset: int = 0, db: Optional[Collection] = None) -> List[dict]:
+    """One page of `kind` (post_history or received_history) for `net_id`, newest first."""
+    query = history_query(kind, net_id)
+    newest: List[dict] = []
+    for source in (db if db is not None else get_food_collection(), archive.get_post_archive_collection()):
+        newest.extend(source.find(query, HISTORY_PROJECTION).sort("timestamp", DESCENDING).limit(offset + limit))
+    newest.sort(key=lambda food: food.get("timestamp") or datetime.min, reverse=True)
+    return [serialize_history_entry(food) for food in newest[offset:offset + limit]]
@@ -0,0 +1,159 @@
+"""Per-user reputation, maintained incrementally.
+
+One small document per user in `user_reputation` (keyed by netId):
+
+    reportsReceived         reports filed against the user
+    reportsResolvedAgainst  of those, reports an admin upheld (resolved or action_taken)
+    handoffsGiven           posts of theirs that were picked up (for claims: once every claim was)
+    handoffsReceived        posts, or claimed portions, they picked up
+
+Report submission, report review and transaction completion events bump the
+counters through a write-behind buffer, so feed ranking and posting throttles can
+read a user's standing with one _id lookup instead of aggregating reports. A
+periodic job recomputes everything from reports and food_posts to correct drift:
+
+    python -m services.reputation reconcile
+"""
+import argparse
+import logging
+import os
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from database import get_db, get_food_collection, get_report_collection
+from services import archive, counters, events, jobs
+
+logger = logging.getLogger(__name__)
+
+REPUTATION_COLLECTION = "user_reputation"
+REPUTATION_RECONCILE_INTERVAL = float(os.getenv("REPUTATION_RECONCILE_INTERVAL", str(6 * 60 * 60)))
+UPHELD_STATUSES = ("resolved", "action_taken") # Review outcomes that count against the reported user
+FIELDS = ("reportsReceived", "reportsResolvedAgainst", "handoffsGiven", "handoffsReceived")
+
+
+def get_reputation_collection():
+    return get_db()[REPUTATION_COLLECTION]
+
+
+_counts = counters.buffer("user_reputation", get_reputation_collection, upsert=True)
+
+
+def _shape(net_id: str, doc: Optional[dict]) -> dict:
+    doc = doc or {}
+    return dict({"netId": net_id}, **{field: doc.get(field, 0) for field in FIELDS})
+
+
+def get(net_id: str) -> dict:
+    """One user's reputation (all zeros if nothing was ever recorded)."""
+    return _shape(net_id, get_reputation_collection().find_one({"_id": net_id}))
+
+
+def get_many(net_ids: List[str]) -> Dict[str, dict]:
+    """Reputation for many users in one query, e.g. every poster on a feed page."""
+    docs = {doc["_id"]: doc for doc in get_reputation_collection().find({"_id": {"$in": list(net_ids)}})}
+    return {net_id: _shape(net_id, docs.get(net_id)) for net_id in net_ids}
+
+
+# --- Lifecycle ---
+
+@events.on(events.ReportSubmitted)
+def _on_report_submitted(event: events.ReportSubmitted):
+    _counts.increment(event.user2ID, "reportsReceived")
+
+@events.on(events.ReportsReviewed)
+def _on_reports_reviewed(event: events.ReportsReviewed):
+    upheld = event.reviewStatus in UPHELD_STATUSES
+    for net_id, previous in event.changed.items():
+        delta = sum(
+            (count if upheld else -count)
+            for status, count in previous.items()
+            if (status in UPHELD_STATUSES) != upheld # Only moves across the upheld line count
+        )
+        if delta:
+            _counts.increment(net_id, "reportsResolvedAgainst", delta)
+
+@events.on(events.FoodCompleted)
+def _on_food_completed(event: events.FoodCompleted):
+    if not event.viaClaims: # Claimers were counted by their own ClaimCompleted
+        _counts.increment(event.completedBy, "handoffsReceived")
+    if event.postedBy:
+        _counts.increment(event.postedBy, "handoffsGiven")
+
+@events.on(events.ClaimCompleted)
+def _on_claim_completed(event: events.ClaimCompleted):
+    _counts.increment(event.user, "handoffsReceived")
+
+
+# --- Reconciliation ---
+
+def compute() -> Dict[str, dict]:
+    """Every user's true counters, from one aggregation per source (each including its archive)."""
+    actual: Dict[str, dict] = {}
+
+    def add(net_id, field, value):
+        if net_id and net_id != "None": # "None" is the legacy placeholder for no reserver
+            actual.setdefault(net_id, dict.fromkeys(FIELDS, 0))[field] += value
+
+    for group in get_report_collection().aggregate([
+        {"$unionWith": archive.REPORT_ARCHIVE_COLLECTION},
+        {"$group": {
+            "_id": "$user2ID",
+            "received": {"$sum": 1},
+            "upheld": {"$sum": {"$cond": [{"$in": ["$reviewStatus", list(UPHELD_STATUSES)]}, 1, 0]}},
+        }},
+    ], allowDiskUse=True):
+        add(group["_id"], "reportsReceived", group["received"])
+        add(group["_id"], "reportsResolvedAgainst", group["upheld"])
+    # Picked-up claims count as soon as they are, before the post itself completes
+    handed_off = {"$match": {"$or": [{"status": "red"}, {"claims.status": "completed"}]}}
+    for group in get_food_collection().aggregate([
+        handed_off,
+        {"$unionWith": {"coll": archive.POST_ARCHIVE_COLLECTION, "pipeline": [handed_off]}},
+        {"$facet": {
+            "handoffsGiven": [{"$match": {"status": "red"}}, {"$group": {"_id": "$postedBy", "n": {"$sum": 1}}}],
+            "handoffsReceived": [{"$match": {"status": "red"}}, {"$group": {"_id": "$reservedBy", "n": {"$sum": 1}}}],
+            "claimsReceived": [
+                {"$unwind": "$claims"},
+                {"$match": {"claims.status": "completed"}},
+                {"$group": {"_id": "$claims.user", "n": {"$sum": 1}}},
+            ],
+        }},
+    ], allowDiskUse=True):
+        for facet, field in (("handoffsGiven", "handoffsGiven"), ("handoffsReceived", "handoffsReceived"), ("claimsReceived", "handoffsReceived")):
+            for entry in group[facet]:
+                add(entry["_id"], field, entry["n"])
+    return actual
+
+
+@jobs.job("reconcile_reputation")
+def reconcile(payload: Optional[dict] = None) -> dict:
+    """Rewrites reputation documents that drifted from reports and food_posts."""
+    _counts.flush() # Buffered increments would otherwise land on top of the recomputed values
+    actual = compute()
+    operations = []
+    for doc in get_reputation_collection().find({}):
+        expected = actual.pop(doc["_id"], dict.fromkeys(FIELDS, 0))
+        if any(doc.get(field, 0) != expected[field] for field in FIELDS):
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": expected}))
+    operations.extend(UpdateOne({"_id": net_id}, {"$set": expected}, upsert=True) for net_id, expected in actual.items())
+    for i in range(0, len(operations), 500):
+        get_reputation_collection().bulk_write(operations[i:i + 500], ordered=False)
+    logger.info(f"Reputation reconciled: {len(operations)} documents corrected")
+    return {"corrected": len(operations)}
+
+
+jobs.every(REPUTATION_RECONCILE_INTERVAL, "reconcile_reputation")
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain per-user reputation documents.")
+    parser.add_argument("command", choices=["reconcile"])
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "reconcile":
+        print(reconcile())
+
+
+if __name__ == "__main__":
+    main()
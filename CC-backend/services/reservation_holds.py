@@ -0,0 +1,223 @@
+"""Reservation hold deadlines.
+
+`reserve_food` stamps every reservation with `holdUntil`. Each worker keeps the holds
+it knows about in a min-heap keyed by deadline and sleeps until the earliest one is
+due, so outstanding holds cost nothing until they expire. An expired hold is released
+back to green with one conditional update (it only matches while the post is still
+yellow and past its deadline, so a completion racing the expiry always wins), and the
+poster is notified.
+
+Holds taken by a worker that has since died are picked up by a periodic sweep that
+reads only the expired range of the (status, holdUntil) index.
+"""
+import asyncio
+import heapq
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from database import get_food_collection
+from services import events, jobs, notifications
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_HOLD_SECONDS = float(os.getenv("RESERVATION_HOLD_SECONDS", str(30 * 60)))
+RESERVATION_HOLD_SWEEP_INTERVAL = float(os.getenv("RESERVATION_HOLD_SWEEP_INTERVAL", "300"))
+SWEEP_BATCH_SIZE = 500
+
+_heap: List[Tuple[datetime, str]] = []
+_deadlines: Dict[str, datetime] = {} # Current deadline per food id; heap entries that disagree are stale
+_lock = threading.Lock()
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_wake: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+_released = 0
+
+
+def hold_deadline(now: Optional[datetime] = None) -> datetime:
+    return (now or datetime.now()) + timedelta(seconds=RESERVATION_HOLD_SECONDS)
+
+
+def ensure_indexes():
+    # Partial: only reservations that can still expire are indexed
+    get_food_collection().create_index(
+        [("status", ASCENDING), ("holdUntil", ASCENDING)], name="status_holdUntil",
+        partialFilterExpression={"holdUntil": {"$exists": True}},
+    )
+
+
+# --- In-memory schedule ---
+
+def _notify_loop():
+    if _loop is not None and _wake is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_wake.set)
+
+
+def schedule(food_id: str, deadline: datetime):
+    with _lock:
+        earliest = _heap[0][0] if _heap else None
+        _deadlines[food_id] = deadline
+        heapq.heappush(_heap, (deadline, food_id))
+    if earliest is None or deadline < earliest:
+        _notify_loop() # The sleeper is waiting for a later deadline
+
+
+def cancel(food_id: str):
+    """Forgets a hold (completed). Its heap entry is discarded lazily when it surfaces."""
+    with _lock:
+        _deadlines.pop(food_id, None)
+
+
+def pending() -> int:
+    with _lock:
+        return len(_deadlines)
+
+
+def _pop_due(now: datetime) -> List[str]:
+    due = []
+    with _lock:
+        while _heap and _heap[0][0] <= now:
+            deadline, food_id = heapq.heappop(_heap)
+            if _deadlines.get(food_id) == deadline:
+                del _deadlines[food_id]
+                due.append(food_id)
+    return due
+
+
+def _next_deadline() -> Optional[datetime]:
+    with _lock:
+        while _heap and _deadlines.get(_heap[0][1]) != _heap[0][0]:
+            heapq.heappop(_heap) # Drop stale entries
+        return _heap[0][0] if _heap else None
+
+
+# --- Release ---
+
+def release(food_id: str, now: Optional[datetime] = None) -> bool:
+    """Returns an expired hold to green. A no-op if the post was completed, re-reserved or already released."""
+    global _released
+    now = now or datetime.now()
+    try:
+        previous = get_food_collection().find_one_and_update(
+            {"_id": ObjectId(food_id), "status": "yellow", "holdUntil": {"$lte": now}},
+            {"$set": {"status": "green", "reservedBy": "None"}, "$unset": {"holdUntil": ""}}, # "None" is the unreserved placeholder
+            projection={"reservedBy": 1, "postedBy": 1, "foodName": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+    except Exception as e:
+        logger.error(f"Failed to release reservation hold on food {food_id}: {e}", exc_info=True)
+        return False
+    if previous is None:
+        return False
+    with _lock:
+        _released += 1
+    logger.info(f"Reservation hold on food {food_id} by {previous.get('reservedBy')} expired; item is available again")
+    events.emit(events.ReservationExpired(foodId=food_id, reservedBy=previous.get("reservedBy") or "", postedBy=previous.get("postedBy")))
+    if previous.get("postedBy"):
+        notifications.send(
+            previous["postedBy"], "reservation_expired",
+            f"The reservation on {previous.get('foodName', 'your food')} expired and it is available again.",
+            {"foodId": food_id, "reservedBy": previous.get("reservedBy")},
+        )
+    return True
+
+
+@jobs.job("release_expired_holds")
+def release_expired(payload: Optional[dict] = None) -> int:
+    """Releases every hold already past its deadline, reading only the expired index range."""
+    now = datetime.now()
+    released = 0
+    expired = get_food_collection().find(
+        {"status": "yellow", "holdUntil": {"$lte": now}}, {"_id": 1}
+    ).limit(SWEEP_BATCH_SIZE)
+    for food in expired:
+        released += release(str(food["_id"]), now)
+    if released:
+        logger.info(f"Hold sweep released {released} expired reservations")
+    return released
+
+
+jobs.every(RESERVATION_HOLD_SWEEP_INTERVAL, "release_expired_holds")
+
+
+def load_outstanding() -> int:
+    """Schedules every hold already in the database (startup)."""
+    loaded = 0
+    for food in get_food_collection().find({"status": "yellow", "holdUntil": {"$exists": True}}, {"holdUntil": 1}):
+        schedule(str(food["_id"]), food["holdUntil"])
+        loaded += 1
+    return loaded
+
+
+@events.on(events.FoodReserved)
+def _on_food_reserved(event: events.FoodReserved):
+    if event.holdUntil is not None:
+        schedule(event.foodId, event.holdUntil)
+
+@events.on(events.FoodCompleted)
+def _on_food_completed(event: events.FoodCompleted):
+    cancel(event.foodId)
+
+
+# --- Timer ---
+
+async def _timer_loop():
+    while True:
+        deadline = _next_deadline()
+        timeout = None if deadline is None else max(0.0, (deadline - datetime.now()).total_seconds())
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+        for food_id in _pop_due(datetime.now()):
+            try:
+                await asyncio.to_thread(release, food_id)
+            except Exception as e:
+                logger.error(f"Reservation hold release failed for food {food_id}: {e}", exc_info=True)
+
+
+def is_running() -> bool:
+    return _task is not None and not _task.done()
+
+
+def start():
+    global _loop, _wake, _task
+    if is_running():
+        return
+    _loop = asyncio.get_running_loop()
+    _wake = asyncio.Event()
+    try:
+        loaded = load_outstanding()
+    except Exception as e:
+        loaded = 0 # The periodic sweep still covers these
+        logger.error(f"Failed to load outstanding reservation holds: {e}", exc_info=True)
+    _task = _loop.create_task(_timer_loop())
+    logger.info(f"Reservation hold timer started ({loaded} outstanding holds, hold={RESERVATION_HOLD_SECONDS}s)")
+
+
+async def stop():
+    global _loop, _wake, _task
+    if _task is None or _loop is not asyncio.get_running_loop():
+        return # Not started by this event loop
+    _task.cancel()
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _loop, _wake, _task = None, None, None
+
+
+def stats() -> dict:
+    deadline = _next_deadline()
+    return {
+        "pending": pending(),
+        "released": _released,
+        "next_expiry_s": round((deadline - datetime.now()).total_seconds(), 3) if deadline else None,
+        "hold_seconds": RESERVATION_HOLD_SECONDS,
+    }
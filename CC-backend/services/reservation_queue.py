@@ -0,0 +1,265 @@
+"""Fair admission queue for reservations on contended posts (contention mode).
+
+When a post is popular, most reservation attempts lose. Without a queue each loser
+costs a find_one, a failing update_one and another find_one. In contention mode every
+post gets an in-memory queue in this worker:
+
+* attempts on one post are serialized (asyncio.Lock is FIFO, so first come, first served),
+  and the winner costs a single conditional update;
+* once the post is known to be held, later reservers join a waitlist without touching
+  the database and are told their position;
+* when the hold is released (expiry, or a change seen on the invalidation bus from
+  another worker) the head of the waitlist is promoted with the same conditional
+  update and notified.
+
+The queue is per worker; the conditional update in the database remains the only
+arbiter of who holds a post, so several workers never double-book.
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, Optional
+
+from bson import ObjectId
+
+from database import get_food_collection
+from services import events, invalidation_bus, notifications, reservation_holds
+
+logger = logging.getLogger(__name__)
+
+RESERVATION_QUEUE_ENABLED = os.getenv("RESERVATION_QUEUE_ENABLED", "").lower() in ("1", "true", "yes")
+
+RESERVED, WAITLISTED, UNAVAILABLE, NOT_FOUND = "reserved", "waitlisted", "unavailable", "not_found"
+
+
+class PostQueue:
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.waitlist: Deque[str] = deque()
+        self.held_until: Optional[datetime] = None # Known hold deadline; None means unknown or free
+        self.holder: Optional[str] = None
+        self.closed = False # Completed or deleted: nothing left to queue for
+
+    def is_held(self, now: datetime) -> bool:
+        return self.held_until is not None and self.held_until > now
+
+    def position(self, user: str) -> Optional[int]:
+        try:
+            return self.waitlist.index(user) + 1
+        except ValueError:
+            return None
+
+
+_queues: Dict[str, PostQueue] = {}
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_stats = {"attempts": 0, "db_attempts": 0, "waitlisted": 0, "promoted": 0}
+_local = threading.local() # Marks invalidations caused by this module's own reservations
+
+
+def _queue(food_id: str) -> PostQueue:
+    queue = _queues.get(food_id)
+    if queue is None:
+        queue = _queues[food_id] = PostQueue()
+    return queue
+
+
+def _try_reserve(food_id: str, user: str) -> Optional[datetime]:
+    """The one conditional update that decides a reservation. Returns the hold deadline on success."""
+    hold_until = reservation_holds.hold_deadline()
+    result = get_food_collection().update_one(
+        {"_id": ObjectId(food_id), "status": "green", "claims": {"$exists": False}, "hidden": {"$ne": True}}, # Whole-post reservations only
+        {"$set": {"status": "yellow", "reservedBy": user, "holdUntil": hold_until}},
+    )
+    if result.modified_count == 0:
+        return None
+    _local.own_change = food_id
+    try:
+        events.emit(events.FoodReserved(foodId=food_id, reservedBy=user, holdUntil=hold_until))
+    finally:
+        _local.own_change = None
+    return hold_until
+
+
+def _learn_state(queue: PostQueue, food_id: str) -> str:
+    """After a lost attempt: find out whether the post is held (waitlist) or gone."""
+    food = get_food_collection().find_one({"_id": ObjectId(food_id)}, {"status": 1, "reservedBy": 1, "holdUntil": 1, "claims": 1, "hidden": 1})
+    if food is None:
+        queue.closed = True
+        return NOT_FOUND
+    if food.get("hidden"):
+        queue.closed = True # Hidden by moderation
+        return UNAVAILABLE
+    if food.get("claims"):
+        queue.closed = True # Shared in portions: claims, not whole-post reservations
+        return UNAVAILABLE
+    if food.get("status") == "yellow":
+        queue.holder = food.get("reservedBy")
+        queue.held_until = food.get("holdUntil") or datetime.max
+        return WAITLISTED
+    if food.get("status") == "red":
+        queue.closed = True
+        return UNAVAILABLE
+    queue.held_until = None
+    return RESERVED # Green again: worth another attempt
+
+
+def _join(queue: PostQueue, user: str) -> dict:
+    if user not in queue.waitlist:
+        queue.waitlist.append(user)
+        _stats["waitlisted"] += 1
+    return {"status": WAITLISTED, "position": queue.position(user), "length": len(queue.waitlist)}
+
+
+async def reserve(food_id: str, user: str) -> dict:
+    """Reserves `food_id` for `user` or puts them in line. Returns a dict whose `status` is
+    one of RESERVED, WAITLISTED, UNAVAILABLE or NOT_FOUND."""
+    _stats["attempts"] += 1
+    queue = _queue(food_id)
+    if queue.closed:
+        return {"status": UNAVAILABLE}
+    if queue.holder == user and queue.is_held(datetime.now()):
+        return {"status": UNAVAILABLE, "reason": "already_holder"}
+    if user in queue.waitlist or queue.is_held(datetime.now()):
+        return _join(queue, user) # Known loser: no database round trip
+    if queue.waitlist:
+        # The hold lapsed without us hearing about it: the line goes first
+        asyncio.get_running_loop().create_task(promote(food_id))
+        return _join(queue, user)
+
+    async with queue.lock:
+        # State may have changed while this attempt waited its turn
+        if queue.closed:
+            return {"status": UNAVAILABLE}
+        if queue.is_held(datetime.now()) or queue.waitlist:
+            return _join(queue, user)
+        for _ in range(2):
+            _stats["db_attempts"] += 1
+            hold_until = await asyncio.to_thread(_try_reserve, food_id, user)
+            if hold_until is not None:
+                queue.holder, queue.held_until = user, hold_until
+                return {"status": RESERVED, "holdUntil": hold_until}
+            state = await asyncio.to_thread(_learn_state, queue, food_id)
+            if state == WAITLISTED:
+                return _join(queue, user)
+            if state != RESERVED:
+                return {"status": state}
+        return _join(queue, user) # Flapping between green and yellow: take a place in line
+
+
+def leave(food_id: str, user: str) -> bool:
+    queue = _queues.get(food_id)
+    if queue is None or user not in queue.waitlist:
+        return False
+    queue.waitlist.remove(user)
+    return True
+
+
+def position(food_id: str, user: str) -> dict:
+    queue = _queues.get(food_id)
+    if queue is None:
+        return {"position": None, "length": 0}
+    return {"position": queue.position(user), "length": len(queue.waitlist)}
+
+
+async def promote(food_id: str):
+    """Offers a possibly freed post to the waitlist in order until someone gets it or it is
+    found taken. Always asks the database: it runs because the cached state became suspect."""
+    queue = _queues.get(food_id)
+    if queue is None:
+        return
+    async with queue.lock:
+        while queue.waitlist and not queue.closed:
+            user = queue.waitlist[0]
+            _stats["db_attempts"] += 1
+            hold_until = await asyncio.to_thread(_try_reserve, food_id, user)
+            if hold_until is not None:
+                queue.waitlist.popleft()
+                queue.holder, queue.held_until = user, hold_until
+                _stats["promoted"] += 1
+                logger.info(f"Promoted {user} from the waitlist of food {food_id} ({len(queue.waitlist)} still waiting)")
+                notifications.send(user, "reservation_promoted", "You're up! The food you were waiting for is now reserved for you.",
+                                   {"foodId": food_id, "holdUntil": hold_until.isoformat()})
+                return
+            state = await asyncio.to_thread(_learn_state, queue, food_id)
+            if state == WAITLISTED:
+                return # Someone else holds it (e.g. via another worker); stay in line
+            if state in (UNAVAILABLE, NOT_FOUND):
+                break
+        if queue.closed:
+            _close(food_id)
+
+
+def _close(food_id: str):
+    queue = _queues.pop(food_id, None)
+    if queue is None:
+        return
+    for user in queue.waitlist:
+        notifications.send(user, "waitlist_closed", "The food you were waiting for is no longer available.", {"foodId": food_id})
+
+
+# --- Lifecycle hooks ---
+
+@events.on(events.FoodCompleted)
+def _on_food_completed(event: events.FoodCompleted):
+    queue = _queues.get(event.foodId)
+    if queue is not None:
+        queue.closed = True
+        _close(event.foodId)
+
+
+def _invalidate(key: str, own_change: Optional[str]):
+    """Runs on the event loop, which owns the queues."""
+    targets = list(_queues) if key == invalidation_bus.WILDCARD else [key.split(":", 1)[1]] if ":" in key else []
+    for food_id in targets:
+        queue = _queues.get(food_id)
+        if queue is None or own_change == food_id:
+            continue
+        queue.held_until = None
+        if queue.waitlist:
+            if _loop is not None:
+                _loop.create_task(promote(food_id))
+        else:
+            _queues.pop(food_id, None) # Nothing to remember; rebuilt on the next attempt
+
+
+def _on_food_invalidated(key: str):
+    """Any change to a post, from this worker or another, makes the cached hold suspect;
+    a waitlist means someone may be owed the post now. Called from the bus tailer and
+    worker threads too, so the whole update is handed to the loop."""
+    own_change = getattr(_local, "own_change", None) # Thread-local: read it here, not on the loop
+    if _loop is not None and not _loop.is_closed():
+        _loop.call_soon_threadsafe(_invalidate, key, own_change)
+    else:
+        _invalidate(key, own_change)
+
+
+invalidation_bus.subscribe("food", _on_food_invalidated)
+
+
+def start():
+    global _loop
+    if _loop is not None and not _loop.is_closed():
+        return
+    _loop = asyncio.get_running_loop()
+    if RESERVATION_QUEUE_ENABLED:
+        logger.info("Reservation contention mode enabled: per-post admission queues are active")
+
+
+def stop():
+    global _loop
+    if _loop is not asyncio.get_running_loop():
+        return # Not started by this event loop
+    _loop = None
+    _queues.clear()
+
+
+def stats() -> dict:
+    return {
+        "enabled": RESERVATION_QUEUE_ENABLED,
+        "posts": len(_queues),
+        "waiting": sum(len(queue.waitlist) for queue in _queues.values()),
+        **_stats,
+    }
@@ -0,0 +1,117 @@
+import fcntl
+import logging
+import mmap
+import os
+import struct
+import time
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Segment layout: header, then identity JSON bytes, then gzip bytes
+MAGIC = b"CCFEED01"
+HEADER = struct.Struct("<8sQQQQd") # magic, version, identity_len, gzip_len, count, built_at
+
+
+class SharedFeedSnapshot:
+    """Feed snapshot backed by a read-only memory map; the byte fields are zero-copy memoryviews."""
+
+    def __init__(self, mapping: mmap.mmap):
+        magic, version, identity_len, gzip_len, count, built_at = HEADER.unpack_from(mapping, 0)
+        if magic != MAGIC:
+            raise ValueError("Shared feed segment has an unexpected header")
+        view = memoryview(mapping)
+        start = HEADER.size
+        self.version = version
+        self.identity = view[start:start + identity_len]
+        self.gzipped = view[start + identity_len:start + identity_len + gzip_len]
+        self.count = count
+        self.built_at = built_at
+
+
+class SharedSnapshotSegment:
+    """A feed snapshot published in a memory-mapped file shared by all uvicorn workers.
+
+    Exactly one worker (the holder of an exclusive flock on '<path>.lock') builds and
+    publishes; publishing writes a new file and renames it over the segment, so readers
+    holding the previous mapping are never torn. Other workers only mmap and read.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.dirty_path = f"{path}.dirty"
+        self._lock_fd: Optional[int] = None
+        self._file_id = None
+        self._current: Optional[SharedFeedSnapshot] = None
+        self._dirty_seen = 0
+
+    # --- Builder election ---
+    @property
+    def is_builder(self) -> bool:
+        return self._lock_fd is not None
+
+    def try_become_builder(self) -> bool:
+        """Non-blocking; the lock is released by the OS if the builder process dies."""
+        if self._lock_fd is not None:
+            return True
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        logger.info(f"Worker {os.getpid()} elected feed snapshot builder for {self.path}")
+        return True
+
+    def release(self):
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    # --- Publishing (builder only) ---
+    def publish(self, identity: bytes, gzipped: bytes, count: int) -> int:
+        """Writes a new segment version and returns its version number."""
+        current = self.read()
+        version = current.version + 1 if current else 1
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, version, len(identity), len(gzipped), count, time.time()))
+            f.write(identity)
+            f.write(gzipped)
+        os.replace(tmp_path, self.path) # Atomic swap for readers
+        return version
+
+    # --- Reading (all workers) ---
+    def read(self) -> Optional[SharedFeedSnapshot]:
+        """Returns the latest published snapshot, remapping only when the segment file changed."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if file_id != self._file_id:
+            with open(self.path, "rb") as f:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            # The previous mapping is released once the last response using it is sent
+            self._current = SharedFeedSnapshot(mapping)
+            self._file_id = file_id
+        return self._current
+
+    # --- Cross-worker rebuild requests ---
+    def request_rebuild(self):
+        """Any worker can ask the builder for a rebuild by bumping the dirty marker."""
+        with open(self.dirty_path, "a"):
+            os.utime(self.dirty_path)
+
+    def rebuild_requested(self) -> bool:
+        try:
+            mtime = os.stat(self.dirty_path).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime > self._dirty_seen:
+            self._dirty_seen = mtime
+            return True
+        return False
@@ -0,0 +1,180 @@
+"""Materialized per-user counters on the user document.
+
+    postCount         posts the user has made
+    reservationCount  posts (or claimed portions) the user currently holds, not yet picked up
+    receivedCount     posts (or claimed portions) the user has picked up
+
+Lifecycle events keep them current through a write-behind counter buffer, so the
+profile reads them from the user document instead of counting food_posts. A
+periodic job recomputes them from food_posts in batches and corrects any drift
+(e.g. posts edited by hand, or increments lost with a crashed worker). Other
+workers may still hold increments for changes the recount already sees, so a
+user is only corrected when the same drift shows on a second look after their
+buffers have flushed, and only if the counters weren't touched in between:
+
+    python -m services.user_stats reconcile
+"""
+import argparse
+import logging
+import os
+import time
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from database import get_food_collection, get_users_collection
+from services import archive, counters, events, invalidation_bus, jobs
+
+logger = logging.getLogger(__name__)
+
+USER_STATS_RECONCILE_INTERVAL = float(os.getenv("USER_STATS_RECONCILE_INTERVAL", str(6 * 60 * 60)))
+RECONCILE_BATCH_SIZE = 500
+RECONCILE_SETTLE_SECONDS = 2 * counters.COUNTER_FLUSH_INTERVAL_MS / 1000 # Long enough for every worker to flush
+STAT_FIELDS = ("postCount", "reservationCount", "receivedCount")
+FACET_FIELDS = dict(zip(STAT_FIELDS, STAT_FIELDS), heldClaims="reservationCount", completedClaims="receivedCount") # compute() facet -> counter
+
+_counts = counters.buffer(
+    "users.stats", get_users_collection, key_field="netId",
+    on_flush=lambda net_ids: invalidation_bus.publish(*(f"user:{net_id}" for net_id in net_ids)),
+)
+
+
+# --- Lifecycle ---
+
+@events.on(events.FoodPosted)
+def _on_food_posted(event: events.FoodPosted):
+    if event.food.get("postedBy"):
+        _counts.increment(event.food["postedBy"], "postCount")
+
+@events.on(events.FoodBatchPosted)
+def _on_food_batch_posted(event: events.FoodBatchPosted):
+    for food in event.foods:
+        if food.get("postedBy"):
+            _counts.increment(food["postedBy"], "postCount")
+
+@events.on(events.FoodReserved)
+def _on_food_reserved(event: events.FoodReserved):
+    _counts.increment(event.reservedBy, "reservationCount")
+
+@events.on(events.FoodCompleted)
+def _on_food_completed(event: events.FoodCompleted):
+    if event.viaClaims:
+        return # Every claimer was counted by their own ClaimCompleted
+    _counts.increment(event.completedBy, "reservationCount", -1)
+    _counts.increment(event.completedBy, "receivedCount")
+
+@events.on(events.FoodClaimed)
+def _on_food_claimed(event: events.FoodClaimed):
+    _counts.increment(event.user, "reservationCount")
+
+@events.on(events.ClaimCompleted)
+def _on_claim_completed(event: events.ClaimCompleted):
+    _counts.increment(event.user, "reservationCount", -1)
+    _counts.increment(event.user, "receivedCount")
+
+@events.on(events.ReservationExpired)
+def _on_reservation_expired(event: events.ReservationExpired):
+    if event.reservedBy:
+        _counts.increment(event.reservedBy, "reservationCount", -1)
+
+
+# --- Reconciliation ---
+
+def _claims_facet(net_ids: List[str], status: str) -> list:
+    return [
+        {"$match": {"claims": {"$elemMatch": {"user": {"$in": net_ids}, "status": status}}}},
+        {"$unwind": "$claims"},
+        {"$match": {"claims.user": {"$in": net_ids}, "claims.status": status}},
+        {"$group": {"_id": "$claims.user", "n": {"$sum": 1}}},
+    ]
+
+
+def compute(net_ids: List[str]) -> Dict[str, dict]:
+    """True counts for `net_ids` from food_posts and its archive, in one aggregation."""
+    theirs = {"$match": {"$or": [{"postedBy": {"$in": net_ids}}, {"reservedBy": {"$in": net_ids}}, {"claims.user": {"$in": net_ids}}]}}
+    facets = get_food_collection().aggregate([
+        theirs,
+        {"$unionWith": {"coll": archive.POST_ARCHIVE_COLLECTION, "pipeline": [theirs]}},
+        {"$facet": {
+            "postCount": [{"$match": {"postedBy": {"$in": net_ids}}}, {"$group": {"_id": "$postedBy", "n": {"$sum": 1}}}],
+            "reservationCount": [{"$match": {"reservedBy": {"$in": net_ids}, "status": "yellow"}}, {"$group": {"_id": "$reservedBy", "n": {"$sum": 1}}}],
+            "receivedCount": [{"$match": {"reservedBy": {"$in": net_ids}, "status": "red"}}, {"$group": {"_id": "$reservedBy", "n": {"$sum": 1}}}],
+            "heldClaims": _claims_facet(net_ids, "held"),
+            "completedClaims": _claims_facet(net_ids, "completed"),
+        }},
+    ])
+    stats = {net_id: dict.fromkeys(STAT_FIELDS, 0) for net_id in net_ids}
+    for facet in facets:
+        for facet_name, field in FACET_FIELDS.items():
+            for group in facet[facet_name]:
+                if group["_id"] in stats:
+                    stats[group["_id"]][field] += group["n"]
+    return stats
+
+
+def _drift(users: List[dict]) -> Dict[str, dict]:
+    """Per drifted user: the stored counters and how far each is from the recount."""
+    actual = compute([user["netId"] for user in users])
+    drift = {}
+    for user in users:
+        stored = {field: user.get(field) for field in STAT_FIELDS}
+        off = {field: (stored[field] or 0) - actual[user["netId"]][field] for field in STAT_FIELDS}
+        if any(stored[field] != actual[user["netId"]][field] for field in STAT_FIELDS):
+            drift[user["netId"]] = {"_id": user["_id"], "stored": stored, "off": off, "actual": actual[user["netId"]]}
+    return drift
+
+
+def _reconcile_batch(users: List[dict]) -> int:
+    first = _drift(users)
+    if not first:
+        return 0
+    time.sleep(RECONCILE_SETTLE_SECONDS) # Increments buffered elsewhere for changes the recount saw land meanwhile
+    projection = dict({"netId": 1}, **dict.fromkeys(STAT_FIELDS, 1))
+    second = _drift(list(get_users_collection().find({"netId": {"$in": list(first)}}, projection)))
+    operations = [
+        # Compare-and-set: a flush between our read and this write means we look again next run
+        UpdateOne(dict({"_id": drift["_id"]}, **drift["stored"]), {"$set": drift["actual"]})
+        for net_id, drift in second.items()
+        if net_id in first and drift["off"] == first[net_id]["off"]
+    ]
+    if operations:
+        get_users_collection().bulk_write(operations, ordered=False)
+        invalidation_bus.publish(*(f"user:{net_id}" for net_id in second))
+    return len(operations)
+
+
+@jobs.job("reconcile_user_stats")
+def reconcile(payload: Optional[dict] = None, batch_size: int = RECONCILE_BATCH_SIZE) -> dict:
+    """Recomputes every user's counters and writes the ones that drifted."""
+    _counts.flush() # This worker's buffered increments, at least, are in before the recount
+    checked = corrected = 0
+    batch: List[dict] = []
+    projection = dict({"netId": 1}, **dict.fromkeys(STAT_FIELDS, 1))
+    for user in get_users_collection().find({"netId": {"$exists": True}}, projection, batch_size=batch_size):
+        batch.append(user)
+        if len(batch) >= batch_size:
+            corrected += _reconcile_batch(batch)
+            checked += len(batch)
+            batch = []
+    if batch:
+        corrected += _reconcile_batch(batch)
+        checked += len(batch)
+    logger.info(f"User stats reconciled: {corrected} of {checked} users corrected")
+    return {"checked": checked, "corrected": corrected}
+
+
+jobs.every(USER_STATS_RECONCILE_INTERVAL, "reconcile_user_stats")
+
+
+def main(argv: Optional[Iterable[str]] = None):
+    parser = argparse.ArgumentParser(description="Maintain materialized per-user stats.")
+    parser.add_argument("command", choices=["reconcile"])
+    parser.add_argument("--batch-size", type=int, default=RECONCILE_BATCH_SIZE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.command == "reconcile":
+        print(reconcile(batch_size=args.batch_size))
+
+
+if __name__ == "__main__":
+    main()
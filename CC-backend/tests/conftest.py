@@ -30,6 +30,7 @@ try:
         get_food_collection,
         get_report_collection,
         get_users_collection,
+        get_feed_view_collection,
         connect_db, # Import connect_db for potential direct use/testing
         client as db_client # Rename imported client to avoid conflict
     )
@@ -46,6 +47,21 @@ def client():
     with TestClient(app) as test_client:
         yield test_client
 
+@pytest.fixture
+def drain_events(client):
+    """Returns a function that waits for the background event subscribers (activity log, analytics,
+    cache invalidation) queued by earlier requests, on the app's event loop."""
+    from services import events
+    return lambda: client.portal.call(events.drain)
+
+@pytest.fixture
+def fresh_feed_snapshot():
+    """Drops the cached feed snapshot so GET /api/food rebuilds it from the (possibly patched) collection."""
+    from services import feed_snapshot
+    feed_snapshot.invalidate()
+    yield
+    feed_snapshot.invalidate()
+
 # --- Helper Variables ---
 # Unique identifiers for test runs
 RUN_ID = int(time.time())
@@ -81,6 +97,9 @@ def cleanup_test_data():
         # Delete food posts by users from this run
         food_del_result = food_collection.delete_many({"postedBy": {"$regex": f"_{RUN_ID}$"}})
         print(f"Food posts deleted: {food_del_result.deleted_count}")
+        # Delete their read-model entries
+        feed_view_del_result = get_feed_view_collection().delete_many({"postedBy": {"$regex": f"_{RUN_ID}$"}})
+        print(f"Feed view entries deleted: {feed_view_del_result.deleted_count}")
         # Delete reports involving users from this run
         report_del_result = report_collection.delete_many({"user1ID": {"$regex": f"_{RUN_ID}$"}})
         print(f"Reports deleted: {report_del_result.deleted_count}")
@@ -0,0 +1,70 @@
+import pytest
+from datetime import datetime, timedelta
+
+from services import activity_log
+
+
+def test_lifecycle_transitions_are_logged(client, drain_events, completed_food_post):
+    """Tests that posting, reserving and completing each append a transition, newest first."""
+    drain_events()
+    response = client.get("/api/food/activity", params={"foodId": completed_food_post["id"]})
+    assert response.status_code == 200
+    entries = response.json()["activity"]
+    assert [(e["action"], e["from"], e["to"]) for e in entries] == [
+        ("completed", "yellow", "red"),
+        ("reserved", "green", "yellow"),
+        ("posted", None, "green"),
+    ]
+    assert entries[0]["actor"] == completed_food_post["reserverNetId"]
+    assert entries[2]["actor"] == completed_food_post["posterNetId"]
+
+
+def test_claim_transitions_are_logged(client, drain_events, available_food_post):
+    """Tests that claims are logged without a guessed `from` status, and that entries carry the event time."""
+    food_id = available_food_post["id"]
+    claim = client.post("/api/food/claim", json={"food_id": food_id, "user": "activity_claimer", "units": 1}).json()
+    client.post("/api/food/claim/complete", json={"food_id": food_id, "claim_id": claim["claim_id"], "user": "activity_claimer"})
+    drain_events()
+    entries = client.get("/api/food/activity", params={"foodId": food_id}).json()["activity"]
+    assert [(e["action"], e["from"], e["to"]) for e in entries] == [
+        ("completed", "yellow", "red"),
+        ("claim_completed", None, None),
+        ("claimed", None, "yellow"), # Took the last unit
+        ("posted", None, "green"),
+    ]
+    timestamps = [datetime.fromisoformat(e["timestamp"]) for e in reversed(entries)]
+    assert timestamps == sorted(timestamps)
+    assert abs(datetime.now() - timestamps[-1]) < timedelta(minutes=1) # Local, like the posts' own timestamps
+
+
+def test_recent_activity_after_cursor(client, drain_events, reserved_food_post):
+    """Tests that `after` returns only entries appended since the given id."""
+    drain_events()
+    latest = client.get("/api/food/activity", params={"limit": 1}).json()["activity"][0]
+    client.post("/api/food/complete", data={"food_id": reserved_food_post["id"], "user": reserved_food_post["reserverNetId"]})
+    drain_events()
+    response = client.get("/api/food/activity", params={"after": latest["id"]})
+    assert response.status_code == 200
+    entries = response.json()["activity"]
+    assert len(entries) == 1
+    assert entries[0]["action"] == "completed"
+    assert entries[0]["foodId"] == reserved_food_post["id"]
+
+
+def test_recent_activity_invalid_cursor(client):
+    response = client.get("/api/food/activity", params={"after": "not-an-id"})
+    assert response.status_code == 400
+
+
+def test_recent_activity_limit_bounds(client):
+    response = client.get("/api/food/activity", params={"limit": activity_log.MAX_RECENT_ACTIVITY + 1})
+    assert response.status_code == 422
+
+
+def test_recent_activity_db_error(client, monkeypatch):
+    def mock_recent(*args, **kwargs):
+        raise Exception("Simulated DB error")
+    monkeypatch.setattr(activity_log, "recent", mock_recent)
+    response = client.get("/api/food/activity")
+    assert response.status_code == 500
+
@@ -0,0 +1,103 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_food_collection
+from services import analytics, counters
+
+
+def _post(client, net_id, location, quantity):
+    now = datetime.now()
+    item = {
+        "foodName": "Rollup Muffins", "quantity": quantity, "category": "Snack", "dietaryInfo": "None",
+        "pickupLocation": location, "pickupTime": now.isoformat(), "photo": {"uri": "data:image/jpeg;base64,abc"},
+        "user": net_id, "expirationTime": (now + timedelta(hours=1)).isoformat(),
+    }
+    response = client.post("/api/food/bulk", json=[item])
+    assert response.json()["inserted"] == 1
+    return response.json()["results"][0]["food_id"]
+
+
+def _activity(client, drain_events, **params):
+    drain_events()
+    counters.flush_all()
+    response = client.get("/api/analytics/activity", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_lifecycle_updates_hourly_and_daily_rollups(client, drain_events, test_user_data, other_user_data):
+    """Tests that posting, reserving and completing land in the current hour and day of the post's location."""
+    location = f"Rollup Hall {time.time()}"
+    food_id = _post(client, test_user_data["netId"], location, quantity=3)
+    client.post("/api/food/reserve", json={"food_id": food_id, "user": other_user_data["netId"]})
+    client.post("/api/food/complete", data={"food_id": food_id, "user": other_user_data["netId"]})
+
+    expected = {"posted": 1, "quantityPosted": 3, "reserved": 1, "completed": 1, "quantitySaved": 3, "expired": 0, "completionRate": 1.0}
+    for granularity in analytics.GRANULARITIES:
+        result = _activity(client, drain_events, granularity=granularity, location=location)
+        assert len(result["buckets"]) == 1
+        assert result["totals"] == expected
+
+    locations = client.get("/api/analytics/locations").json()["locations"]
+    assert {k: v for k, v in next(row for row in locations if row["location"] == location).items() if k != "location"} == expected
+
+
+def test_claims_count_as_reservations_with_their_units(client, drain_events, test_user_data, other_user_data):
+    """Tests that each claim is a reservation and its pickup saves its units, without counting the post again."""
+    location = f"Claim Hall {time.time()}"
+    food_id = _post(client, test_user_data["netId"], location, quantity=3)
+    claims = [client.post("/api/food/claim", json={"food_id": food_id, "user": user, "units": units}).json()
+              for user, units in ((other_user_data["netId"], 2), (test_user_data["netId"], 1))]
+    client.post("/api/food/claim/complete", json={"food_id": food_id, "claim_id": claims[0]["claim_id"], "user": other_user_data["netId"]})
+
+    partial = {"posted": 1, "quantityPosted": 3, "reserved": 2, "completed": 1, "quantitySaved": 2, "expired": 0, "completionRate": 0.5}
+    assert _activity(client, drain_events, granularity="day", location=location)["totals"] == partial
+
+    response = client.post("/api/food/claim/complete", json={"food_id": food_id, "claim_id": claims[1]["claim_id"], "user": test_user_data["netId"]})
+    assert response.json()["postCompleted"] is True
+    done = dict(partial, completed=2, quantitySaved=3, completionRate=1.0)
+    assert _activity(client, drain_events, granularity="day", location=location)["totals"] == done
+
+
+def test_analytics_reads_only_rollups(monkeypatch, client):
+    import database
+    def fail(*args, **kwargs):
+        raise AssertionError("analytics must not read food_posts")
+    monkeypatch.setattr(database, "get_food_collection", fail)
+    monkeypatch.setattr(analytics, "get_food_collection", fail)
+    assert client.get("/api/analytics/activity", params={"granularity": "day"}).status_code == 200
+    assert client.get("/api/analytics/locations").status_code == 200
+
+
+def test_backfill_rebuilds_historical_buckets(client, drain_events, test_user_data):
+    """Tests that the backfill streams old posts into the buckets they were posted in, and is repeatable."""
+    location = f"Archive Hall {time.time()}"
+    posted_at = datetime(2001, 3, 4, 10, 30)
+    docs = [
+        {"foodName": "Old Soup", "quantity": 2, "pickupLocation": location, "status": status,
+         "postedBy": test_user_data["netId"], "timestamp": posted_at + timedelta(minutes=i)}
+        for i, status in enumerate(["green", "yellow", "red"])
+    ]
+    docs.append({"foodName": "Old Tray", "quantity": 4, "pickupLocation": location, "status": "yellow",
+                 "postedBy": test_user_data["netId"], "timestamp": posted_at + timedelta(minutes=5),
+                 "claims": [{"claimId": "a", "units": 3, "status": "completed"}, {"claimId": "b", "units": 1, "status": "held"}]})
+    get_food_collection().insert_many(docs)
+    for _ in range(2):
+        analytics.backfill(until=datetime(2001, 3, 5), batch_size=2)
+
+    params = {"location": location, "since": "2001-03-04T00:00:00", "until": "2001-03-05T00:00:00"}
+    hourly = _activity(client, drain_events, granularity="hour", **params)
+    assert [bucket["bucket"] for bucket in hourly["buckets"]] == ["2001-03-04T10:00:00"]
+    assert hourly["totals"] == {"posted": 4, "quantityPosted": 10, "reserved": 4, "completed": 2, "quantitySaved": 5, "expired": 0, "completionRate": 0.5}
+    assert _activity(client, drain_events, granularity="day", **params)["totals"] == hourly["totals"]
+
+
+@pytest.mark.parametrize("params", [
+    {"granularity": "week"},
+    {"since": "2024-02-01T00:00:00", "until": "2024-01-01T00:00:00"},
+    {"granularity": "hour", "since": "2024-01-01T00:00:00", "until": "2024-03-01T00:00:00"},
+])
+def test_analytics_rejects_bad_ranges(client, params):
+    assert client.get("/api/analytics/activity", params=params).status_code == 400
@@ -0,0 +1,107 @@
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_feed_view_collection, get_food_collection, get_report_collection
+from services import archive, feed_view, user_stats
+
+OLD = datetime.now() - timedelta(days=90)
+
+
+@pytest.fixture
+def archived_ids():
+    """Ids moved by a test, removed from the archive collections afterwards."""
+    ids = []
+    yield ids
+    archive.get_post_archive_collection().delete_many({"_id": {"$in": ids}})
+    archive.get_report_archive_collection().delete_many({"_id": {"$in": ids}})
+
+
+def _age(food_id, **fields):
+    get_food_collection().update_one({"_id": ObjectId(food_id)}, {"$set": dict({"timestamp": OLD}, **fields)})
+
+
+def _is_archived(food_id):
+    food_id = ObjectId(food_id)
+    return get_food_collection().find_one({"_id": food_id}) is None and archive.get_post_archive_collection().find_one({"_id": food_id}) is not None
+
+
+def _old_post(net_id, **fields):
+    doc = dict({"foodName": "Archived Stew", "quantity": 1, "status": "green", "postedBy": net_id, "reservedBy": "None", "timestamp": OLD}, **fields)
+    return str(get_food_collection().insert_one(doc).inserted_id)
+
+
+def test_archives_old_finished_posts_only(client, completed_food_post, test_user_data, archived_ids):
+    """Tests that old completed and expired posts move, while recent, unexpired or reserved ones stay hot."""
+    _age(completed_food_post["id"])
+    feed_view.upsert_post(get_food_collection().find_one({"_id": ObjectId(completed_food_post["id"])}))
+    net_id = test_user_data["netId"]
+    expired = _old_post(net_id, expirationTime=(datetime.now() - timedelta(days=60)).isoformat())
+    kept = [
+        _old_post(net_id, expirationTime=(datetime.now() + timedelta(days=1)).isoformat()), # Still claimable
+        _old_post(net_id, status="yellow", reservedBy="someone"),
+        _old_post(net_id, expirationTime="whenever"), # Can't tell when it expires
+        _old_post(net_id, status="red", timestamp=datetime.now()), # Too recent
+    ]
+    archived_ids.extend(ObjectId(food_id) for food_id in [completed_food_post["id"], expired] + kept)
+
+    archive.archive_posts(datetime.now() - timedelta(days=30), batch_size=2)
+    assert _is_archived(completed_food_post["id"]) and _is_archived(expired)
+    assert get_feed_view_collection().find_one({"_id": ObjectId(completed_food_post["id"])}) is None
+    assert not any(_is_archived(food_id) for food_id in kept)
+
+
+def test_archives_reviewed_reports(client, reported_food_post, archived_ids):
+    report_id = ObjectId(reported_food_post["reportId"])
+    archived_ids.append(report_id)
+    archive.archive_reports(datetime.now() - timedelta(days=30))
+    assert get_report_collection().find_one({"_id": report_id}) is not None # Pending reports are never archived
+
+    get_report_collection().update_one({"_id": report_id}, {"$set": {"reviewStatus": "dismissed", "reviewedAt": OLD}})
+    assert archive.run(days=30)["reports"] >= 1
+    assert get_report_collection().find_one({"_id": report_id}) is None
+    assert archive.get_report_archive_collection().find_one({"_id": report_id})["reviewStatus"] == "dismissed"
+
+
+def test_move_keeps_documents_that_changed_and_tolerates_reruns(client, available_food_post, archived_ids):
+    """Tests that a post changed in any way after it was read stays hot, and that an interrupted move can be re-run."""
+    food_id = ObjectId(available_food_post["id"])
+    archived_ids.append(food_id)
+    posts, archived = get_food_collection(), archive.get_post_archive_collection()
+    for change in ({"$set": {"status": "yellow"}}, {"$inc": {"reportCount": 1}}, {"$set": {"hidden": True}}):
+        snapshot = posts.find_one({"_id": food_id})
+        posts.update_one({"_id": food_id}, change)
+        assert archive._move(posts, archived, [snapshot]) == []
+        assert posts.find_one({"_id": food_id}) is not None and archived.find_one({"_id": food_id}) is None
+
+    posts.update_one({"_id": food_id}, {"$set": {"status": "green", "hidden": False}})
+    stale = dict(posts.find_one({"_id": food_id}), reportCount=0)
+    archived.insert_one(dict(stale, archivedAt=OLD)) # Copied by a run that died before deleting
+    snapshot = posts.find_one({"_id": food_id})
+    assert archive._move(posts, archived, [snapshot]) == [food_id]
+    assert _is_archived(food_id)
+    assert archived.find_one({"_id": food_id})["reportCount"] == snapshot["reportCount"] # Re-copied as read
+
+
+def test_history_and_stats_span_the_archive(client, completed_food_post, archived_ids):
+    """Tests that profile histories, photos and reconciled stats still include archived posts."""
+    food_id, poster, reserver = completed_food_post["id"], completed_food_post["posterNetId"], completed_food_post["reserverNetId"]
+    archived_ids.append(ObjectId(food_id))
+    _age(food_id)
+    archive.archive_posts(datetime.now() - timedelta(days=30))
+    assert _is_archived(food_id)
+
+    posted = client.get(f"/api/users/profile/{poster}").json()["post_history"]
+    received = client.get(f"/api/users/profile/{reserver}").json()["received_history"]
+    assert food_id in [food["id"] for food in posted] and food_id in [food["id"] for food in received]
+    archive.get_post_archive_collection().update_one({"_id": ObjectId(food_id)}, {"$set": {"photo": "data:image/png;base64,aGk="}})
+    photo = client.get(f"/api/food/{food_id}/photo")
+    assert photo.status_code == 200 and photo.content == b"hi"
+
+    expected = sum(
+        source.count_documents(query)
+        for source in (get_food_collection(), archive.get_post_archive_collection())
+        # Picked-up claims count too (one per post here)
+        for query in ({"reservedBy": reserver, "status": "red"}, {"claims": {"$elemMatch": {"user": reserver, "status": "completed"}}})
+    )
+    assert user_stats.compute([reserver])[reserver]["receivedCount"] == expected >= 1
@@ -0,0 +1,73 @@
+import pytest
+from fastapi.testclient import TestClient
+from bson import ObjectId
+
+
+# == POST /api/batch ==
+def test_batch_success(client, test_user_data, available_food_post):
+    """Tests that several GET sub-requests are answered together with their own status codes."""
+    payload = {"requests": [
+        {"path": f"/api/users/netid/{test_user_data['googleId']}"},
+        {"path": f"/api/users/profile/{test_user_data['netId']}"},
+        {"path": f"/api/food/poster-netid/{available_food_post['id']}"},
+        {"path": f"/api/food/poster-netid/{str(ObjectId())}"},
+    ]}
+    response = client.post("/api/batch", json=payload)
+    assert response.status_code == 200, f"Response: {response.text}"
+    responses = response.json()["responses"]
+    assert [r["path"] for r in responses] == [r["path"] for r in payload["requests"]]
+    assert responses[0]["status"] == 200
+    assert responses[0]["body"] == {"netId": test_user_data["netId"]}
+    assert responses[1]["status"] == 200
+    assert "post_history" in responses[1]["body"]
+    assert responses[2]["body"] == {"netId": available_food_post["posterNetId"]}
+    assert responses[3]["status"] == 404
+    assert responses[3]["body"]["detail"] == "Food post not found"
+
+
+def test_batch_query_string(client, available_food_post):
+    """Tests that query strings are passed through to the sub-request."""
+    payload = {"requests": [{"path": "/api/food/search?category=Meal"}]}
+    response = client.post("/api/batch", json=payload)
+    assert response.status_code == 200
+    sub_response = response.json()["responses"][0]
+    assert sub_response["status"] == 200
+    assert all(post["category"] == "Meal" for post in sub_response["body"]["food_posts"])
+
+
+def test_batch_runs_sub_requests_concurrently(client, monkeypatch):
+    """Tests that sub-requests whose handlers block don't wait for each other."""
+    import time
+    from services import feed_snapshot
+    get_snapshot = feed_snapshot.get_snapshot
+    def slow_snapshot(*args, **kwargs):
+        time.sleep(0.3) # A handler blocked on the database
+        return get_snapshot(*args, **kwargs)
+    monkeypatch.setattr(feed_snapshot, "get_snapshot", slow_snapshot)
+    started = time.monotonic()
+    response = client.post("/api/batch", json={"requests": [{"path": "/api/food"}] * 4})
+    assert [r["status"] for r in response.json()["responses"]] == [200] * 4
+    assert time.monotonic() - started < 0.9 # Sequential would take at least 1.2s
+
+
+def test_batch_rejects_disallowed_paths(client):
+    """Tests that non-API paths and nested batches are refused per sub-request."""
+    payload = {"requests": [{"path": "/"}, {"path": "/api/batch"}]}
+    response = client.post("/api/batch", json=payload)
+    assert response.status_code == 200
+    assert [r["status"] for r in response.json()["responses"]] == [400, 400]
+
+
+def test_batch_empty(client):
+    """Tests that an empty batch is rejected."""
+    response = client.post("/api/batch", json={"requests": []})
+    assert response.status_code == 400
+
+
+def test_batch_too_many_requests(client):
+    """Tests the cap on batch size."""
+    from routers.batch import MAX_BATCH_REQUESTS
+    payload = {"requests": [{"path": "/api/food"}] * (MAX_BATCH_REQUESTS + 1)}
+    response = client.post("/api/batch", json=payload)
+    assert response.status_code == 400
+    assert "Too many sub-requests" in response.json()["detail"]
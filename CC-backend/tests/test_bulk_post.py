@@ -0,0 +1,97 @@
+import pytest
+import json
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from database import get_food_collection
+from models import MAX_BULK_POSTS
+from routers.food import get_food_db
+from services import activity_log, feed_view
+
+
+def _item(user, name=None, **overrides):
+    now = datetime.now()
+    item = {
+        "foodName": name or f"Bulk Item {time.time()}", "quantity": 3, "category": "Snack",
+        "dietaryInfo": "Vegan", "pickupLocation": "Dining Hall",
+        "pickupTime": now.isoformat(), "photo": {"uri": "data:image/jpeg;base64,abc"},
+        "user": user, "expirationTime": (now + timedelta(hours=2)).isoformat(),
+    }
+    item.update(overrides)
+    return item
+
+
+def test_bulk_post_inserts_all(client, drain_events, test_user_data):
+    """Tests that every valid item is stored like a single post and reaches the feed view and activity log."""
+    items = [_item(test_user_data["netId"], f"Bulk Catering {i} {time.time()}") for i in range(5)]
+    items[1]["photo"] = json.dumps({"uri": "data:image/png;base64,def"}) # Already-encoded photo reference
+    items[2]["photo"] = "https://example.com/tray.jpg" # Bare uri
+    response = client.post("/api/food/bulk", json=items)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 5 and data["failed"] == 0
+    assert [result["index"] for result in data["results"]] == list(range(5))
+    drain_events() # The activity log is written in the background
+
+    for item, result in zip(items, data["results"]):
+        food = get_food_collection().find_one({"_id": ObjectId(result["food_id"])})
+        assert food["foodName"] == item["foodName"]
+        assert food["status"] == "green"
+        assert food["remainingQuantity"] == 3
+        assert json.loads(food["photo"])["uri"]
+        assert feed_view.get_feed_view_collection().find_one({"_id": food["_id"]}) is not None
+        assert any(entry["action"] == "posted" for entry in activity_log.recent(food_id=result["food_id"]))
+
+
+def test_bulk_post_reports_invalid_items(client, test_user_data):
+    """Tests that invalid items are reported by index without blocking the valid ones."""
+    user = test_user_data["netId"]
+    items = [
+        _item(user),
+        _item(user, quantity=0),
+        {"foodName": "Missing fields"},
+        _item(user, photo=None),
+        "not an object",
+        _item(user),
+    ]
+    response = client.post("/api/food/bulk", json=items)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2 and data["failed"] == 4
+    results = data["results"]
+    assert "food_id" in results[0] and "food_id" in results[5]
+    assert "quantity" in results[1]["error"]
+    assert "pickupLocation" in results[2]["error"]
+    assert "photo" in results[3]["error"]
+    assert "object" in results[4]["error"]
+
+
+@pytest.mark.parametrize("count", [0, MAX_BULK_POSTS + 1])
+def test_bulk_post_size_limits(client, test_user_data, count):
+    response = client.post("/api/food/bulk", json=[_item(test_user_data["netId"])] * count)
+    assert response.status_code == 400
+
+
+def test_bulk_post_partial_insert_failure(client, test_user_data):
+    """Tests that per-document write errors from the unordered insert are mapped back to item indexes."""
+    collection = get_food_collection()
+
+    class FailingSecondInsert:
+        def insert_many(self, docs, ordered=True):
+            assert ordered is False
+            collection.insert_many([doc for i, doc in enumerate(docs) if i != 1])
+            raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key error"}], "nInserted": len(docs) - 1})
+
+    client.app.dependency_overrides[get_food_db] = FailingSecondInsert
+    try:
+        items = [_item(test_user_data["netId"]) for _ in range(3)]
+        response = client.post("/api/food/bulk", json=items)
+    finally:
+        client.app.dependency_overrides.pop(get_food_db)
+    assert response.status_code == 200
+    data = response.json()
+    assert data["inserted"] == 2 and data["failed"] == 1
+    assert "duplicate key" in data["results"][1]["error"]
+    assert "food_id" in data["results"][0] and "food_id" in data["results"][2]
@@ -0,0 +1,114 @@
+import pytest
+import json
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_food_collection
+
+
+@pytest.fixture
+def cookie_tray(client, test_user_data):
+    """A post of 40 units, e.g. a tray of cookies."""
+    now = datetime.now()
+    data = {
+        "foodName": f"Cookie Tray {time.time()}", "quantity": 40, "category": "Dessert",
+        "dietaryInfo": "None", "pickupLocation": "Student Center",
+        "pickupTime": now.isoformat(), "photo": json.dumps({"uri": "data:image/jpeg;base64,abc"}),
+        "user": test_user_data["netId"],
+        "expirationTime": (now + timedelta(hours=2)).isoformat(), "createdAt": now.isoformat(),
+    }
+    response = client.post("/api/food", data={k: str(v) for k, v in data.items()})
+    assert response.status_code == 200
+    return response.json()["food_id"]
+
+
+def _claim(client, food_id, user, units=1):
+    return client.post("/api/food/claim", json={"food_id": food_id, "user": user, "units": units})
+
+
+def _status(food_id):
+    return get_food_collection().find_one({"_id": ObjectId(food_id)})["status"]
+
+
+def test_one_tray_serves_forty_people(client, cookie_tray):
+    """Tests that 40 single-unit claims all succeed and only the last takes the post off the market."""
+    for i in range(40):
+        response = _claim(client, cookie_tray, f"student_{i}")
+        assert response.status_code == 200
+        assert response.json()["remainingQuantity"] == 39 - i
+        assert _status(cookie_tray) == ("green" if i < 39 else "yellow")
+
+    response = _claim(client, cookie_tray, "student_late")
+    assert response.status_code == 400
+    food = get_food_collection().find_one({"_id": ObjectId(cookie_tray)})
+    assert food["remainingQuantity"] == 0
+    assert len(food["claims"]) == 40
+
+
+def test_claim_more_than_remaining(client, cookie_tray):
+    assert _claim(client, cookie_tray, "hungry", units=35).status_code == 200
+    response = _claim(client, cookie_tray, "hungrier", units=6)
+    assert response.status_code == 409
+    assert "5" in response.json()["detail"]
+    assert _claim(client, cookie_tray, "polite", units=5).json()["remainingQuantity"] == 0
+
+
+def test_claim_on_hidden_post(client, cookie_tray):
+    get_food_collection().update_one({"_id": ObjectId(cookie_tray)}, {"$set": {"hidden": True}})
+    assert _claim(client, cookie_tray, "sneaky").status_code == 400
+    assert "claims" not in get_food_collection().find_one({"_id": ObjectId(cookie_tray)})
+
+
+def test_claim_validation(client, cookie_tray):
+    assert _claim(client, cookie_tray, "someone", units=0).status_code == 422
+    assert _claim(client, "invalid-id", "someone").status_code == 400
+    assert _claim(client, str(ObjectId()), "someone").status_code == 404
+
+
+def test_post_completes_after_every_claim_is_picked_up(client, cookie_tray):
+    """Tests per-claim completion: red only when fully claimed and all claims completed."""
+    first = _claim(client, cookie_tray, "alice", units=30).json()
+    second = _claim(client, cookie_tray, "bob", units=10).json()
+    assert _status(cookie_tray) == "yellow"
+
+    response = client.post("/api/food/claim/complete", json={"food_id": cookie_tray, "claim_id": first["claim_id"], "user": "alice"})
+    assert response.status_code == 200
+    assert response.json()["postCompleted"] is False
+    assert _status(cookie_tray) == "yellow"
+
+    response = client.post("/api/food/claim/complete", json={"food_id": cookie_tray, "claim_id": second["claim_id"], "user": "bob"})
+    assert response.json()["postCompleted"] is True
+    assert _status(cookie_tray) == "red"
+
+
+def test_complete_claim_errors(client, cookie_tray):
+    claim = _claim(client, cookie_tray, "alice").json()
+    complete = lambda user, claim_id=claim["claim_id"]: client.post(
+        "/api/food/claim/complete", json={"food_id": cookie_tray, "claim_id": claim_id, "user": user})
+    assert complete("mallory").status_code == 403
+    assert complete("alice", claim_id="nope").status_code == 404
+    assert complete("alice").status_code == 200
+    assert complete("alice").status_code == 400
+
+
+def test_whole_post_reservation_blocked_once_portions_claimed(client, cookie_tray):
+    _claim(client, cookie_tray, "alice")
+    response = client.post("/api/food/reserve", json={"food_id": cookie_tray, "user": "bob"})
+    assert response.status_code == 409
+
+
+def test_claim_on_post_without_remaining_quantity(client, cookie_tray):
+    """Tests that posts created before partial claims start from their quantity."""
+    get_food_collection().update_one({"_id": ObjectId(cookie_tray)}, {"$unset": {"remainingQuantity": ""}})
+    response = _claim(client, cookie_tray, "alice", units=4)
+    assert response.status_code == 200
+    assert response.json()["remainingQuantity"] == 36
+
+
+def test_claims_reflected_in_feed(client, cookie_tray):
+    from database import get_feed_view_collection
+    _claim(client, cookie_tray, "alice", units=15)
+    entry = get_feed_view_collection().find_one({"_id": ObjectId(cookie_tray)})
+    assert entry["remainingQuantity"] == 25
+    assert entry["available"] is True
@@ -0,0 +1,149 @@
+import pytest
+import time
+from bson import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from database import get_db
+from services import counters
+
+
+@pytest.fixture
+def counter_docs(client):
+    collection = get_db()["counter_test"]
+    ids = [collection.insert_one({"hits": 0}).inserted_id for _ in range(2)]
+    yield collection, ids
+    collection.delete_many({"_id": {"$in": ids}})
+
+
+class _RecordingCollection:
+    """Counts bulk_write calls on one collection without touching the app's own buffers."""
+    def __init__(self, collection):
+        self.collection = collection
+        self.calls = []
+
+    def bulk_write(self, operations, *args, **kwargs):
+        self.calls.append(len(operations))
+        return self.collection.bulk_write(operations, *args, **kwargs)
+
+
+def test_increments_are_coalesced_into_one_write(client, counter_docs):
+    """Tests that many increments on a few documents become one bulk_write with one update per document."""
+    collection, ids = counter_docs
+    recording = _RecordingCollection(collection)
+    counter = counters.CounterBuffer("test.hits", lambda: recording)
+    for i in range(1000):
+        counter.increment(ids[i % 2], "hits")
+    assert collection.find_one({"_id": ids[0]})["hits"] == 0 # Nothing written yet
+    assert counter.stats()["pending_ops"] == 1000 and counter.stats()["pending_docs"] == 2
+
+    assert counter.flush() == 1000
+    assert recording.calls == [2]
+    assert [collection.find_one({"_id": i})["hits"] for i in ids] == [500, 500]
+    stats = counter.stats()
+    assert stats["pending_ops"] == 0 and stats["lag_ms"] == 0.0
+    assert stats["flushes"] == 1 and stats["flushed_ops"] == 1000
+
+
+
+def test_compound_key_upserts_one_document_per_key(client):
+    collection = get_db()["counter_test"]
+    tag = f"compound_{time.time()}"
+    counter = counters.CounterBuffer("test.compound", lambda: collection, key_field=("tag", "slot"), upsert=True)
+    for slot in (1, 1, 2):
+        counter.increment((tag, slot), "hits")
+    counter.flush()
+    assert sorted((doc["slot"], doc["hits"]) for doc in collection.find({"tag": tag})) == [(1, 2), (2, 1)]
+    collection.delete_many({"tag": tag})
+
+def test_failed_flush_is_retried(client, counter_docs):
+    collection, ids = counter_docs
+    failing = {"on": True}
+    def get_collection():
+        if failing["on"]:
+            raise RuntimeError("primary stepped down")
+        return collection
+    counter = counters.CounterBuffer("test.retry", get_collection)
+    counter.increment(ids[0], "hits", 3)
+    assert counter.flush() == 0
+    assert counter.stats()["errors"] == 1 and counter.stats()["pending_ops"] == 1
+
+    counter.increment(ids[0], "hits", 2)
+    failing["on"] = False
+    assert counter.flush() == 2
+    assert collection.find_one({"_id": ids[0]})["hits"] == 5
+
+
+class _PartlyFailingCollection:
+    """Applies every update but the one at `failing_index`, then raises like an unordered bulk_write would."""
+    def __init__(self, collection, failing_index):
+        self.collection = collection
+        self.failing_index = failing_index
+
+    def bulk_write(self, operations, *args, **kwargs):
+        applied = [op for i, op in enumerate(operations) if i != self.failing_index]
+        self.collection.bulk_write(applied, *args, **kwargs)
+        raise BulkWriteError({"writeErrors": [{"index": self.failing_index, "code": 112, "errmsg": "WriteConflict"}], "nInserted": 0})
+
+
+def test_partly_failed_flush_retries_only_the_failed_updates(client, counter_docs):
+    """Tests that updates which landed before a BulkWriteError are not applied again on the next flush."""
+    collection, ids = counter_docs
+    flushed = []
+    partly_failing = _PartlyFailingCollection(collection, failing_index=1)
+    target = {"collection": partly_failing}
+    counter = counters.CounterBuffer("test.partial", lambda: target["collection"], on_flush=flushed.extend)
+    counter.increment(ids[0], "hits", 3)
+    counter.increment(ids[1], "hits", 5)
+    assert counter.flush() == 0
+    assert flushed == [ids[0]]
+    assert counter.stats()["errors"] == 1 and counter.stats()["pending_docs"] == 1
+
+    target["collection"] = collection
+    counter.flush()
+    assert [collection.find_one({"_id": i})["hits"] for i in ids] == [3, 5]
+
+
+def test_flush_that_may_have_applied_is_not_replayed(client, counter_docs):
+    collection, ids = counter_docs
+    class _ConnectionLost:
+        def bulk_write(self, operations, *args, **kwargs):
+            collection.bulk_write(operations, *args, **kwargs)
+            raise AutoReconnect("connection closed")
+    counter = counters.CounterBuffer("test.dropped", lambda: _ConnectionLost())
+    counter.increment(ids[0], "hits", 2)
+    assert counter.flush() == 0
+    assert counter.stats()["pending_ops"] == 0 and counter.stats()["dropped_ops"] == 1
+    assert collection.find_one({"_id": ids[0]})["hits"] == 2
+
+
+def test_on_flush_receives_written_keys(client, counter_docs):
+    collection, ids = counter_docs
+    flushed = []
+    counter = counters.CounterBuffer("test.callback", lambda: collection, on_flush=flushed.extend)
+    counter.increment(ids[0], "hits")
+    counter.increment(ids[1], "hits")
+    counter.flush()
+    assert sorted(flushed) == sorted(ids)
+
+
+def test_write_through_without_flusher(client, counter_docs, monkeypatch):
+    """Tests that increments are written immediately when no flush loop is running."""
+    collection, ids = counter_docs
+    monkeypatch.setattr(counters, "_task", None)
+    counter = counters.CounterBuffer("test.direct", lambda: collection)
+    counter.increment(ids[0], "hits", 4)
+    assert collection.find_one({"_id": ids[0]})["hits"] == 4
+    assert counter.stats()["pending_ops"] == 0
+
+
+def test_report_counts_are_flushed_by_the_loop(client, reported_food_post):
+    """Tests that the app's flusher writes buffered feed_view report counts without an explicit flush."""
+    from database import get_feed_view_collection
+    deadline = time.time() + 5
+    while time.time() < deadline:
+        entry = get_feed_view_collection().find_one({"_id": ObjectId(reported_food_post["foodId"])})
+        if entry["reportCount"] == 1:
+            break
+        time.sleep(0.05)
+    assert entry["reportCount"] == 1
+    assert "feed_view.reportCount" in client.get("/api/system/metrics").json()["counters"]
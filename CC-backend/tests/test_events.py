@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from bson import ObjectId
+
+from services import events
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    """Isolates the event bus from the subscribers registered by the app modules."""
+    monkeypatch.setattr(events, "_subscribers", {})
+    monkeypatch.setattr(events, "_pending", set())
+    return events
+
+
+def test_sync_subscriber_runs_inline(bus):
+    """Tests that sync subscribers have run by the time emit() returns."""
+    seen = []
+    bus.subscribe(events.FoodReserved, seen.append)
+    event = events.FoodReserved(foodId="abc", reservedBy="user1")
+    bus.emit(event)
+    assert seen == [event]
+
+
+def test_subscribers_only_receive_their_event_type(bus):
+    """Tests that dispatch is by event class."""
+    seen = []
+    bus.subscribe(events.FoodCompleted, seen.append)
+    bus.emit(events.FoodReserved(foodId="abc", reservedBy="user1"))
+    assert seen == []
+
+
+def test_failing_subscriber_is_isolated_and_counted(bus):
+    """Tests that a broken subscriber neither raises nor stops the others."""
+    seen = []
+    def broken(event):
+        raise RuntimeError("boom")
+    bus.subscribe(events.UserRegistered, broken, name="broken")
+    bus.subscribe(events.UserRegistered, seen.append, name="recorder")
+    bus.emit(events.UserRegistered(netId="abc123"))
+    assert len(seen) == 1
+    subscribers = {s["subscriber"]: s for s in bus.stats()["subscribers"]["UserRegistered"]}
+    assert subscribers["broken"]["errors"] == 1
+    assert subscribers["recorder"]["calls"] == 1
+    assert subscribers["recorder"]["avg_ms"] is not None
+
+
+def test_background_subscriber_runs_after_emit(bus):
+    """Tests that background subscribers are queued and finish on drain()."""
+    seen = []
+    bus.subscribe(events.FoodPosted, seen.append, mode=events.BACKGROUND)
+
+    async def scenario():
+        bus.emit(events.FoodPosted(food={"_id": ObjectId()}))
+        queued = bus.stats()["pending_background"]
+        await bus.drain()
+        return queued
+
+    assert asyncio.run(scenario()) == 1
+    assert len(seen) == 1
+    assert bus.stats()["pending_background"] == 0
+
+
+def test_background_subscriber_without_loop_runs_inline(bus):
+    """Tests that emitting outside an event loop (scripts) still delivers background events."""
+    seen = []
+    bus.subscribe(events.FoodPosted, seen.append, mode=events.BACKGROUND)
+    bus.emit(events.FoodPosted(food={"_id": ObjectId()}))
+    assert len(seen) == 1
+
+
+def test_unknown_mode_rejected(bus):
+    with pytest.raises(ValueError):
+        bus.subscribe(events.FoodPosted, print, mode="later")
+
+
+def test_app_modules_subscribe_to_write_events():
+    """Tests that the read model and cache invalidation are wired to the lifecycle events."""
+    import main # noqa: F401  (imports every module that registers subscribers)
+    names = {s["subscriber"] for subs in events.stats()["subscribers"].values() for s in subs}
+    assert "services.feed_view._on_food_posted" in names
+    assert "services.invalidation_bus._on_food_reserved" in names
@@ -0,0 +1,96 @@
+import pytest
+import csv
+import io
+import json
+from datetime import datetime
+
+from database import get_report_collection, get_users_collection
+from services import exports
+
+
+@pytest.fixture
+def admin_id(test_user_data):
+    """The shared test user, made an admin for the duration of the test."""
+    users = get_users_collection()
+    users.update_one({"netId": test_user_data["netId"]}, {"$set": {"role": "admin"}})
+    yield test_user_data["netId"]
+    users.update_one({"netId": test_user_data["netId"]}, {"$set": {"role": "user"}})
+
+
+def test_export_posts_ndjson_with_projection(client, admin_id, available_food_post):
+    response = client.get("/api/admin/export/posts", params={"admin_id": admin_id, "fields": "id,foodName,postedBy,timestamp"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    row = next(r for r in rows if r["id"] == available_food_post["id"])
+    assert set(row) == {"id", "foodName", "postedBy", "timestamp"}
+    assert row["postedBy"] == available_food_post["posterNetId"]
+    datetime.fromisoformat(row["timestamp"])
+
+
+def test_export_reports_csv_with_date_filter(client, admin_id):
+    """Tests that the CSV has a header row and only the reports inside the date window."""
+    docs = [
+        {"postId": f"export_post_{i}", "user1ID": "exporter", "user2ID": "exported", "message": f"This is a test report, export {i}\nsecond line",
+         "submittedAt": datetime(2002, 5, day), "reviewStatus": "pending", "reviewedBy": None, "reviewedAt": None}
+        for i, day in enumerate((1, 2, 3))
+    ]
+    get_report_collection().insert_many(docs)
+    params = {"admin_id": admin_id, "format": "csv", "fields": "postId,message,submittedAt,reviewedAt", "since": "2002-05-02T00:00:00", "until": "2002-05-03T00:00:00"}
+    response = client.get("/api/admin/export/reports", params=params)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows == [
+        ["postId", "message", "submittedAt", "reviewedAt"],
+        ["export_post_1", "This is a test report, export 1\nsecond line", "2002-05-02T00:00:00", ""],
+    ]
+
+
+def test_export_users_never_includes_passwords(client, admin_id, test_user_data):
+    rows = [json.loads(line) for line in client.get("/api/admin/export/users", params={"admin_id": admin_id}).text.splitlines()]
+    assert any(row["netId"] == test_user_data["netId"] for row in rows)
+    assert all("password" not in row for row in rows)
+    assert client.get("/api/admin/export/users", params={"admin_id": admin_id, "fields": "netId,password"}).status_code == 400
+
+
+def test_export_requires_admin(client, other_user_data):
+    for params in ({"admin_id": other_user_data["netId"]}, {"admin_id": "no_such_admin"}):
+        assert client.get("/api/admin/export/posts", params=params).status_code == 403
+    assert client.get("/api/admin/export/posts").status_code == 422
+
+
+def test_export_csv_neutralises_formulas(client, admin_id):
+    """Tests that text a spreadsheet would evaluate is exported as plain text."""
+    messages = ["=HYPERLINK(\"http://evil\")", "+1", "-2", "@SUM(A1)", "This is a test report, harmless"]
+    docs = [{"postId": f"formula_post_{i}", "user1ID": "exporter", "user2ID": "exported", "message": message,
+             "submittedAt": datetime(2004, 1, 1), "reviewStatus": "pending"} for i, message in enumerate(messages)]
+    get_report_collection().insert_many(docs)
+    params = {"admin_id": admin_id, "format": "csv", "fields": "message", "since": "2004-01-01T00:00:00", "until": "2004-01-02T00:00:00"}
+    try:
+        rows = list(csv.reader(io.StringIO(client.get("/api/admin/export/reports", params=params).text)))
+    finally:
+        get_report_collection().delete_many({"postId": {"$regex": "^formula_post_"}}) # Not caught by the test report cleanup
+    assert [row[0] for row in rows[1:]] == ["'" + message for message in messages[:4]] + [messages[4]]
+
+
+def test_export_streams_in_chunks(monkeypatch, client):
+    """Tests that rows are handed over in bounded chunks instead of one string."""
+    docs = [{"postId": f"chunk_post_{i}", "user1ID": "exporter", "user2ID": "exported", "message": "This is a test report chunk",
+             "submittedAt": datetime(2003, 1, 1), "reviewStatus": "pending"} for i in range(7)]
+    get_report_collection().insert_many(docs)
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_ROWS", 3)
+    window = {"since": datetime(2003, 1, 1), "until": datetime(2003, 1, 2)}
+    chunks = list(exports.stream("reports", "ndjson", ["postId"], batch_size=2, **window))
+    assert [chunk.count("\n") for chunk in chunks] == [3, 3, 1]
+    assert [json.loads(line)["postId"] for line in "".join(chunks).splitlines()] == [doc["postId"] for doc in docs]
+
+
+@pytest.mark.parametrize("path, params, status", [
+    ("/api/admin/export/secrets", {}, 404),
+    ("/api/admin/export/posts", {"format": "xml"}, 400),
+    ("/api/admin/export/posts", {"fields": "photo"}, 400),
+])
+def test_export_rejects_bad_requests(client, admin_id, path, params, status):
+    assert client.get(path, params=dict(params, admin_id=admin_id)).status_code == status
@@ -0,0 +1,77 @@
+import pytest
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+
+from services import feed_snapshot
+
+
+def test_get_food_served_from_snapshot(client, available_food_post, fresh_feed_snapshot):
+    """Tests that GET /api/food returns the snapshot bytes and its version."""
+    response = client.get("/api/food", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    snapshot = feed_snapshot.get_snapshot()
+    assert response.headers["X-Feed-Version"] == str(snapshot.version)
+    assert response.content == snapshot.identity
+    ids = [post["id"] for post in response.json()["food_posts"]]
+    assert available_food_post["id"] in ids
+
+
+def test_get_food_gzip(client, available_food_post, fresh_feed_snapshot):
+    """Tests that gzip-capable clients get the pre-compressed body."""
+    response = client.get("/api/food", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["Vary"] == "Accept-Encoding"
+    assert "food_posts" in response.json() # TestClient transparently decompresses
+
+
+def test_get_food_gzip_refused(client, available_food_post, fresh_feed_snapshot):
+    """Tests that a zero q-value for gzip gets the identity body."""
+    for accept in ("gzip;q=0", "gzip; q=0.0, identity", "*;q=0"):
+        response = client.get("/api/food", headers={"Accept-Encoding": accept})
+        assert response.status_code == 200
+        assert "Content-Encoding" not in response.headers, accept
+        assert response.content == feed_snapshot.get_snapshot().identity
+
+
+def test_snapshot_rebuilt_after_write(client, test_user_data, fresh_feed_snapshot):
+    """Tests that a write marks the snapshot stale and the next version includes it."""
+    before = feed_snapshot.get_snapshot()
+    data = {
+        "foodName": f"Snapshot Soup {time.time()}", "quantity": 1, "category": "Meal",
+        "dietaryInfo": "None", "pickupLocation": "Somewhere",
+        "pickupTime": datetime.now().isoformat(),
+        "photo": json.dumps({"uri": "data:image/jpeg;base64,/9j/valid..."}),
+        "user": test_user_data["netId"],
+        "expirationTime": (datetime.now() + timedelta(hours=4)).isoformat(),
+        "createdAt": datetime.now().isoformat(),
+    }
+    response = client.post("/api/food", data=data)
+    assert response.status_code == 200
+    food_id = response.json()["food_id"]
+
+    deadline = time.monotonic() + 5 # The background refresher, if running, rebuilds it shortly
+    after = feed_snapshot.get_snapshot()
+    while after.version == before.version and time.monotonic() < deadline:
+        time.sleep(0.05)
+        after = feed_snapshot.get_snapshot()
+    assert after.version > before.version
+    assert food_id in [post["id"] for post in json.loads(after.identity)["food_posts"]]
+
+
+def test_build_snapshot_encodes_datetimes():
+    """Tests that snapshot bytes are valid JSON in both encodings."""
+    class FakeCollection:
+        def find(self, *args, **kwargs):
+            return [{"_id": "abc", "foodName": "Soup", "pickupAt": datetime(2025, 1, 1, 12, 0),
+                     "photo": "data:image/png;base64,xyz"}]
+
+    snapshot = feed_snapshot.build_snapshot(FakeCollection(), version=7)
+    payload = json.loads(snapshot.identity)
+    assert payload == json.loads(gzip.decompress(snapshot.gzipped))
+    assert payload["food_posts"][0]["pickupAt"] == "2025-01-01T12:00:00"
+    assert payload["food_posts"][0]["id"] == "abc"
+    assert payload["food_posts"][0]["photo"] == "data:image/png;base64,xyz"
+    assert snapshot.version == 7 and snapshot.count == 1
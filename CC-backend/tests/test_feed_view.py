@@ -0,0 +1,124 @@
+import pytest
+import base64
+import json
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from services import counters, feed_view
+
+
+def _entry(food_id):
+    from database import get_feed_view_collection
+    return get_feed_view_collection().find_one({"_id": ObjectId(food_id)})
+
+
+def test_post_creates_feed_view_entry(client, available_food_post, test_user_data):
+    """Tests that posting food writes a denormalized read-model entry."""
+    entry = _entry(available_food_post["id"])
+    assert entry is not None
+    assert entry["poster"] == {"netId": test_user_data["netId"], "fullName": test_user_data["fullName"], "picture": "default.png"}
+    assert entry["thumbnail"] == f"/api/food/{available_food_post['id']}/photo"
+    assert entry["photo"].startswith("data:image")
+    assert entry["available"] is True
+    assert isinstance(entry["expiresAt"], datetime)
+
+
+def test_lifecycle_updates_feed_view_entry(client, completed_food_post):
+    """Tests that reserve and complete are mirrored onto the entry."""
+    entry = _entry(completed_food_post["id"])
+    assert entry["status"] == "red"
+    assert entry["reservedBy"] == completed_food_post["reserverNetId"]
+    assert entry["available"] is False
+
+
+def test_report_increments_feed_view_report_count(client, reported_food_post):
+    """Tests that reportCount on the entry follows submitted reports (after the write-behind flush)."""
+    counters.flush_all()
+    assert _entry(reported_food_post["foodId"])["reportCount"] == 1
+
+
+def test_profile_update_propagates_to_feed_view(client, available_food_post, test_user_data):
+    """Tests that a poster's new display name reaches their feed entries."""
+    new_name = f"Renamed User {time.time()}"
+    payload = {
+        "googleId": test_user_data["googleId"], "netId": test_user_data["netId"],
+        "email": test_user_data["email"], "fullName": new_name,
+    }
+    response = client.post("/api/users/register", json=payload)
+    assert response.status_code == 200, f"Response: {response.text}"
+    assert _entry(available_food_post["id"])["poster"]["fullName"] == new_name
+
+    # Restore the shared test user's name for other tests
+    payload["fullName"] = test_user_data["fullName"]
+    client.post("/api/users/register", json=payload)
+
+
+def test_search_reads_feed_view(client, available_food_post):
+    """Tests that list responses carry the read-model fields."""
+    response = client.get("/api/food/search", params={"foodName": "Available Pizza"})
+    assert response.status_code == 200
+    post = next(p for p in response.json()["food_posts"] if p["id"] == available_food_post["id"])
+    assert post["poster"]["netId"] == available_food_post["posterNetId"]
+    assert post["available"] is True
+
+
+def test_rebuild_restores_and_prunes(client, available_food_post):
+    """Tests that a rebuild recreates missing entries and removes orphans."""
+    from database import get_feed_view_collection
+    view = get_feed_view_collection()
+    view.delete_one({"_id": ObjectId(available_food_post["id"])})
+    orphan_id = ObjectId.from_datetime(datetime(2020, 1, 1))
+    view.insert_one({"_id": orphan_id, "foodName": "Deleted post"})
+
+    result = feed_view.rebuild(batch_size=2)
+    assert result["written"] >= 1
+    assert _entry(available_food_post["id"]) is not None
+    assert view.find_one({"_id": orphan_id}) is None
+
+
+def test_catch_up_falls_back_until_rebuilt(client, available_food_post, monkeypatch):
+    """Tests that a view behind food_posts is served from food_posts until the rebuild job runs."""
+    from database import get_feed_view_collection
+    monkeypatch.setattr(feed_view, "FEED_VIEW_RECHECK_INTERVAL", 3600) # Only the job flips it back here
+    enqueued = []
+    monkeypatch.setattr(feed_view.jobs, "enqueue", lambda job_type, payload=None: enqueued.append(job_type))
+    feed_view.rebuild() # In step with food_posts, then one entry goes missing
+    get_feed_view_collection().delete_one({"_id": ObjectId(available_food_post["id"])})
+    try:
+        feed_view.catch_up()
+        assert enqueued == ["rebuild_feed_view"]
+        assert not feed_view.is_ready()
+        response = client.get("/api/food/search", params={"foodName": "Available Pizza"})
+        post = next(p for p in response.json()["food_posts"] if p["id"] == available_food_post["id"])
+        assert post["poster"]["netId"] == available_food_post["posterNetId"]
+        assert post["thumbnail"] == feed_view.thumbnail_url(available_food_post["id"])
+    finally:
+        feed_view.rebuild_job({})
+    assert feed_view.is_ready()
+    assert _entry(available_food_post["id"]) is not None
+
+
+# == GET /api/food/{food_id}/photo ==
+def test_get_food_photo(client, test_user_data):
+    """Tests that the thumbnail reference serves the decoded image bytes."""
+    image_bytes = b"\x89PNG fake image bytes"
+    data = {
+        "foodName": f"Photo Pie {time.time()}", "quantity": 1, "category": "Dessert",
+        "dietaryInfo": "None", "pickupLocation": "C2", "pickupTime": datetime.now().isoformat(),
+        "photo": json.dumps({"uri": "data:image/png;base64," + base64.b64encode(image_bytes).decode()}),
+        "user": test_user_data["netId"],
+        "expirationTime": (datetime.now() + timedelta(hours=1)).isoformat(),
+        "createdAt": datetime.now().isoformat(),
+    }
+    food_id = client.post("/api/food", data={k: str(v) for k, v in data.items()}).json()["food_id"]
+    response = client.get(feed_view.thumbnail_url(food_id))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == image_bytes
+
+
+def test_get_food_photo_not_found(client):
+    """Tests the photo endpoint for unknown posts."""
+    assert client.get(f"/api/food/{str(ObjectId())}/photo").status_code == 404
+    assert client.get("/api/food/invalid-id/photo").status_code == 400
@@ -139,6 +139,17 @@ def test_reserve_food_already_completed(client, completed_food_post, test_user_d
    assert "no longer available" in response.json()["detail"]
 
 
+def test_reserve_food_hidden(client, available_food_post, other_user_data):
+   """Tests that a post hidden by moderation can't be reserved."""
+   from database import get_food_collection
+   get_food_collection().update_one({"_id": ObjectId(available_food_post["id"])}, {"$set": {"hidden": True}})
+   payload = {"food_id": available_food_post["id"], "user": other_user_data["netId"]}
+   response = client.post("/api/food/reserve", json=payload)
+   assert response.status_code == 400
+   assert "no longer available" in response.json()["detail"]
+   assert get_food_collection().find_one({"_id": ObjectId(available_food_post["id"])})["status"] == "green"
+
+
 def test_reserve_food_missing_data(client):
    """Tests reserving with missing user or food_id in payload."""
    payload_no_user = {"food_id": str(ObjectId())}
@@ -329,6 +340,27 @@ def test_get_poster_netid_invalid_id(client):
    response = client.get("/api/food/poster-netid/invalid-id-format")
    assert response.status_code == 400
    assert "Invalid food_id format" in response.json()["detail"]
+
+
+# == POST /api/food/posters ==
+def test_get_poster_netids_batch(client, available_food_post):
+   """Tests resolving poster netIds for several posts in one request."""
+   unknown_id = str(ObjectId())
+   payload = {"food_ids": [available_food_post["id"], unknown_id, "invalid-id-format"]}
+   response = client.post("/api/food/posters", json=payload)
+   assert response.status_code == 200, f"Response: {response.text}"
+   json_response = response.json()
+   assert json_response["posters"] == {available_food_post["id"]: available_food_post["posterNetId"]}
+   assert set(json_response["missing"]) == {unknown_id, "invalid-id-format"}
+
+
+def test_get_poster_netids_batch_too_many_ids(client):
+   """Tests that oversized batches are rejected."""
+   from models import MAX_BATCH_IDS
+   payload = {"food_ids": [str(ObjectId()) for _ in range(MAX_BATCH_IDS + 1)]}
+   response = client.post("/api/food/posters", json=payload)
+   assert response.status_code == 400
+   assert "Too many food ids" in response.json()["detail"]
 def test_post_food_internal_server_error(monkeypatch, client, test_user_data):
    """Forces an internal error during food post creation."""
    def mock_insert_one_fail(*args, **kwargs):
@@ -353,9 +385,9 @@ def test_post_food_internal_server_error(monkeypatch, client, test_user_data):
    assert "unexpected error" in response.json()["detail"].lower()
 
 
-def test_get_food_internal_server_error(monkeypatch, client):
-   from database import get_food_collection
-   monkeypatch.setattr(get_food_collection(), "find", lambda *_: (_ for _ in ()).throw(Exception("DB crash")))
+def test_get_food_internal_server_error(monkeypatch, client, fresh_feed_snapshot):
+   from database import get_feed_view_collection
+   monkeypatch.setattr(get_feed_view_collection(), "find", lambda *_: (_ for _ in ()).throw(Exception("DB crash")))
    response = client.get("/api/food")
    assert response.status_code == 500
    assert "unexpected error" in response.json()["detail"].lower()
@@ -416,7 +448,7 @@ def test_complete_transaction_conflict(monkeypatch, client, reserved_food_post):
 
 
 
-def test_get_food_photo_json_decode_failure(monkeypatch, client, available_food_post):
+def test_get_food_photo_json_decode_failure(monkeypatch, client, available_food_post, fresh_feed_snapshot):
    """If a stored photo field isn’t valid JSON, the endpoint should still return something sensible."""
    from database import get_food_collection
    fake_docs = [{
@@ -433,8 +465,11 @@ def test_get_food_photo_json_decode_failure(monkeypatch, client, available_food_
        "expirationTime": datetime.now(),
        "createdAt": datetime.now()
    }]
-   # make .find() return our fake doc
-   monkeypatch.setattr(get_food_collection(), "find", lambda *args, **kwargs: fake_docs)
+   # make the read model's .find() return the entry built from our fake doc
+   from database import get_feed_view_collection
+   from services import feed_view
+   fake_entries = [feed_view.build_entry(doc, None) for doc in fake_docs]
+   monkeypatch.setattr(get_feed_view_collection(), "find", lambda *args, **kwargs: fake_entries)
    response = client.get("/api/food")
    assert response.status_code == 200
    first = response.json()["food_posts"][0]
@@ -472,8 +507,8 @@ def test_complete_transaction_internal_server_error(monkeypatch, client, reserve
   
 def test_search_food_internal_server_error(monkeypatch, client):
    """If DB.find blows up in /search, should return 500."""
-   from database import get_food_collection
-   monkeypatch.setattr(get_food_collection(), "find", lambda *args, **kw: (_ for _ in ()).throw(Exception()))
+   from database import get_feed_view_collection
+   monkeypatch.setattr(get_feed_view_collection(), "find", lambda *args, **kw: (_ for _ in ()).throw(Exception()))
    resp = client.get("/api/food/search", params={"foodName": "anything"})
    assert resp.status_code == 500
    assert "unexpected error" in resp.json()["detail"].lower()
@@ -0,0 +1,46 @@
+import pytest
+import time
+
+from services import invalidation_bus
+
+
+@pytest.fixture
+def received(monkeypatch):
+    """Registers a throwaway subscriber on the 'user' prefix and records what it sees."""
+    monkeypatch.setattr(invalidation_bus, "_subscribers", {})
+    keys = []
+    invalidation_bus.subscribe("user", keys.append)
+    return keys
+
+
+def test_publish_delivers_locally_by_prefix(received):
+    """Tests that key-level invalidations reach subscribers of the matching prefix only."""
+    invalidation_bus.publish("user:abc123", "feed", "username:xyz")
+    assert received == ["user:abc123"]
+
+
+def test_flush_all_reaches_every_subscriber(received):
+    """Tests that a full flush is delivered as the wildcard key."""
+    invalidation_bus.flush_all("test")
+    assert received == [invalidation_bus.WILDCARD]
+
+
+def test_failing_handler_does_not_block_others(received):
+    """Tests that one broken subscriber does not stop delivery to the rest."""
+    def broken(key):
+        raise RuntimeError("boom")
+    invalidation_bus.subscribe("user", broken)
+    invalidation_bus.subscribe("user", received.append)
+    invalidation_bus.publish("user:abc123")
+    assert received == ["user:abc123", "user:abc123"]
+
+
+def test_propagation_lag_metrics(monkeypatch):
+    """Tests that received messages update the lag metrics."""
+    monkeypatch.setattr(invalidation_bus, "_stats", dict(invalidation_bus._stats, received=0, lag_ms_total=0.0, lag_ms_max=0.0))
+    invalidation_bus._record_receive({"ts": time.time() - 0.05})
+    stats = invalidation_bus.stats()
+    assert stats["received"] == 1
+    assert stats["lag_ms_last"] >= 50
+    assert stats["lag_ms_avg"] == stats["lag_ms_last"]
+    assert stats["lag_ms_max"] >= stats["lag_ms_last"]
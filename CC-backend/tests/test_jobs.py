@@ -0,0 +1,147 @@
+import pytest
+import threading
+import time
+from datetime import datetime, timedelta
+
+from database import get_db
+from services import jobs
+
+
+def _wait_for(job_id, *statuses, timeout=5):
+    """Polls the job document until it reaches one of `statuses` (the app's runner executes it)."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        doc = get_db()[jobs.JOBS_COLLECTION].find_one({"_id": job_id})
+        if doc and doc["status"] in statuses:
+            return doc
+        time.sleep(0.02)
+    pytest.fail(f"Job {job_id} did not reach {statuses} within {timeout}s")
+
+
+@pytest.fixture
+def job_type(client, monkeypatch):
+    """Registers throwaway job types for one test and removes their jobs afterwards."""
+    registered = []
+    def register(name, handler, **options):
+        name = f"test_{name}_{time.time_ns()}"
+        jobs.register(name, handler, **options)
+        registered.append(name)
+        return name
+    yield register
+    for name in registered:
+        jobs._job_types.pop(name, None)
+        get_db()[jobs.JOBS_COLLECTION].delete_many({"type": name})
+
+
+def test_enqueued_job_runs_with_payload(job_type):
+    """Tests that a queued job is leased, run off the request path and marked done."""
+    seen = []
+    name = job_type("record", seen.append)
+    job_id = jobs.enqueue(name, {"foodId": "abc"})
+    doc = _wait_for(job_id, jobs.DONE)
+    assert seen == [{"foodId": "abc"}]
+    assert doc["attempts"] == 1
+    assert doc["finishedAt"] is not None
+
+
+def test_failed_job_is_retried_with_backoff(job_type):
+    """Tests that a failure requeues the job in the future and records the error."""
+    def broken(payload):
+        raise RuntimeError("boom")
+    name = job_type("broken", broken, max_attempts=3)
+    job_id = jobs.enqueue(name)
+    deadline = time.time() + 5
+    doc = None
+    while time.time() < deadline:
+        doc = get_db()[jobs.JOBS_COLLECTION].find_one({"_id": job_id})
+        if doc["attempts"] == 1 and doc["status"] == jobs.QUEUED:
+            break
+        time.sleep(0.02)
+    assert doc["status"] == jobs.QUEUED
+    assert doc["lastError"] == "boom"
+    assert doc["runAt"] > datetime.utcnow()
+
+
+def test_job_fails_after_max_attempts(job_type):
+    def broken(payload):
+        raise RuntimeError("boom")
+    name = job_type("broken_once", broken, max_attempts=1)
+    doc = _wait_for(jobs.enqueue(name), jobs.FAILED)
+    assert doc["attempts"] == 1
+    assert doc["lastError"] == "boom"
+
+
+def test_expired_lease_is_reclaimed(job_type):
+    """Tests that a job whose worker died mid-run is picked up again."""
+    seen = []
+    name = job_type("orphaned", seen.append)
+    now = datetime.utcnow()
+    job_id = get_db()[jobs.JOBS_COLLECTION].insert_one({
+        "type": name, "payload": {"n": 1}, "status": jobs.RUNNING, "attempts": 1, "maxAttempts": 5,
+        "runAt": now - timedelta(minutes=5), "createdAt": now - timedelta(minutes=5),
+        "leaseUntil": now - timedelta(seconds=1), "leasedBy": "dead-worker", "startedAt": now - timedelta(minutes=5),
+    }).inserted_id
+    doc = _wait_for(job_id, jobs.DONE)
+    assert doc["attempts"] == 2
+    assert doc["leasedBy"] == jobs.WORKER_ID
+    assert seen == [{"n": 1}]
+
+
+def test_concurrency_limit_per_type(job_type):
+    """Tests that no more than `concurrency` jobs of one type run at once in a worker."""
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+    def slow(payload):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+    name = job_type("slow", slow, concurrency=2)
+    job_ids = [jobs.enqueue(name) for _ in range(6)]
+    for job_id in job_ids:
+        _wait_for(job_id, jobs.DONE)
+    assert state["peak"] == 2
+
+
+def test_leader_election(client, monkeypatch):
+    """Tests that the scheduler lease can only be taken once the holder's lease expired."""
+    monkeypatch.setattr(jobs, "_is_leader", False)
+    leaders = get_db()[jobs.JOB_LEADERS_COLLECTION]
+    name = f"test_leader_{time.time_ns()}"
+    leaders.insert_one({"_id": name, "holder": "other-worker", "leaseUntil": datetime.utcnow() + timedelta(minutes=1)})
+    try:
+        assert jobs.try_become_leader(name) is False
+        leaders.update_one({"_id": name}, {"$set": {"leaseUntil": datetime.utcnow() - timedelta(seconds=1)}})
+        assert jobs.try_become_leader(name) is True
+        assert leaders.find_one({"_id": name})["holder"] == jobs.WORKER_ID
+    finally:
+        leaders.delete_one({"_id": name})
+
+
+def test_backoff_is_exponential_and_capped():
+    assert jobs.JOB_BACKOFF_BASE <= jobs.backoff_seconds(1) <= 2 * jobs.JOB_BACKOFF_BASE
+    assert jobs.backoff_seconds(3) >= 4 * jobs.JOB_BACKOFF_BASE
+    assert jobs.backoff_seconds(100) <= jobs.JOB_BACKOFF_MAX + jobs.JOB_BACKOFF_BASE
+
+
+def test_queue_stats_reports_depth(job_type):
+    """Tests the data behind `python -m services.jobs stats`."""
+    name = job_type("future", lambda payload: None)
+    jobs.enqueue(name, run_at=datetime.utcnow() + timedelta(hours=1))
+    stats = jobs.queue_stats()
+    assert stats["depth"][name] == {jobs.QUEUED: 1}
+
+
+def test_periodic_job_enqueued_once_per_interval(job_type, monkeypatch):
+    """Tests that the leader enqueues a periodic job once per interval, however often it ticks."""
+    monkeypatch.setattr(jobs, "_periodic", {})
+    name = job_type("periodic", lambda payload: None)
+    jobs.every(3600, name)
+    try:
+        jobs.schedule_periodic()
+        jobs.schedule_periodic()
+        assert get_db()[jobs.JOBS_COLLECTION].count_documents({"type": name}) == 1
+    finally:
+        get_db()[jobs.JOB_SCHEDULES_COLLECTION].delete_one({"_id": name})
@@ -4,6 +4,8 @@ from bson import ObjectId
 import time
 from datetime import datetime
 
+from services import counters
+
 # == POST /api/report ==
 def test_submit_report_success(client, available_food_post, other_user_data):
     """Tests successfully submitting a report."""
@@ -29,7 +31,8 @@ def test_submit_report_success(client, available_food_post, other_user_data):
     assert "report_id" in json_response
     assert ObjectId.is_valid(json_response["report_id"])
 
-    # Verify report count incremented in DB
+    # Verify report count incremented in DB (once the write-behind counter is flushed)
+    counters.flush_all()
     item_after = food_collection.find_one({"_id": ObjectId(food_id)})
     assert item_after is not None
     assert item_after.get("reportCount", 0) == initial_count + 1
@@ -157,6 +160,195 @@ def test_update_report_status_missing_data(client, reported_food_post):
     assert any(d['loc'] == ['body', 'admin_id'] for d in response.json()["detail"])
 
 
+# == GET /api/report/queue ==
+def _seed_reports(reported_user, posts):
+    """Inserts pending reports against `reported_user`; `posts` maps postId -> number of reports."""
+    from database import report_collection
+    base = datetime(2024, 1, 1, 12, 0, 0)
+    docs = []
+    for post_index, (post_id, count) in enumerate(posts.items()):
+        for i in range(count):
+            docs.append({
+                "postId": post_id, "user1ID": f"reporter_{i}", "user2ID": reported_user,
+                "message": f"This is a test report {post_id} {i}", "isSubmitted": True,
+                "submittedAt": base.replace(minute=post_index * 10 + i), "reviewStatus": "pending",
+                "reviewedBy": None, "reviewedAt": None,
+            })
+    report_collection.insert_many(docs)
+    return docs
+
+def test_moderation_queue_pages_with_cursor(client):
+    """Tests that the queue pages newest first with no overlap or gaps."""
+    reported_user = f"queue_user_{time.time()}"
+    docs = _seed_reports(reported_user, {f"{reported_user}_a": 3, f"{reported_user}_b": 2})
+    seen, cursor = [], None
+    while True:
+        params = {"reportedUser": reported_user, "limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/api/report/queue", params=params)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        seen.extend(page["reports"])
+        cursor = page["nextCursor"]
+        if cursor is None:
+            break
+    assert len(seen) == len(docs)
+    assert len({report["id"] for report in seen}) == len(docs)
+    assert [report["submittedAt"] for report in seen] == sorted((report["submittedAt"] for report in seen), reverse=True)
+
+def test_moderation_queue_filters(client):
+    reported_user = f"queue_user_{time.time()}"
+    _seed_reports(reported_user, {f"{reported_user}_a": 3})
+    params = {"reportedUser": reported_user, "since": "2024-01-01T12:01:00", "until": "2024-01-01T12:02:00"}
+    reports = client.get("/api/report/queue", params=params).json()["reports"]
+    assert [report["submittedAt"] for report in reports] == ["2024-01-01T12:01:00"]
+    assert client.get("/api/report/queue", params={"reportedUser": reported_user, "reviewStatus": "resolved"}).json()["reports"] == []
+    assert len(client.get("/api/report/queue", params={"reportedUser": reported_user, "reviewStatus": "all"}).json()["reports"]) == 3
+    assert client.get("/api/report/queue", params={"reviewStatus": "bogus"}).status_code == 400
+    assert client.get("/api/report/queue", params={"cursor": "garbage"}).status_code == 400
+
+def test_moderation_queue_grouped_by_post(client):
+    """Tests that the grouped view returns one row per post, most reported first."""
+    reported_user = f"queue_user_{time.time()}"
+    _seed_reports(reported_user, {f"{reported_user}_few": 1, f"{reported_user}_many": 4, f"{reported_user}_some": 2})
+    response = client.get("/api/report/queue/posts", params={"reportedUser": reported_user})
+    assert response.status_code == 200, response.text
+    posts = response.json()["posts"]
+    assert [post["postId"] for post in posts] == [f"{reported_user}_many", f"{reported_user}_some", f"{reported_user}_few"]
+    worst = posts[0]
+    assert worst["reportCount"] == 4
+    assert sorted(worst["reporters"]) == ["reporter_0", "reporter_1", "reporter_2", "reporter_3"] and worst["reporterCount"] == 4
+    assert worst["firstSubmittedAt"] == "2024-01-01T12:10:00" and worst["lastSubmittedAt"] == "2024-01-01T12:13:00"
+    assert worst["reportedUser"] == reported_user
+
+    second_page = client.get("/api/report/queue/posts", params={"reportedUser": reported_user, "skip": 1, "limit": 1}).json()["posts"]
+    assert [post["postId"] for post in second_page] == [f"{reported_user}_some"]
+
+
+# == GET /api/reports/enriched ==
+def test_enriched_reports_join_post_and_users(client, reported_food_post, test_user_data, other_user_data):
+    """Tests that each report carries its post and both users, without the photo payload."""
+    response = client.get("/api/reports/enriched", params={"reportedUser": reported_food_post["posterNetId"]})
+    assert response.status_code == 200, response.text
+    report = next(r for r in response.json()["reports"] if r["id"] == reported_food_post["reportId"])
+    assert report["post"]["id"] == reported_food_post["foodId"]
+    assert report["post"]["thumbnail"] == f"/api/food/{reported_food_post['foodId']}/photo"
+    assert "photo" not in report["post"]
+    assert report["reporter"]["netId"] == other_user_data["netId"]
+    assert report["reportedUser"]["netId"] == test_user_data["netId"]
+    assert "password" not in report["reporter"]
+
+def test_enriched_reports_page_with_cursor_and_missing_refs(client):
+    """Tests cursor paging and that reports whose post or users are gone still come back."""
+    reported_user = f"queue_user_{time.time()}"
+    docs = _seed_reports(reported_user, {str(ObjectId()): 2, "not-an-object-id": 1})
+    first = client.get("/api/reports/enriched", params={"reportedUser": reported_user, "limit": 2}).json()
+    assert len(first["reports"]) == 2 and first["nextCursor"]
+    second = client.get("/api/reports/enriched", params={"reportedUser": reported_user, "limit": 2, "cursor": first["nextCursor"]}).json()
+    reports = first["reports"] + second["reports"]
+    assert len({report["id"] for report in reports}) == len(docs) and second["nextCursor"] is None
+    assert all(report["post"] is None and report["reporter"] is None and report["reportedUser"] is None for report in reports)
+    assert client.get("/api/reports/enriched", params={"cursor": "garbage"}).status_code == 400
+
+def test_enriched_reports_single_aggregation(monkeypatch, client, reported_food_post):
+    """Tests that a page is one aggregation on reports and no per-report lookups."""
+    from services import moderation
+    calls = []
+    class _Reports:
+        def __init__(self, collection):
+            self.collection = collection
+        def aggregate(self, pipeline):
+            calls.append(pipeline)
+            return self.collection.aggregate(pipeline)
+    monkeypatch.setattr(moderation, "get_report_collection", lambda real=moderation.get_report_collection(): _Reports(real))
+    response = client.get("/api/reports/enriched", params={"reportedUser": reported_food_post["posterNetId"]})
+    assert response.status_code == 200
+    assert len(calls) == 1
+    lookups = [stage["$lookup"] for stage in calls[0] if "$lookup" in stage]
+    assert len(lookups) == 3
+    assert all("photo" not in stage["pipeline"][0]["$project"] for stage in lookups)
+
+
+# == PUT /api/report/bulk ==
+def _report(client, food_id, reporter, poster):
+    payload = {"postId": food_id, "message": f"This is a test report {time.time()}", "user1Id": reporter, "user2Id": poster}
+    response = client.post("/api/report", data=payload)
+    assert response.status_code == 200
+    return response.json()["report_id"]
+
+def test_bulk_update_reports_by_ids(client, reported_food_post, test_user_data):
+    """Tests applying one status to a list of report ids."""
+    from database import report_collection
+    second_id = _report(client, reported_food_post["foodId"], f"bulk_reporter_{time.time()}", test_user_data["netId"])
+    payload = {"status": "dismissed", "admin_id": "admin_bulk", "report_ids": [reported_food_post["reportId"], second_id]}
+    response = client.put("/api/report/bulk", json=payload)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 2, "modified": 2, "hiddenPosts": 0}
+    for report_id in (reported_food_post["reportId"], second_id):
+        report = report_collection.find_one({"_id": ObjectId(report_id)})
+        assert report["reviewStatus"] == "dismissed"
+        assert report["reviewedBy"] == "admin_bulk"
+
+def test_bulk_update_reports_by_filter_hides_posts(client, reported_food_post, test_user_data):
+    """Tests resolving every pending report on a post and cascading to hide it from the feed."""
+    from database import report_collection, food_collection
+    from services import feed_snapshot, feed_view
+    food_id = reported_food_post["foodId"]
+    _report(client, food_id, f"bulk_reporter_{time.time()}", test_user_data["netId"])
+    payload = {
+        "status": "action_taken", "admin_id": "admin_bulk",
+        "filter": {"postId": food_id, "reviewStatus": "pending"}, "hide_posts": True,
+    }
+    response = client.put("/api/report/bulk", json=payload)
+    assert response.status_code == 200, response.text
+    assert response.json() == {"matched": 2, "modified": 2, "hiddenPosts": 1}
+    assert report_collection.count_documents({"postId": food_id, "reviewStatus": "pending"}) == 0
+    food = food_collection.find_one({"_id": ObjectId(food_id)})
+    assert food["hidden"] is True and food["hiddenBy"] == "admin_bulk"
+    assert feed_view.get_feed_view_collection().find_one({"_id": ObjectId(food_id)}) is None
+    feed_snapshot.invalidate() # Don't race the debounced rebuild
+    assert all(item["id"] != food_id for item in client.get("/api/food").json()["food_posts"])
+
+    # Nothing pending is left, and the post stays hidden without being counted again
+    response = client.put("/api/report/bulk", json=payload)
+    assert response.json() == {"matched": 0, "modified": 0, "hiddenPosts": 0}
+
+def test_bulk_hide_announces_only_newly_hidden_posts(client, monkeypatch, reported_food_post, test_user_data):
+    """Tests that PostsHidden lists only the posts the bulk update hid, not those hidden earlier."""
+    from database import food_collection
+    from services import events
+    already_hidden = reported_food_post["foodId"]
+    food_collection.update_one({"_id": ObjectId(already_hidden)}, {"$set": {"hidden": True, "hiddenBy": "earlier_admin"}})
+    other = str(food_collection.insert_one({"foodName": "Bulk Stew", "status": "green", "postedBy": test_user_data["netId"], "reservedBy": "None"}).inserted_id)
+    other_report = _report(client, other, f"bulk_reporter_{time.time()}", test_user_data["netId"])
+    announced = []
+    emit = events.emit
+    def recording(event):
+        if isinstance(event, events.PostsHidden) and event.hiddenBy == "admin_bulk":
+            announced.append(event.foodIds)
+        emit(event)
+    monkeypatch.setattr(events, "emit", recording)
+
+    payload = {"status": "action_taken", "admin_id": "admin_bulk", "report_ids": [reported_food_post["reportId"], other_report], "hide_posts": True}
+    response = client.put("/api/report/bulk", json=payload)
+    assert response.json()["hiddenPosts"] == 1
+    assert announced == [[other]]
+    assert food_collection.find_one({"_id": ObjectId(already_hidden)})["hiddenBy"] == "earlier_admin"
+
+@pytest.mark.parametrize("payload, detail", [
+    ({"status": "resolved", "admin_id": "admin_bulk"}, "report_ids or a non-empty filter"),
+    ({"status": "resolved", "admin_id": "admin_bulk", "filter": {}}, "report_ids or a non-empty filter"),
+    ({"status": "bogus", "admin_id": "admin_bulk", "report_ids": [str(ObjectId())]}, "Invalid status value"),
+    ({"status": "resolved", "admin_id": "admin_bulk", "report_ids": ["not-an-id"]}, "Invalid report_id format"),
+    ({"status": "resolved", "admin_id": "admin_bulk", "report_ids": [str(ObjectId()) for _ in range(501)]}, "Too many report ids"),
+])
+def test_bulk_update_reports_rejects_bad_requests(client, payload, detail):
+    response = client.put("/api/report/bulk", json=payload)
+    assert response.status_code == 400
+    assert detail in response.json()["detail"]
+
+
 # == GET /api/report/can-report/{post_id}/{user_id} ==
 def test_can_report_success(client, available_food_post, other_user_data):
     """Tests if a user (who hasn't reported) can report a post (not their own)."""
@@ -198,6 +390,40 @@ def test_can_report_invalid_post_id(client, test_user_data):
     assert response.status_code == 400
     assert "Invalid post_id format" in response.json()["detail"]
 
+
+# == POST /api/report/can-report ==
+def test_can_report_batch(client, reported_food_post, test_user_data, other_user_data):
+    """Tests batch eligibility for own, already reported, missing and invalid posts."""
+    from database import get_food_collection
+    other_post_id = str(get_food_collection().insert_one({
+        "foodName": "Batch Report Target", "postedBy": test_user_data["netId"], "status": "green"
+    }).inserted_id)
+    missing_post_id = str(ObjectId())
+    payload = {
+        "user_id": other_user_data["netId"],
+        "post_ids": [reported_food_post["foodId"], other_post_id, missing_post_id, "invalid-post-id"],
+    }
+    response = client.post("/api/report/can-report", json=payload)
+    assert response.status_code == 200, f"Response: {response.text}"
+    results = response.json()["results"]
+    assert results[reported_food_post["foodId"]] == {"canReport": False, "reason": "You have already reported this post"}
+    assert results[other_post_id] == {"canReport": True, "reason": None}
+    assert results[missing_post_id] == {"canReport": False, "reason": "Food post not found"}
+    assert results["invalid-post-id"] == {"canReport": False, "reason": "Invalid post_id format"}
+
+    # The poster can never report their own post
+    payload = {"user_id": test_user_data["netId"], "post_ids": [other_post_id]}
+    response = client.post("/api/report/can-report", json=payload)
+    assert response.json()["results"][other_post_id] == {"canReport": False, "reason": "You cannot report your own post"}
+
+def test_can_report_batch_too_many_ids(client, test_user_data):
+    """Tests that oversized batches are rejected."""
+    from models import MAX_BATCH_IDS
+    payload = {"user_id": test_user_data["netId"], "post_ids": [str(ObjectId()) for _ in range(MAX_BATCH_IDS + 1)]}
+    response = client.post("/api/report/can-report", json=payload)
+    assert response.status_code == 400
+    assert "Too many post ids" in response.json()["detail"]
+
 # == GET /api/test-report ==
 def test_get_test_report_endpoint(client):
     """Tests the endpoint that creates and returns a test report."""
@@ -219,22 +445,12 @@ def test_get_test_report_endpoint(client):
 
 from database import get_report_collection, get_food_collection
 
-# 1) submit_report → “failed to increment reportCount” branch (matched_count == 0)
-def test_submit_report_reportcount_no_match(monkeypatch, client, available_food_post, other_user_data):
-    """If update_one.matched_count == 0, we hit the logging branch but still return 200."""
+# 1) submit_report → post gone after the report insert
+def test_submit_report_post_deleted_before_count(monkeypatch, client, available_food_post, other_user_data):
+    """If the post disappears between the report insert and the existence check, the report is removed and we return 404."""
     report_db = get_report_collection()
     food_db = get_food_collection()
-
-    # stub insert_one to succeed
-    class DummyInsert:
-        inserted_id = ObjectId()
-    monkeypatch.setattr(report_db, "insert_one", lambda doc: DummyInsert())
-
-    # stub update_one to say “no matching doc”
-    class DummyUpdate:
-        matched_count = 0
-        modified_count = 0
-    monkeypatch.setattr(food_db, "update_one", lambda *args, **kwargs: DummyUpdate())
+    monkeypatch.setattr(food_db, "find_one", lambda *args, **kwargs: None)
 
     payload = {
         "postId": available_food_post["id"],
@@ -244,10 +460,44 @@ def test_submit_report_reportcount_no_match(monkeypatch, client, available_food_
     }
 
     resp = client.post("/api/report", data=payload)
-    assert resp.status_code == 200
-    body = resp.json()
-    assert body["message"] == "Report submitted successfully"
-    assert ObjectId.is_valid(body["report_id"])
+    assert resp.status_code == 404
+    assert report_db.find_one({"postId": available_food_post["id"], "user1ID": other_user_data["netId"]}) is None
+
+
+def test_submit_report_duplicate_conflict(client, reported_food_post):
+    """A second report by the same user on the same post is rejected by the unique index."""
+    payload = {
+        "postId": reported_food_post["foodId"],
+        "message": f"Again {time.time()}",
+        "user1Id": reported_food_post["reporterNetId"],
+        "user2Id": reported_food_post["posterNetId"],
+    }
+    resp = client.post("/api/report", data=payload)
+    assert resp.status_code == 409
+    assert resp.json()["detail"] == "You have already reported this post"
+    counters.flush_all()
+    food = get_food_collection().find_one({"_id": ObjectId(reported_food_post["foodId"])})
+    assert food["reportCount"] == 1 # Not counted twice
+    assert get_report_collection().count_documents({"postId": reported_food_post["foodId"]}) == 1
+
+
+def test_submit_report_auto_hides_at_threshold(monkeypatch, client, available_food_post):
+    """The report that reaches REPORT_HIDE_THRESHOLD hides the post from the feed."""
+    from services import feed_snapshot, feed_view, moderation
+    monkeypatch.setattr(moderation, "REPORT_HIDE_THRESHOLD", 3)
+    food_id = available_food_post["id"]
+    for i in range(4):
+        payload = {"postId": food_id, "message": f"This is a test report {i}", "user1Id": f"threshold_reporter_{i}_{time.time()}", "user2Id": available_food_post["posterNetId"]}
+        assert client.post("/api/report", data=payload).status_code == 200
+        counters.flush_all() # The count and the threshold check land with the flush
+        food = get_food_collection().find_one({"_id": ObjectId(food_id)})
+        assert food["reportCount"] == i + 1
+        assert food.get("hidden", False) is (i >= 2)
+    assert food["hiddenBy"] == moderation.AUTO_HIDDEN_BY
+    assert isinstance(food["hiddenAt"], datetime)
+    assert feed_view.get_feed_view_collection().find_one({"_id": ObjectId(food_id)}) is None
+    feed_snapshot.invalidate() # Don't race the debounced rebuild
+    assert all(item["id"] != food_id for item in client.get("/api/food").json()["food_posts"])
 
 
 #  submit_report → internal exception path (insert_one throws)
@@ -0,0 +1,96 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_report_collection
+from services import counters, reputation
+
+
+def _reputation(client, net_id):
+    counters.flush_all()
+    response = client.get(f"/api/users/reputation/{net_id}")
+    assert response.status_code == 200
+    return response.json()
+
+
+def _report(client, food_id, poster):
+    payload = {"postId": food_id, "message": f"This is a test report {time.time()}", "user1Id": f"rep_reporter_{time.time()}", "user2Id": poster}
+    response = client.post("/api/report", data=payload)
+    assert response.status_code == 200
+    return response.json()["report_id"]
+
+
+def test_unknown_user_has_clean_reputation(client):
+    assert _reputation(client, f"nobody_{time.time()}")["reportsReceived"] == 0
+
+
+def test_reports_and_reviews_update_reputation(client, available_food_post):
+    """Tests that filing counts against the reported user, and only upheld reviews count as resolved against."""
+    poster = f"rep_poster_{time.time()}"
+    first, second = _report(client, available_food_post["id"], poster), _report(client, available_food_post["id"], poster)
+    assert _reputation(client, poster)["reportsReceived"] == 2
+
+    client.put(f"/api/report/{first}", data={"status": "resolved", "admin_id": "admin_rep"})
+    assert _reputation(client, poster)["reportsResolvedAgainst"] == 1
+    client.put(f"/api/report/{first}", data={"status": "action_taken", "admin_id": "admin_rep"}) # Still upheld
+    assert _reputation(client, poster)["reportsResolvedAgainst"] == 1
+    client.put(f"/api/report/{first}", data={"status": "dismissed", "admin_id": "admin_rep"}) # Overturned
+    assert _reputation(client, poster)["reportsResolvedAgainst"] == 0
+
+    response = client.put("/api/report/bulk", json={"status": "resolved", "admin_id": "admin_rep", "report_ids": [first, second]})
+    assert response.status_code == 200
+    assert _reputation(client, poster) == {
+        "netId": poster, "reportsReceived": 2, "reportsResolvedAgainst": 2, "handoffsGiven": 0, "handoffsReceived": 0,
+    }
+
+
+def test_completed_handoff_counts_for_both_sides(client, reserved_food_post):
+    poster, reserver = reserved_food_post["posterNetId"], reserved_food_post["reserverNetId"]
+    before = reputation.get_many([poster, reserver])
+    client.post("/api/food/complete", data={"food_id": reserved_food_post["id"], "user": reserver})
+    counters.flush_all()
+    after = client.post("/api/users/reputation", json={"net_ids": [poster, reserver]}).json()["reputations"]
+    assert after[poster]["handoffsGiven"] == before[poster]["handoffsGiven"] + 1
+    assert after[reserver]["handoffsReceived"] == before[reserver]["handoffsReceived"] + 1
+
+
+def test_claim_handoffs_count_for_every_claimer(client, test_user_data, other_user_data):
+    """Tests that each picked-up claim is a handoff received, and the post one handoff given once all are."""
+    poster, claimer = test_user_data["netId"], other_user_data["netId"]
+    now = datetime.now()
+    item = {
+        "foodName": "Reputation Cookies", "quantity": 2, "category": "Snack", "dietaryInfo": "None",
+        "pickupLocation": "Library", "pickupTime": now.isoformat(), "photo": {"uri": "data:image/jpeg;base64,abc"},
+        "user": poster, "expirationTime": (now + timedelta(hours=1)).isoformat(),
+    }
+    food_id = client.post("/api/food/bulk", json=[item]).json()["results"][0]["food_id"]
+    counters.flush_all()
+    before, recount_before = reputation.get_many([poster, claimer]), reputation.compute()
+    claims = [client.post("/api/food/claim", json={"food_id": food_id, "user": user, "units": 1}).json()
+              for user in (claimer, poster)]
+    for claim, user in zip(claims, (claimer, poster)):
+        client.post("/api/food/claim/complete", json={"food_id": food_id, "claim_id": claim["claim_id"], "user": user})
+    counters.flush_all()
+    after = reputation.get_many([poster, claimer])
+    assert after[claimer]["handoffsReceived"] == before[claimer]["handoffsReceived"] + 1
+    assert after[poster]["handoffsReceived"] == before[poster]["handoffsReceived"] + 1
+    assert after[poster]["handoffsGiven"] == before[poster]["handoffsGiven"] + 1
+    recount_after = reputation.compute() # The recount moves the same way
+    for net_id in (poster, claimer):
+        for field in ("handoffsGiven", "handoffsReceived"):
+            assert recount_after[net_id][field] - recount_before.get(net_id, {}).get(field, 0) == after[net_id][field] - before[net_id][field]
+
+
+def test_reconcile_corrects_drift(client, reported_food_post):
+    poster = reported_food_post["posterNetId"]
+    counters.flush_all()
+    reputation.get_reputation_collection().update_one({"_id": poster}, {"$set": {"reportsReceived": 1000}}, upsert=True)
+    assert reputation.reconcile()["corrected"] >= 1
+    assert reputation.get(poster)["reportsReceived"] == get_report_collection().count_documents({"user2ID": poster})
+    assert reputation.reconcile()["corrected"] == 0
+
+
+def test_reputation_batch_limit(client):
+    response = client.post("/api/users/reputation", json={"net_ids": [f"user_{i}" for i in range(501)]})
+    assert response.status_code == 400
@@ -0,0 +1,103 @@
+import pytest
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_food_collection, get_feed_view_collection
+from services import reservation_holds
+
+
+def _expire_hold(food_id):
+    """Moves a hold's deadline into the past without waiting for it."""
+    get_food_collection().update_one({"_id": ObjectId(food_id)}, {"$set": {"holdUntil": datetime.now() - timedelta(seconds=1)}})
+
+
+def _wait_for_status(food_id, status, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        food = get_food_collection().find_one({"_id": ObjectId(food_id)})
+        if food["status"] == status:
+            return food
+        time.sleep(0.02)
+    pytest.fail(f"Food {food_id} did not become {status} within {timeout}s")
+
+
+@pytest.fixture
+def isolated_schedule(monkeypatch):
+    monkeypatch.setattr(reservation_holds, "_heap", [])
+    monkeypatch.setattr(reservation_holds, "_deadlines", {})
+    monkeypatch.setattr(reservation_holds, "_loop", None) # Keep the app's timer out of it
+
+
+def test_reserve_sets_hold_deadline(client, available_food_post, other_user_data):
+    """Tests that a reservation carries a deadline and is scheduled for release."""
+    response = client.post("/api/food/reserve", json={"food_id": available_food_post["id"], "user": other_user_data["netId"]})
+    assert response.status_code == 200
+    hold_until = datetime.fromisoformat(response.json()["holdUntil"])
+    food = get_food_collection().find_one({"_id": ObjectId(available_food_post["id"])})
+    assert abs((food["holdUntil"] - hold_until).total_seconds()) < 0.01
+    assert available_food_post["id"] in reservation_holds._deadlines
+
+
+def test_release_expired_hold(client, drain_events, reserved_food_post):
+    """Tests that an expired hold returns the post to green everywhere and notifies the poster."""
+    food_id = reserved_food_post["id"]
+    drain_events() # The reservation's activity entry comes first
+    _expire_hold(food_id)
+    assert reservation_holds.release(food_id) is True
+
+    food = get_food_collection().find_one({"_id": ObjectId(food_id)})
+    assert food["status"] == "green"
+    assert food["reservedBy"] == "None" and "holdUntil" not in food # Same placeholder as a never-reserved post
+    assert get_feed_view_collection().find_one({"_id": ObjectId(food_id)})["available"] is True
+
+    activity = client.get("/api/food/activity", params={"foodId": food_id}).json()["activity"]
+    assert (activity[0]["action"], activity[0]["to"]) == ("expired", "green")
+
+    deadline = time.time() + 5
+    notified = []
+    while time.time() < deadline and not notified:
+        notified = client.get(f"/api/users/notifications/{reserved_food_post['posterNetId']}").json()["notifications"]
+        time.sleep(0.02)
+    assert notified[0]["kind"] == "reservation_expired"
+    assert notified[0]["data"]["foodId"] == food_id
+
+
+def test_release_is_noop_before_deadline(client, reserved_food_post):
+    assert reservation_holds.release(reserved_food_post["id"]) is False
+    assert get_food_collection().find_one({"_id": ObjectId(reserved_food_post["id"])})["status"] == "yellow"
+
+
+def test_release_loses_to_completion(client, completed_food_post):
+    """Tests that the conditional update never reopens a completed post."""
+    get_food_collection().update_one({"_id": ObjectId(completed_food_post["id"])}, {"$set": {"holdUntil": datetime.now() - timedelta(seconds=1)}})
+    assert reservation_holds.release(completed_food_post["id"]) is False
+    assert get_food_collection().find_one({"_id": ObjectId(completed_food_post["id"])})["status"] == "red"
+
+
+def test_timer_releases_hold_when_due(client, available_food_post, other_user_data, monkeypatch):
+    """Tests the scheduler end to end: a short hold expires without any sweep."""
+    monkeypatch.setattr(reservation_holds, "RESERVATION_HOLD_SECONDS", 0.2)
+    response = client.post("/api/food/reserve", json={"food_id": available_food_post["id"], "user": other_user_data["netId"]})
+    assert response.status_code == 200
+    _wait_for_status(available_food_post["id"], "green")
+
+
+def test_sweep_releases_holds_unknown_to_this_worker(client, reserved_food_post):
+    """Tests that the periodic sweep covers holds scheduled by a worker that died."""
+    reservation_holds.cancel(reserved_food_post["id"])
+    _expire_hold(reserved_food_post["id"])
+    assert reservation_holds.release_expired() >= 1
+    assert get_food_collection().find_one({"_id": ObjectId(reserved_food_post["id"])})["status"] == "green"
+
+
+def test_schedule_discards_cancelled_and_rescheduled_entries(isolated_schedule):
+    now = datetime.now()
+    reservation_holds.schedule("a", now + timedelta(hours=1))
+    reservation_holds.schedule("b", now + timedelta(hours=2))
+    reservation_holds.schedule("c", now + timedelta(hours=3))
+    reservation_holds.cancel("b")
+    reservation_holds.schedule("c", now + timedelta(hours=5)) # Re-reserved with a new deadline
+    assert reservation_holds._pop_due(now + timedelta(hours=4)) == ["a"]
+    assert reservation_holds.pending() == 1
+    assert reservation_holds._next_deadline() == now + timedelta(hours=5)
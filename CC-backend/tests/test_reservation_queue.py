@@ -0,0 +1,115 @@
+import pytest
+import asyncio
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_food_collection
+from services import reservation_holds, reservation_queue
+
+
+@pytest.fixture
+def contention_mode(client, monkeypatch):
+    monkeypatch.setattr(reservation_queue, "RESERVATION_QUEUE_ENABLED", True)
+    monkeypatch.setattr(reservation_queue, "_queues", {})
+    monkeypatch.setattr(reservation_queue, "_stats", dict.fromkeys(reservation_queue._stats, 0))
+
+
+def _reserve(client, food_id, user):
+    return client.post("/api/food/reserve", json={"food_id": food_id, "user": user})
+
+
+def test_losers_get_waitlist_positions(client, contention_mode, available_food_post):
+    """Tests that after the winner, reservers are told their place in line without extra DB round trips."""
+    food_id = available_food_post["id"]
+    assert _reserve(client, food_id, "winner").status_code == 200
+
+    second = _reserve(client, food_id, "second")
+    third = _reserve(client, food_id, "third")
+    assert second.status_code == 202 and second.json()["position"] == 1
+    assert third.status_code == 202 and third.json()["position"] == 2
+    # Winner: one update. The first reservation fully tracked locally, so nobody after it touched the DB
+    assert reservation_queue._stats["db_attempts"] == 1
+
+    response = client.get(f"/api/food/{food_id}/queue", params={"user": "third"})
+    assert response.json()["position"] == 2
+
+
+def test_leave_queue(client, contention_mode, available_food_post):
+    food_id = available_food_post["id"]
+    _reserve(client, food_id, "winner")
+    _reserve(client, food_id, "second")
+    _reserve(client, food_id, "third")
+    assert client.delete(f"/api/food/{food_id}/queue", params={"user": "second"}).status_code == 200
+    assert client.get(f"/api/food/{food_id}/queue", params={"user": "third"}).json()["position"] == 1
+    assert client.delete(f"/api/food/{food_id}/queue", params={"user": "second"}).status_code == 404
+
+
+def test_released_hold_promotes_next_in_line(client, contention_mode, available_food_post):
+    """Tests that an expired hold goes to the head of the waitlist, not back to the crowd."""
+    food_id = available_food_post["id"]
+    _reserve(client, food_id, "winner")
+    _reserve(client, food_id, "second")
+    _reserve(client, food_id, "third")
+
+    get_food_collection().update_one({"_id": ObjectId(food_id)}, {"$set": {"holdUntil": datetime.now() - timedelta(seconds=1)}})
+    assert reservation_holds.release(food_id) is True
+
+    deadline = time.time() + 5
+    food = None
+    while time.time() < deadline:
+        food = get_food_collection().find_one({"_id": ObjectId(food_id)})
+        if food.get("reservedBy") == "second":
+            break
+        time.sleep(0.02)
+    assert food["status"] == "yellow" and food["reservedBy"] == "second"
+    assert client.get(f"/api/food/{food_id}/queue", params={"user": "third"}).json()["position"] == 1
+
+
+def test_reservation_on_taken_post_outside_queue(client, contention_mode, reserved_food_post):
+    """Tests that a post reserved before contention mode was seen still puts reservers in line."""
+    response = _reserve(client, reserved_food_post["id"], "late")
+    assert response.status_code == 202
+    assert response.json()["position"] == 1
+
+
+def test_completed_post_closes_queue(client, contention_mode, completed_food_post):
+    response = _reserve(client, completed_food_post["id"], "late")
+    assert response.status_code == 400
+
+
+def test_concurrent_reservers_are_admitted_fairly(client, contention_mode, available_food_post):
+    """Tests that a burst of reservers yields one winner and a gap-free line in arrival order."""
+    food_id = available_food_post["id"]
+
+    async def burst():
+        return await asyncio.gather(*(reservation_queue.reserve(food_id, f"user{i}") for i in range(50)))
+
+    results = asyncio.run(burst())
+    winners = [i for i, r in enumerate(results) if r["status"] == reservation_queue.RESERVED]
+    assert winners == [0]
+    assert [r["position"] for r in results[1:]] == list(range(1, 50))
+    assert reservation_queue._stats["db_attempts"] <= 2
+
+
+def test_invalidation_from_another_thread_runs_on_the_loop(client, contention_mode, monkeypatch):
+    """Tests that the bus tailer's invalidations touch the queues only on the event loop that owns them."""
+    import threading
+    loop_thread = client.portal.call(threading.get_ident)
+    ran_on, done = [], threading.Event()
+    invalidate = reservation_queue._invalidate
+    food_id = str(ObjectId())
+    def recording(key, own_change):
+        invalidate(key, own_change)
+        if key == f"food:{food_id}": # Not invalidations left over from other tests
+            ran_on.append(threading.get_ident())
+            done.set()
+    monkeypatch.setattr(reservation_queue, "_invalidate", recording)
+    reservation_queue._queues[food_id] = reservation_queue.PostQueue()
+
+    tailer = threading.Thread(target=reservation_queue._on_food_invalidated, args=(f"food:{food_id}",))
+    tailer.start()
+    tailer.join()
+    assert done.wait(5)
+    assert ran_on == [loop_thread]
+    assert food_id not in reservation_queue._queues # No waitlist: forgotten
@@ -0,0 +1,49 @@
+import pytest
+
+from services.shared_snapshot import SharedSnapshotSegment
+
+
+@pytest.fixture
+def segment_path(tmp_path):
+    return str(tmp_path / "feed-segment")
+
+
+def test_single_builder_elected(segment_path):
+    """Tests that only one worker can hold the builder role at a time."""
+    worker_a = SharedSnapshotSegment(segment_path)
+    worker_b = SharedSnapshotSegment(segment_path)
+    assert worker_a.try_become_builder()
+    assert not worker_b.try_become_builder()
+    worker_a.release()
+    assert worker_b.try_become_builder()
+    worker_b.release()
+
+
+def test_publish_and_read_zero_copy(segment_path):
+    """Tests that readers map the published bytes and see the builder's version."""
+    builder = SharedSnapshotSegment(segment_path)
+    reader = SharedSnapshotSegment(segment_path)
+    assert reader.read() is None
+
+    assert builder.publish(b'{"food_posts":[]}', b"gz-1", count=0) == 1
+    snapshot = reader.read()
+    assert snapshot.version == 1
+    assert isinstance(snapshot.identity, memoryview)
+    assert bytes(snapshot.identity) == b'{"food_posts":[]}'
+    assert bytes(snapshot.gzipped) == b"gz-1"
+    assert reader.read() is snapshot # No remap while the segment is unchanged
+
+    assert builder.publish(b'{"food_posts":[{}]}', b"gz-2", count=1) == 2
+    updated = reader.read()
+    assert updated.version == 2 and updated.count == 1
+    assert bytes(snapshot.identity) == b'{"food_posts":[]}' # Old mapping stays intact
+
+
+def test_rebuild_request_marker(segment_path):
+    """Tests that a non-builder write is seen once by the builder."""
+    builder = SharedSnapshotSegment(segment_path)
+    other_worker = SharedSnapshotSegment(segment_path)
+    assert not builder.rebuild_requested()
+    other_worker.request_rebuild()
+    assert builder.rebuild_requested()
+    assert not builder.rebuild_requested()
@@ -0,0 +1,13 @@
+import pytest
+from fastapi.testclient import TestClient
+
+
+# == GET /api/system/metrics ==
+def test_get_metrics(client):
+    """Tests that the metrics endpoint reports the feed snapshot and invalidation bus."""
+    response = client.get("/api/system/metrics")
+    assert response.status_code == 200, f"Response: {response.text}"
+    json_response = response.json()
+    assert json_response["feed_snapshot"]["version"] >= 1
+    bus = json_response["invalidation_bus"]
+    assert {"enabled", "running", "published", "received", "lag_ms_avg", "lag_ms_max", "staleness_s"} <= set(bus)
@@ -6,6 +6,8 @@ import time
 from datetime import datetime
 from unittest.mock import patch, MagicMock # Added for mocking
 
+from services import counters
+
 
 # --- Helper ---
 def generate_unique_user_data(prefix: str):
@@ -362,6 +364,39 @@ def test_get_user_by_googleid_not_found(client):
     assert response.status_code == 404
     assert response.json()["detail"] == "User not found"
 
+
+# == POST /api/users/batch ==
+def test_get_users_batch_success(client, test_user_data, other_user_data):
+    """Tests resolving several users by googleId and netId in one request."""
+    unknown_net_id = f"non_existent_netid_{time.time()}"
+    payload = {
+        "googleIds": [test_user_data["googleId"]],
+        "netIds": [other_user_data["netId"], unknown_net_id],
+    }
+    response = client.post("/api/users/batch", json=payload)
+    assert response.status_code == 200, f"Response: {response.text}"
+    json_response = response.json()
+    net_ids = {user["netId"] for user in json_response["users"]}
+    assert net_ids == {test_user_data["netId"], other_user_data["netId"]}
+    assert all("password" not in user for user in json_response["users"])
+    assert json_response["missing"] == [unknown_net_id]
+
+
+def test_get_users_batch_empty(client):
+    """Tests that an empty batch returns no users without querying."""
+    response = client.post("/api/users/batch", json={})
+    assert response.status_code == 200
+    assert response.json() == {"users": [], "missing": []}
+
+
+def test_get_users_batch_too_many_ids(client):
+    """Tests that oversized batches are rejected."""
+    from models import MAX_BATCH_IDS
+    payload = {"netIds": [f"netid_{i}" for i in range(MAX_BATCH_IDS + 1)]}
+    response = client.post("/api/users/batch", json=payload)
+    assert response.status_code == 400
+    assert "Too many ids" in response.json()["detail"]
+
 # --- Test for Added Coverage ---
 @patch("database.users_collection.find_one")
 def test_get_user_by_googleid_generic_exception(mock_find, client, test_user_data):
@@ -386,6 +421,7 @@ def test_get_user_profile_success(client, test_user_data, other_user_data, compl
 
     poster_net_id = test_user_data["netId"]
     receiver_net_id = other_user_data["netId"]
+    counters.flush_all() # Counts are materialized write-behind
 
     # Test Poster's profile (test_user)
     response_poster = client.get(f"/api/users/profile/{poster_net_id}")
@@ -410,6 +446,40 @@ def test_get_user_profile_success(client, test_user_data, other_user_data, compl
     assert len(profile_receiver["received_history"]) >= 1
     assert any(rec.get("id") == post_id_str for rec in profile_receiver["received_history"])
 
+def test_get_user_profile_histories_exclude_photo(client, test_user_data, completed_food_post):
+    """Tests that history entries carry a thumbnail url instead of the photo payload."""
+    response = client.get(f"/api/users/profile/{test_user_data['netId']}")
+    assert response.status_code == 200
+    entry = next(post for post in response.json()["post_history"] if post["id"] == completed_food_post["id"])
+    assert "photo" not in entry
+    assert entry["thumbnail"] == f"/api/food/{completed_food_post['id']}/photo"
+    assert entry["foodName"]
+
+def test_get_user_profile_history_pagination(client, test_user_data, available_food_post, completed_food_post):
+    """Tests that each history pages independently, newest first."""
+    net_id = test_user_data["netId"]
+    full = client.get(f"/api/users/profile/{net_id}", params={"limit": 100}).json()["post_history"]
+    assert len(full) >= 2
+    first = client.get(f"/api/users/profile/{net_id}", params={"limit": 1}).json()
+    second = client.get(f"/api/users/profile/{net_id}", params={"limit": 1, "postOffset": 1}).json()
+    assert [p["id"] for p in first["post_history"] + second["post_history"]] == [p["id"] for p in full[:2]]
+    assert client.get(f"/api/users/profile/{net_id}", params={"limit": 101}).status_code == 422
+
+def test_get_user_profile_history_finds(client, test_user_data, completed_food_post):
+    """Tests that each history is one photo-less find on food_posts, and nothing is counted or aggregated."""
+    from database import food_collection
+    net_id = test_user_data["netId"]
+    with patch.object(food_collection, "find", wraps=food_collection.find) as find, \
+         patch.object(food_collection, "aggregate", wraps=food_collection.aggregate) as aggregate, \
+         patch.object(food_collection, "count_documents", wraps=food_collection.count_documents) as count_documents:
+        response = client.get(f"/api/users/profile/{net_id}")
+    assert response.status_code == 200
+    # Background jobs share the collection: only count calls about this user
+    finds = [call for call in find.call_args_list if net_id in str(call)]
+    assert sorted((call.args[0] for call in finds), key=str) == sorted([{"postedBy": net_id}, {"reservedBy": net_id, "status": "red"}], key=str)
+    assert all(call.args[1]["photo"] == 0 for call in finds)
+    assert not any(net_id in str(call) for call in aggregate.call_args_list + count_documents.call_args_list)
+
 def test_get_user_profile_no_history(client, test_user_data):
     """Tests retrieving profile for user known to have no post/receive history."""
     new_user_data = generate_unique_user_data("profile_clean")
@@ -446,7 +516,7 @@ def test_get_user_profile_generic_exception_find_user(mock_find_user, client, te
     assert "An unexpected error occurred while fetching profile data" in response.json()["detail"]
 
 @patch("database.users_collection.find_one") # Mock user find to succeed
-@patch("database.food_collection.find") # Mock food find to fail
+@patch("database.food_collection.find") # Mock the history queries to fail
 def test_get_user_profile_generic_exception_find_food(mock_find_food, mock_find_user, client, test_user_data):
     """Tests generic exception when finding food posts in profile endpoint."""
     # Simulate finding the user successfully
@@ -0,0 +1,132 @@
+import pytest
+from datetime import datetime, timedelta
+from bson import ObjectId
+
+from database import get_food_collection, get_users_collection
+from services import archive, counters, reservation_holds, user_stats
+
+
+def _stats(net_id):
+    counters.flush_all()
+    user = get_users_collection().find_one({"netId": net_id})
+    return {field: user.get(field, 0) for field in user_stats.STAT_FIELDS}
+
+
+def _delta(before, after):
+    return {field: after[field] - before[field] for field in user_stats.STAT_FIELDS}
+
+
+def test_lifecycle_maintains_user_stats(client, available_food_post, test_user_data, other_user_data):
+    """Tests that reserving and completing move the reserver's counters, and posting the poster's."""
+    poster_before, reserver_before = _stats(test_user_data["netId"]), _stats(other_user_data["netId"])
+    food_id = available_food_post["id"]
+
+    client.post("/api/food/reserve", json={"food_id": food_id, "user": other_user_data["netId"]})
+    assert _delta(reserver_before, _stats(other_user_data["netId"])) == {"postCount": 0, "reservationCount": 1, "receivedCount": 0}
+
+    client.post("/api/food/complete", data={"food_id": food_id, "user": other_user_data["netId"]})
+    assert _delta(reserver_before, _stats(other_user_data["netId"])) == {"postCount": 0, "reservationCount": 0, "receivedCount": 1}
+    assert _delta(poster_before, _stats(test_user_data["netId"])) == {"postCount": 0, "reservationCount": 0, "receivedCount": 0}
+
+
+def test_post_increments_post_count(client, test_user_data):
+    before = _stats(test_user_data["netId"])
+    now = datetime.now()
+    item = {
+        "foodName": "Stats Bagels", "quantity": 2, "category": "Snack", "dietaryInfo": "None",
+        "pickupLocation": "Library", "pickupTime": now.isoformat(), "photo": {"uri": "data:image/jpeg;base64,abc"},
+        "user": test_user_data["netId"], "expirationTime": (now + timedelta(hours=1)).isoformat(),
+    }
+    assert client.post("/api/food/bulk", json=[item, item]).json()["inserted"] == 2
+    assert _delta(before, _stats(test_user_data["netId"]))["postCount"] == 2
+
+
+def test_claims_count_for_each_claimer(client, test_user_data, other_user_data):
+    """Tests that every claimer's pickup counts once, including the one that completes the post."""
+    poster, claimer = test_user_data["netId"], other_user_data["netId"]
+    now = datetime.now()
+    item = {
+        "foodName": "Stats Cookies", "quantity": 3, "category": "Snack", "dietaryInfo": "None",
+        "pickupLocation": "Library", "pickupTime": now.isoformat(), "photo": {"uri": "data:image/jpeg;base64,abc"},
+        "user": poster, "expirationTime": (now + timedelta(hours=1)).isoformat(),
+    }
+    food_id = client.post("/api/food/bulk", json=[item]).json()["results"][0]["food_id"]
+    poster_before, claimer_before = _stats(poster), _stats(claimer)
+    recount_before = user_stats.compute([poster, claimer])
+
+    claims = [client.post("/api/food/claim", json={"food_id": food_id, "user": user, "units": units}).json()
+              for user, units in ((claimer, 2), (poster, 1))]
+    assert _delta(claimer_before, _stats(claimer)) == {"postCount": 0, "reservationCount": 1, "receivedCount": 0}
+    for claim, user in zip(claims, (claimer, poster)):
+        client.post("/api/food/claim/complete", json={"food_id": food_id, "claim_id": claim["claim_id"], "user": user})
+    assert get_food_collection().find_one({"_id": ObjectId(food_id)})["status"] == "red"
+
+    expected = {"postCount": 0, "reservationCount": 0, "receivedCount": 1}
+    assert _delta(claimer_before, _stats(claimer)) == expected
+    assert _delta(poster_before, _stats(poster)) == expected
+    recount_after = user_stats.compute([poster, claimer]) # Reconciliation agrees
+    assert all(_delta(recount_before[net_id], recount_after[net_id]) == expected for net_id in (poster, claimer))
+
+
+def test_expired_reservation_is_uncounted(client, reserved_food_post):
+    net_id = reserved_food_post["reserverNetId"]
+    before = _stats(net_id)
+    get_food_collection().update_one({"_id": ObjectId(reserved_food_post["id"])}, {"$set": {"holdUntil": datetime.now() - timedelta(seconds=1)}})
+    reservation_holds.release(reserved_food_post["id"])
+    assert _delta(before, _stats(net_id))["reservationCount"] == -1
+
+
+def test_reconcile_corrects_drift(client, completed_food_post, test_user_data, other_user_data, monkeypatch):
+    """Tests that the reconciliation job rewrites counters that drifted from food_posts."""
+    monkeypatch.setattr(user_stats, "RECONCILE_SETTLE_SECONDS", 0)
+    net_ids = [test_user_data["netId"], other_user_data["netId"]]
+    counters.flush_all()
+    get_users_collection().update_many({"netId": {"$in": net_ids}}, {"$set": {"postCount": 999, "receivedCount": -3}})
+
+    result = user_stats.reconcile()
+    assert result["corrected"] >= 2
+
+    def count(query): # Archived posts still count towards a user's totals
+        return get_food_collection().count_documents(query) + archive.get_post_archive_collection().count_documents(query)
+    def claims(net_id, status):
+        return count({"claims": {"$elemMatch": {"user": net_id, "status": status}}}) # One claim per user and post here
+    for net_id in net_ids:
+        assert _stats(net_id) == {
+            "postCount": count({"postedBy": net_id}),
+            "reservationCount": count({"reservedBy": net_id, "status": "yellow"}) + claims(net_id, "held"),
+            "receivedCount": count({"reservedBy": net_id, "status": "red"}) + claims(net_id, "completed"),
+        }
+    assert user_stats.reconcile()["corrected"] == 0 # Nothing left to fix
+
+
+def test_reconcile_leaves_in_flight_increments_alone(client, available_food_post, test_user_data, monkeypatch):
+    """Tests that drift which disappears once other workers flush is not written over."""
+    monkeypatch.setattr(user_stats, "RECONCILE_SETTLE_SECONDS", 0)
+    net_id = test_user_data["netId"]
+    user_stats.reconcile()
+    actual = user_stats.compute([net_id])[net_id]["postCount"]
+    # As if another worker still buffered the increment for a post the recount already sees...
+    get_users_collection().update_one({"netId": net_id}, {"$inc": {"postCount": -1}})
+    drift, looks = user_stats._drift, []
+    def drift_then_flush(users):
+        result = drift(users)
+        if not looks: # ...and flushed it while reconcile waited
+            get_users_collection().update_one({"netId": net_id}, {"$inc": {"postCount": 1}})
+        looks.append(result)
+        return result
+    monkeypatch.setattr(user_stats, "_drift", drift_then_flush)
+    user_stats.reconcile()
+    assert net_id in looks[0] and net_id not in looks[1]
+    assert _stats(net_id)["postCount"] == actual # Not actual + 1
+
+
+def test_profile_counts_come_from_user_document(client, test_user_data, monkeypatch):
+    """Tests that the profile answers its counts from the materialized fields."""
+    counters.flush_all()
+    get_users_collection().update_one({"netId": test_user_data["netId"]}, {"$set": {"postCount": 41, "receivedCount": 7}})
+    monkeypatch.setattr(type(get_food_collection()), "count_documents", lambda *args, **kwargs: pytest.fail("profile counted food_posts"))
+    profile = client.get(f"/api/users/profile/{test_user_data['netId']}").json()
+    assert profile["post_count"] == 41 and profile["received_count"] == 7
+    monkeypatch.undo()
+    monkeypatch.setattr(user_stats, "RECONCILE_SETTLE_SECONDS", 0)
+    user_stats.reconcile()
@@ -1,5 +1,8 @@
 import hashlib
 import logging
+import json
+from datetime import datetime
+from typing import Optional
 
 logger = logging.getLogger(__name__)
 
@@ -18,4 +21,42 @@ def verify_password(stored_password_hash: str, provided_password: str) -> bool:
         return stored_password_hash == provided_hash
     except Exception as e:
         logger.error(f"Error verifying password: {e}", exc_info=True)
-        return False # Fail verification on error
\ No newline at end of file
+        return False # Fail verification on error
+
+def serialize_food_post(food: dict) -> dict:
+    """Converts a raw food_posts document into the shape returned by the list endpoints."""
+    food["id"] = str(food.pop("_id"))
+
+    # Process photo field: the frontend expects the 'uri' field directly
+    if "photo" in food and isinstance(food["photo"], str):
+        try:
+            photo_data = json.loads(food["photo"])
+            food["photo"] = photo_data.get("uri", food["photo"]) # Keep original if no uri
+        except (json.JSONDecodeError, AttributeError):
+            logger.warning(f"Failed to parse photo JSON for food item {food['id']}")
+            # Keep the original string if parsing fails
+    else:
+        # Ensure photo field exists even if null or not string
+        food["photo"] = food.get("photo", "")
+
+    # Convert datetime objects to ISO strings for the JSON response
+    if isinstance(food.get("timestamp"), datetime):
+        food["timestamp"] = food["timestamp"].isoformat()
+    return food
+
+
+def parse_datetime(value) -> Optional[datetime]:
+    """Parses the ISO strings the frontend sends (e.g. pickupTime) into naive datetimes.
+    Timezone-aware values are converted to naive server local time, like every timestamp the backend writes."""
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, str) and value:
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    else:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
@@ -266,6 +266,26 @@ export const logoutUser = async () => {
         throw error;
     }
 };
+// Resolve poster netIds for a whole screen of cards in one round trip
+export const getPosterNetIds = async (foodIds) => {
+    try {
+        const response = await axios.post(`${API_URL}/posters`, { food_ids: foodIds });
+        return response.data.posters;
+    } catch (error) {
+        console.error("Error fetching poster Net IDs:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const getUsersBatch = async ({ googleIds = [], netIds = [] }) => {
+    try {
+        const response = await axios.post(`${USER_API_URL}/batch`, { googleIds, netIds });
+        return response.data.users;
+    } catch (error) {
+        console.error("Error fetching users:", error.response?.data || error.message);
+        throw error;
+    }
+};
 export const canReportPost = async (postId, userId) => {
     try {
         const response = await axios.get(`${API_framework}api/report/can-report/${postId}/${userId}`);
@@ -277,6 +297,104 @@ export const canReportPost = async (postId, userId) => {
     }
   };
 
+// Eligibility for a list of posts in one round trip: { [postId]: { canReport, reason } }
+export const canReportPosts = async (postIds, userId) => {
+    try {
+        const response = await axios.post(`${API_framework}api/report/can-report`, {
+            user_id: userId,
+            post_ids: postIds,
+        });
+        return response.data.results;
+    } catch (error) {
+        console.error("Error checking report eligibility:", error);
+        throw error;
+    }
+};
+
+// Run several GET routes in one round trip: paths like "/api/users/profile/abc123".
+// Resolves to [{ path, status, body }] in the same order as the paths.
+export const batchGet = async (paths) => {
+    try {
+        const response = await axios.post(`${API_framework}api/batch`, {
+            requests: paths.map((path) => ({ path })),
+        });
+        return response.data.responses;
+    } catch (error) {
+        console.error("Error running batch request:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const getRecentActivity = async ({ limit = 50, after, foodId } = {}) => {
+    try {
+        const response = await axios.get(`${API_URL}/activity`, { params: { limit, after, foodId } });
+        return response.data.activity;
+    } catch (error) {
+        console.error("Error fetching recent activity:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const getNotifications = async (netId, limit = 50) => {
+    try {
+        const response = await axios.get(`${USER_API_URL}/notifications/${netId}`, { params: { limit } });
+        return response.data.notifications;
+    } catch (error) {
+        console.error("Error fetching notifications:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const getQueuePosition = async (foodId, user) => {
+    try {
+        const response = await axios.get(`${API_URL}/${foodId}/queue`, { params: { user } });
+        return response.data;
+    } catch (error) {
+        console.error("Error fetching waitlist position:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const leaveQueue = async (foodId, user) => {
+    try {
+        const response = await axios.delete(`${API_URL}/${foodId}/queue`, { params: { user } });
+        return response.data;
+    } catch (error) {
+        console.error("Error leaving waitlist:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const claimFood = async (foodId, user, units = 1) => {
+    try {
+        const response = await axios.post(`${API_URL}/claim`, { food_id: foodId, user, units });
+        return response.data;
+    } catch (error) {
+        console.error("Error claiming food:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const completeClaim = async (foodId, claimId, user) => {
+    try {
+        const response = await axios.post(`${API_URL}/claim/complete`, { food_id: foodId, claim_id: claimId, user });
+        return response.data;
+    } catch (error) {
+        console.error("Error completing claim:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
+export const bulkPostFood = async (items) => {
+    try {
+        const response = await axios.post(`${API_URL}/bulk`, items);
+        return response.data; // { inserted, failed, results: [{ index, food_id } | { index, error }] }
+    } catch (error) {
+        console.error("Error bulk posting food:", error.response?.data || error.message);
+        throw error;
+    }
+};
+
 export default {
     postFood,
     getFoodItems,
@@ -289,7 +407,18 @@ export default {
     getUser,
     logoutUser,
     getPosterNetId,
-    canReportPost
+    getPosterNetIds,
+    getUsersBatch,
+    canReportPost,
+    canReportPosts,
+    batchGet,
+    getRecentActivity,
+    getNotifications,
+    getQueuePosition,
+    leaveQueue,
+    claimFood,
+    completeClaim,
+    bulkPostFood
  }
  
 
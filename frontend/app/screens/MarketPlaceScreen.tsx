@@ -163,6 +163,11 @@ const MarketplaceTab = () => {
         try {
             const user = netId;
             const response = await reserveFood(item.id, user); // Assuming API uses numeric id
+            if (response.position) {
+                // Contention mode: someone else holds it and we're in line
+                alert(`${response.message}. We'll notify you if it becomes yours.`);
+                return;
+            }
             alert(`Reservation successful! Pickup from ${item.pickupLocation} by ${formatDateTime(item.expirationTime)}`);
             console.log("Reservation successful:", response);
              // Update UI optimistically or refetch